@@ -0,0 +1,52 @@
+# Translation time of long elif chains and deeply nested if statements.
+# With the control flow graph, the time per branch should stay flat when the size grows.
+#
+#   python benchmarks/control_flow.py
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from shadermake.engines.opengl import OpenGLEngine
+
+def elif_chain (count):
+    source  = "def main(x):\n    y = 0\n    if x < 0:\n        y = 0\n"
+    source += "".join( f"    elif x < {idx}:\n        y = {idx}\n" for idx in range(1, count) )
+    source += "    z = y + x\n    return z\n"
+    return source
+
+def nested_ifs (depth):
+    source = "def main(x):\n    y = 0\n"
+    for idx in range(depth):
+        indentation = "    " * (idx + 1)
+        source += f"{indentation}if x > {idx}:\n{indentation}    y = y + {idx}\n"
+    source += "    z = y + x\n    return z\n"
+    return source
+
+def measure (source, repeat=3):
+    scope = {}
+    exec(source, scope)
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        OpenGLEngine().generate(scope["main"], [ int ], [])
+        duration = time.perf_counter() - start
+
+        best = duration if best is None else min(best, duration)
+    return best
+
+def main ():
+    OpenGLEngine.memory_cache = None
+
+    # Python refuses to compile more than about 20 nested blocks
+    for name, make_source, sizes in (("elif chain", elif_chain, [ 100, 200, 400, 800, 1600 ]), ("nested ifs", nested_ifs, [ 5, 10, 15, 19 ])):
+        print(f"{name:>12} {'branches':>10} {'total ms':>10} {'us/branch':>10}")
+        for size in sizes:
+            duration = measure(make_source(size))
+            print(f"{'':>12} {size:>10} {duration * 1000:>10.2f} {duration * 1e6 / size:>10.1f}")
+
+if __name__ == "__main__":
+    main()
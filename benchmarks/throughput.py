@@ -0,0 +1,230 @@
+# Translation throughput of OpenGLEngine.generate on generated shaders of growing size.
+#
+#   python benchmarks/throughput.py                                  print the results
+#   python benchmarks/throughput.py --output results.json            save them as json
+#   python benchmarks/throughput.py --baseline results.json          fail when slower than a previous run
+#   python benchmarks/throughput.py --interpreters python3.7 python3.11
+#
+# Every case reports the translations per second (best of --repeat runs), the peak memory allocated
+# during one translation and the size of the emitted code. With --baseline, the exit code is 1 when a
+# case of the same python version is slower, allocates more or emits more code than the baseline by
+# more than --threshold. With --report-speed, slower cases are only reported : translation speed depends on
+# the machine, while the memory and the code size can be compared with a baseline recorded anywhere.
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from shadermake.engines.opengl import OpenGLEngine, ShaderOptions
+
+SIZES       = [ 50, 100, 200, 400, 800 ]
+QUICK_SIZES = [ 25, 50, 100 ]
+
+def compile_source (source, name="main"):
+    scope = {}
+    exec(source, scope)
+    return scope[name]
+
+# Each workload gives back a function translating the shader of the given size
+
+def straight_line (size):
+    source  = "def main(x):\n    a0 = x + 1.0\n"
+    source += "".join( f"    a{idx} = a{idx - 1} * x + {idx}.0\n" for idx in range(1, size) )
+    source += f"    return a{size - 1}\n"
+    function = compile_source(source)
+
+    return lambda: OpenGLEngine().generate(function, [ float ], [])
+
+def elif_chain (size):
+    source  = "def main(x):\n    y = 0\n    if x < 0:\n        y = 0\n"
+    source += "".join( f"    elif x < {idx}:\n        y = {idx}\n" for idx in range(1, size) )
+    source += "    z = y + x\n    return z\n"
+    function = compile_source(source)
+
+    return lambda: OpenGLEngine().generate(function, [ int ], [])
+
+def nested_ifs (size):
+    # Python refuses to compile more than 20 nested blocks, deeper nests are repeated one after the other
+    source = "def main(x):\n    y = 0\n"
+    for idx in range(size):
+        indentation = "    " * (idx % 19 + 1)
+        source += f"{indentation}if x > {idx}:\n{indentation}    y = y + {idx}\n"
+    source += "    z = y + x\n    return z\n"
+    function = compile_source(source)
+
+    return lambda: OpenGLEngine().generate(function, [ int ], [])
+
+def wide_bound_shaders (size):
+    helpers = []
+    for idx in range(size):
+        helper = compile_source(f"def h{idx}(x):\n    return x * {idx}.0 + 1.0\n", f"h{idx}")
+        helpers.append(OpenGLEngine().generate(helper, [ float ], []))
+
+    source  = "def main(x):\n    s = x\n"
+    source += "".join( f"    s = s + h{idx}(x)\n" for idx in range(size) )
+    source += "    return s\n"
+    function = compile_source(source)
+
+    # Linking is part of the translation of a shader calling many others
+    return lambda: OpenGLEngine().generate(function, [ float ], helpers).c_code()
+
+def many_uniforms (size):
+    options = ShaderOptions()
+    for idx in range(size):
+        options.addUniform(float, f"u{idx}")
+
+    source  = "def main(x):\n    s = x\n"
+    source += "".join( f"    s = s + u{idx}\n" for idx in range(size) )
+    source += "    return s\n"
+    function = compile_source(source)
+
+    return lambda: OpenGLEngine().generate(function, [ float ], [], shader_options=options).c_code()
+
+WORKLOADS = {
+    "straight_line":      straight_line,
+    "elif_chain":         elif_chain,
+    "nested_ifs":         nested_ifs,
+    "wide_bound_shaders": wide_bound_shaders,
+    "many_uniforms":      many_uniforms
+}
+
+def measure (workload, size, repeat):
+    translate = WORKLOADS[workload](size)
+
+    best = None
+    for _ in range(repeat):
+        start  = time.perf_counter()
+        shader = translate()
+        duration = time.perf_counter() - start
+
+        best = duration if best is None else min(best, duration)
+
+    tracemalloc.start()
+    translate()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    code = shader if isinstance(shader, str) else shader.c_code()
+
+    return {
+        "workload":                workload,
+        "size":                    size,
+        "seconds":                 best,
+        "translations_per_second": 1 / best,
+        "peak_memory":             peak_memory,
+        "code_size":               len(code.encode("utf-8"))
+    }
+
+def run (workloads, sizes, repeat):
+    # Every translation has to run, the shared cache would only measure dictionary lookups
+    OpenGLEngine.memory_cache = None
+    OpenGLEngine.disk_cache   = None
+
+    return {
+        "python":         platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "results":        [ measure(workload, size, repeat) for workload in workloads for size in sizes ]
+    }
+
+def run_interpreters (interpreters, arguments):
+    runs = []
+    for interpreter in interpreters:
+        command = [ interpreter, os.path.abspath(__file__), "--json", "--repeat", str(arguments.repeat) ]
+        command += [ "--workloads", *arguments.workloads ]
+        if arguments.quick: command.append("--quick")
+
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        runs.extend(json.loads(output))
+    return runs
+
+def python_version (run):
+    return ".".join(run["python"].split(".")[:2])
+
+def find_regressions (runs, baseline_runs, threshold):
+    # (metric, message) of every case worse than the baseline
+    baseline = {
+        (python_version(run), result["workload"], result["size"]): result
+        for run in baseline_runs for result in run["results"]
+    }
+
+    regressions = []
+    for run in runs:
+        for result in run["results"]:
+            previous = baseline.get((python_version(run), result["workload"], result["size"]))
+            if previous is None: continue
+
+            checks = (
+                ("translations_per_second", result["translations_per_second"] < previous["translations_per_second"] * (1 - threshold)),
+                ("peak_memory",             result["peak_memory"] > previous["peak_memory"] * (1 + threshold)),
+                ("code_size",               result["code_size"] > previous["code_size"] * (1 + threshold))
+            )
+            for metric, regressed in checks:
+                if regressed:
+                    regressions.append((metric, f"python {run['python']} {result['workload']}[{result['size']}] {metric}: {previous[metric]:.6g} -> {result[metric]:.6g}"))
+
+    return regressions
+
+def print_runs (runs):
+    for run in runs:
+        print(f"python {run['python']} ({run['implementation']})")
+        print(f"{'workload':>20} {'size':>6} {'translations/s':>15} {'ms':>10} {'peak KiB':>10} {'code bytes':>11}")
+        for result in run["results"]:
+            print(
+                f"{result['workload']:>20} {result['size']:>6} {result['translations_per_second']:>15.2f} "
+                f"{result['seconds'] * 1000:>10.2f} {result['peak_memory'] / 1024:>10.1f} {result['code_size']:>11}"
+            )
+
+def main (argv=None):
+    parser = argparse.ArgumentParser(description="Measure the translation throughput of OpenGLEngine.")
+    parser.add_argument("--workloads", nargs="+", default=list(WORKLOADS), choices=list(WORKLOADS))
+    parser.add_argument("--quick", action="store_true", help="smaller shaders, for continuous integration")
+    parser.add_argument("--repeat", type=int, default=5, help="translations per case, the best one is kept")
+    parser.add_argument("--interpreters", nargs="+", default=None, help="run the benchmark with each of these python executables")
+    parser.add_argument("--output", default=None, help="json file receiving the results")
+    parser.add_argument("--baseline", default=None, help="json results of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative change tolerated before a regression is reported")
+    parser.add_argument("--report-speed", action="store_true", help="report slower translations without failing, for a baseline recorded on another machine")
+    parser.add_argument("--json", action="store_true", help="print the results as json only")
+    arguments = parser.parse_args(argv)
+
+    if arguments.interpreters is not None:
+        runs = run_interpreters(arguments.interpreters, arguments)
+    else:
+        runs = [ run(arguments.workloads, QUICK_SIZES if arguments.quick else SIZES, arguments.repeat) ]
+
+    if arguments.json:
+        print(json.dumps(runs))
+        return 0
+
+    print_runs(runs)
+    if arguments.output is not None:
+        with open(arguments.output, "w", encoding="utf-8") as file:
+            json.dump(runs, file, indent=4)
+
+    if arguments.baseline is not None:
+        with open(arguments.baseline, "r", encoding="utf-8") as file:
+            regressions = find_regressions(runs, json.load(file), arguments.threshold)
+
+        failed = False
+        for metric, regression in regressions:
+            if arguments.report_speed and metric == "translations_per_second":
+                print(f"Slower: {regression}")
+                continue
+
+            print(f"Regression: {regression}")
+            failed = True
+        if failed:
+            return 1
+        print("No regression")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
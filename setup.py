@@ -22,6 +22,12 @@ setup(
     long_description=long_description,
     packages=[ 'shadermake', 'shadermake.engines' ],
     install_requires=[],
+    extras_require={
+        "numpy": [ "numpy" ]
+    },
+    entry_points={
+        "console_scripts": [ "shadermake=shadermake.batch:main" ]
+    },
     url="https://github.com/EngDrom/ShaderMake",
     keywords=['python', 'opengl', 'glsl'],
     classifiers=[
@@ -1,12 +1,37 @@
 
-# Decorators
-from shadermake.decorator      import make_shader
+# The engines are only imported when one of their names is used, so loading shader bundles
+# (shadermake.bundle) does not import the translator
 
-# Engines
-from shadermake.engines.opengl import OpenGLEngine
+_EXPORTS = {
+    # Decorators
+    "make_shader":       "shadermake.decorator",
+    "make_permutations": "shadermake.decorator",
 
-# Options
-from shadermake.engines.opengl import ShaderOptions
+    # Engines
+    "OpenGLEngine":  "shadermake.engines.opengl",
 
-# Type annotations
-from shadermake.engines.opengl import vec2, vec3, vec4, mat4
+    # Options
+    "ShaderOptions": "shadermake.engines.opengl",
+
+    # Type annotations
+    "vec2": "shadermake.engines.opengl",
+    "vec3": "shadermake.engines.opengl",
+    "vec4": "shadermake.engines.opengl",
+    "mat4": "shadermake.engines.opengl",
+
+    # Bundles
+    "export_bundle": "shadermake.bundle",
+    "load_bundle":   "shadermake.bundle"
+}
+
+def __getattr__ (name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module 'shadermake' has no attribute '{name}'")
+
+    import importlib
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+def __dir__ ():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,169 @@
+import argparse
+import importlib
+import os
+import pkgutil
+import sys
+import tempfile
+import time
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing             import List, NamedTuple
+
+import shadermake.decorator
+
+from shadermake.cache          import DiskCache
+from shadermake.engine         import LazyShader
+from shadermake.engines.opengl import OpenGLEngine, _GLSL_Shader
+
+class BatchTarget(NamedTuple):
+    module:       str
+    attribute:    str
+    shader:       object
+    dependencies: tuple
+
+class BatchResult(NamedTuple):
+    module:       str
+    attribute:    str
+    name:         str
+    path:         str
+    seconds:      float
+    # Misses of the worker disk cache, the shaders it had to translate for this target
+    translations: int
+
+def import_modules (module_name):
+    module = importlib.import_module(module_name)
+    yield module
+
+    if hasattr(module, "__path__"):
+        for info in pkgutil.walk_packages(module.__path__, module.__name__ + "."):
+            yield importlib.import_module(info.name)
+
+def discover (module_names) -> List[BatchTarget]:
+    default_lazy = shadermake.decorator.DEFAULT_LAZY
+    shadermake.decorator.DEFAULT_LAZY = True
+
+    found = {}
+    try:
+        for module_name in module_names:
+            for module in import_modules(module_name):
+                for attribute, value in vars(module).items():
+                    if not isinstance(value, (LazyShader, _GLSL_Shader)): continue
+
+                    # A shader imported in another module is compiled where its function is declared
+                    if id(value) in found and value.python_function().__module__ != module.__name__: continue
+                    found[id(value)] = (module.__name__, attribute, value)
+    finally:
+        shadermake.decorator.DEFAULT_LAZY = default_lazy
+
+    return [
+        BatchTarget(module, attribute, shader, tuple( found[id(bound)][:2] for bound in shader.bound_shaders() if id(bound) in found ))
+        for module, attribute, shader in found.values()
+    ]
+
+def init_worker (path, cache_path):
+    sys.path[:0] = [ entry for entry in path if entry not in sys.path ]
+
+    shadermake.decorator.DEFAULT_LAZY = True
+    if cache_path is not None:
+        OpenGLEngine.disk_cache = DiskCache(cache_path)
+
+def output_path (output_dir, module, attribute):
+    return os.path.join(output_dir, f"{module}.{attribute}.glsl")
+
+def compile_target (module, attribute, output_dir) -> BatchResult:
+    shader = getattr(importlib.import_module(module), attribute)
+
+    path = output_path(output_dir, module, attribute)
+
+    misses = OpenGLEngine.disk_cache.misses
+    start  = time.perf_counter()
+    if isinstance(shader, LazyShader):
+        shader = shader.resolve()
+    # The linked code goes straight to the file, it is never held as one string
+    with open(path, "w", encoding="utf-8") as file:
+        shader.write_c_code(file)
+    seconds = time.perf_counter() - start
+
+    return BatchResult(module, attribute, shader.name(), path, seconds, OpenGLEngine.disk_cache.misses - misses)
+
+def compile_modules (module_names, output_dir, workers=None, cache_path=None) -> List[BatchResult]:
+    # The workers only reuse the translations of the bound shaders through a disk cache, a temporary
+    # one is shared by this batch when no cache directory is given
+    if cache_path is None:
+        with tempfile.TemporaryDirectory(prefix="shadermake-") as directory:
+            return compile_modules(module_names, output_dir, workers, directory)
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    targets = discover(module_names)
+    results = []
+
+    waiting  = { (target.module, target.attribute): set(target.dependencies) for target in targets }
+    finished = set()
+    running  = {}
+
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(sys.path, cache_path)) as pool:
+        def submit_ready ():
+            for target_key, dependencies in list(waiting.items()):
+                if not dependencies <= finished: continue
+
+                del waiting[target_key]
+                running[pool.submit(compile_target, *target_key, output_dir)] = target_key
+
+        submit_ready()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                finished.add(running.pop(future))
+                results.append(future.result())
+            submit_ready()
+
+    return results
+
+def print_report (report):
+    for path in report.changed_files:
+        print(f"Changed {path}")
+    for path in report.changed_outputs:
+        print(f"Wrote {path}")
+    print(f"Translated {len(report.rebuilt)} shaders in {report.seconds * 1000:.2f} ms")
+
+def watch_modules (module_names, output_dir, interval, cache_path=None):
+    # Translates in this process, reloading the edited modules
+    from shadermake.rebuild import IncrementalBuild, watch
+
+    if cache_path is not None:
+        OpenGLEngine.disk_cache = DiskCache(cache_path)
+
+    build = IncrementalBuild(module_names, output_dir)
+    print_report(build.build())
+    try:
+        watch(build, interval, print_report)
+    except KeyboardInterrupt: pass
+
+    return 0
+
+def main (argv=None):
+    parser = argparse.ArgumentParser(prog="shadermake", description="Translate every shader declared in the given modules.")
+    parser.add_argument("modules", nargs="+", help="modules or packages to search for shaders")
+    parser.add_argument("-o", "--output", default="shaders", help="directory receiving the generated GLSL files")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes, defaults to the number of cores")
+    parser.add_argument("--cache", default=None, help="disk cache directory shared by the workers, kept between runs (a temporary one by default)")
+    parser.add_argument("--watch", action="store_true", help="keep running and translate again the shaders of the edited files")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between two checks of the files with --watch")
+    arguments = parser.parse_args(argv)
+
+    if arguments.watch:
+        return watch_modules(arguments.modules, arguments.output, arguments.interval, arguments.cache)
+
+    start   = time.perf_counter()
+    results = compile_modules(arguments.modules, arguments.output, arguments.jobs, arguments.cache)
+
+    for result in results:
+        print(f"{result.seconds * 1000:10.2f} ms  {result.module}.{result.attribute} -> {result.path}")
+    print(f"Compiled {len(results)} shaders in {time.perf_counter() - start:.2f} s")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
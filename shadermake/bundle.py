@@ -0,0 +1,153 @@
+# Ahead-of-time shader bundles : the linked GLSL code of translated shaders and the metadata needed to use
+# them, saved as one json file. Loading a bundle neither imports the python functions of the shaders nor
+# the engines, so this module must only depend on the standard library and shadermake.minify.
+
+import json
+
+from shadermake.minify import minify as minify_code
+
+BUNDLE_VERSION = 1
+
+class BundledShader:
+    # Same c_code(), name() and args() as a translated shader, types are given as GLSL type names
+    __slots__ = ( "__name", "__c_code", "__args", "__end_type", "__stage", "__inputs", "__outputs", "__uniforms", "__blocks", "__minified", "__types", "__r_minified" )
+
+    def __init__(self, name, c_code, args, end_type, stage=None, inputs=(), outputs=(), uniforms=(), blocks=(), minified=False, types=()):
+        self.__name     = name
+        self.__c_code   = c_code
+        self.__args     = args
+        self.__end_type = end_type
+        self.__stage    = stage
+        self.__inputs   = inputs
+        self.__outputs  = outputs
+        self.__uniforms = uniforms
+        self.__blocks   = blocks
+        # minified when the code was exported minified, types are the type names minifying the code needs
+        self.__minified = minified
+        self.__types    = types
+
+        self.__r_minified = None
+
+    def name (self):
+        return self.__name
+    def c_code (self, minify=False):
+        # Same as the c_code of a translated shader, a bundle exported minified only has the minified code
+        if not minify or self.__minified:
+            return self.__c_code
+
+        if self.__r_minified is None:
+            self.__r_minified = minify_code(self.__c_code, self.interface_names(), self.__types).code
+        return self.__r_minified
+    def write_c_code (self, out, minify=False):
+        out.write(self.c_code(minify))
+    def interface_names (self):
+        # Names the application refers to, kept by the minifier
+        names = { self.__name }
+        names.update( name for (type_name, name, *location) in self.__inputs + self.__outputs + self.__uniforms )
+        for (name, members, layout, binding) in self.__blocks:
+            names.add(name)
+            names.update( member_name for (type_name, member_name) in members )
+        return names
+    def args (self):
+        return self.__args
+    def end_type (self):
+        return self.__end_type
+    def stage (self):
+        return self.__stage
+
+    # (type name, name, location) for inputs and outputs, location is None when not given
+    def inputs (self):
+        return self.__inputs
+    def outputs (self):
+        return self.__outputs
+    # (type name, name)
+    def uniform (self):
+        return self.__uniforms
+    # (block name, ((type name, member name), ...), layout, binding), binding is None when not given
+    def uniformBlocks (self):
+        return self.__blocks
+
+def shader_entry (shader, minify=False):
+    # Declarations of the linked shaders are part of the code, their variables belong to the interface too
+    linked = shader.link()
+    stage  = shader.shader_options.signature()[0]
+
+    seen      = set()
+    interface = ([], [], [])
+    blocks    = []
+    for linked_shader in [ shader ] + linked[:-1]:
+        signature = linked_shader.shader_options.signature()
+        for variables, declared in zip(interface, signature[1:4]):
+            for (type_name, name, *location) in declared:
+                if name in seen: continue
+
+                seen.add(name)
+                variables.append([ type_name, name, *location ])
+        for (name, members, layout, binding) in signature[4]:
+            if name in seen: continue
+
+            seen.add(name)
+            blocks.append([ name, [ list(member) for member in members ], layout, binding ])
+
+    inputs, outputs, uniforms = interface
+    return {
+        "name":     shader.name(),
+        "c_code":   shader.c_code(minify),
+        "args":     [ [ type.typename(), name ] for (type, name) in shader.args() ],
+        "end_type": shader.end_type().typename(),
+        "stage":    stage,
+        "inputs":   inputs,
+        "outputs":  outputs,
+        "uniforms": uniforms,
+        "blocks":   blocks,
+        "minified": minify,
+        "types":    shader.type_names()
+    }
+
+def export_bundle (shaders, file, minify=False):
+    # shaders is a dict of the keys to load the shaders with, or a list of shaders keyed by their name.
+    # file is a path or a writable text file. minify stores the minified code (see shadermake.minify).
+    if not isinstance(shaders, dict):
+        shaders = { shader.name(): shader for shader in shaders }
+
+    payload = {
+        "version": BUNDLE_VERSION,
+        "shaders": { key: shader_entry(shader, minify) for key, shader in shaders.items() }
+    }
+
+    if isinstance(file, str):
+        with open(file, "w", encoding="utf-8") as output:
+            json.dump(payload, output)
+    else:
+        json.dump(payload, file)
+
+def make_shader_entry (entry):
+    return BundledShader(
+        entry["name"],
+        entry["c_code"],
+        [ tuple(arg) for arg in entry["args"] ],
+        entry["end_type"],
+        entry["stage"],
+        tuple( (type_name, name, location) for (type_name, name, location) in entry["inputs"] ),
+        tuple( (type_name, name, location) for (type_name, name, location) in entry["outputs"] ),
+        tuple( (type_name, name) for (type_name, name) in entry["uniforms"] ),
+        # Bundles exported before uniform blocks were stored have none
+        tuple(
+            (name, tuple( (type_name, member_name) for (type_name, member_name) in members ), layout, binding)
+            for (name, members, layout, binding) in entry.get("blocks", [])
+        ),
+        entry.get("minified", False),
+        tuple(entry.get("types", ()))
+    )
+
+def load_bundle (file):
+    # Gives back a dict of the keys the shaders were exported with to their BundledShader
+    if isinstance(file, str):
+        with open(file, "r", encoding="utf-8") as input:
+            payload = json.load(input)
+    else:
+        payload = json.load(file)
+
+    assert isinstance(payload, dict) and payload.get("version") == BUNDLE_VERSION, f"Unsupported shader bundle, expected version {BUNDLE_VERSION}"
+
+    return { key: make_shader_entry(entry) for key, entry in payload["shaders"].items() }
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+
+from collections import OrderedDict
+
+def code_signature (code):
+    consts = tuple(
+        code_signature(const) if hasattr(const, "co_code") else (type(const).__name__, repr(const))
+        for const in code.co_consts
+    )
+
+    return (code.co_name, code.co_argcount, code.co_code, consts, code.co_names, code.co_varnames, code.co_freevars)
+
+def make_key (*parts):
+    # The interpreter version is part of every key : the bytecode and therefore the
+    # translation both change between python releases
+    data = repr((sys.implementation.cache_tag, sys.version_info[:3]) + parts)
+
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+class MemoryCache:
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+
+        self.hits   = 0
+        self.misses = 0
+
+        self.__entries = OrderedDict()
+        self.__lock    = threading.Lock()
+
+    def __len__ (self):
+        return len(self.__entries)
+
+    def get (self, key):
+        with self.__lock:
+            if key not in self.__entries:
+                self.misses += 1
+                return None
+
+            self.__entries.move_to_end(key)
+            self.hits += 1
+
+            return self.__entries[key]
+    def put (self, key, value):
+        with self.__lock:
+            self.__entries[key] = value
+            self.__entries.move_to_end(key)
+
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+    def clear (self):
+        with self.__lock:
+            self.__entries.clear()
+
+        self.hits   = 0
+        self.misses = 0
+
+class DiskCache:
+    def __init__(self, path, max_size=64 * 1024 * 1024):
+        self.path     = path
+        self.max_size = max_size
+
+        self.hits   = 0
+        self.misses = 0
+
+        os.makedirs(self.path, exist_ok=True)
+        self.__size = sum( os.path.getsize(entry) for entry in self.entries() )
+        self.__lock = threading.Lock()
+
+    def entry_path (self, key):
+        return os.path.join(self.path, f"{key}.json")
+    def entries (self):
+        return [ os.path.join(self.path, name) for name in os.listdir(self.path) if name.endswith(".json") ]
+    def size (self):
+        return self.__size
+
+    def get (self, key):
+        path = self.entry_path(key)
+
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                payload = json.load(file)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        # Refresh the modification time so that eviction drops the least recently used entries
+        os.utime(path)
+        self.hits += 1
+
+        return payload
+    def put (self, key, payload):
+        path = self.entry_path(key)
+        data = json.dumps(payload)
+
+        # Unique per process and thread, concurrent translations of the same shader write the same entry
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(data)
+
+        with self.__lock:
+            if os.path.exists(path):
+                self.__size -= os.path.getsize(path)
+            os.replace(temp_path, path)
+
+            self.__size += os.path.getsize(path)
+            if self.__size > self.max_size:
+                self.evict()
+    def evict (self):
+        entries = sorted(self.entries(), key=os.path.getmtime)
+
+        self.__size = sum( os.path.getsize(entry) for entry in entries )
+        for entry in entries:
+            if self.__size <= self.max_size: break
+
+            self.__size -= os.path.getsize(entry)
+            os.remove(entry)
+    def clear (self):
+        for entry in self.entries():
+            os.remove(entry)
+
+        self.__size = 0
+        self.hits   = 0
+        self.misses = 0
@@ -0,0 +1,393 @@
+from typing import List, NamedTuple
+
+import dis
+import linecache
+import re
+
+# Conditional jumps, mapped to the value of the condition for which the jump is taken
+CONDITIONAL_JUMPS = {
+    "POP_JUMP_IF_FALSE":          False,
+    "POP_JUMP_IF_TRUE":           True,
+    "POP_JUMP_FORWARD_IF_FALSE":  False,
+    "POP_JUMP_FORWARD_IF_TRUE":   True,
+    "POP_JUMP_BACKWARD_IF_FALSE": False,
+    "POP_JUMP_BACKWARD_IF_TRUE":  True
+}
+UNCONDITIONAL_JUMPS = { "JUMP_FORWARD", "JUMP_ABSOLUTE", "JUMP_BACKWARD", "JUMP_BACKWARD_NO_INTERRUPT" }
+# Jumps to their target once the iterator is exhausted, goes on with the next instruction otherwise
+ITERATION_JUMPS     = { "FOR_ITER" }
+TERMINATORS         = { "RETURN_VALUE", "RETURN_CONST", "RAISE_VARARGS", "RERAISE" }
+
+# Instructions that only push a value on the stack, a condition is a run of them
+EXPRESSION_PREFIXES = ( "LOAD_", "BINARY_", "UNARY_", "COMPARE_OP", "CALL", "PRECALL", "PUSH_NULL", "EXTENDED_ARG", "NOP" )
+
+# A break alone on its line or after the colon of a one line statement, comments aside
+BREAK_STATEMENT = re.compile(r"(^|:)\s*break\s*(#.*)?$")
+
+def is_expression (operation: dis.Instruction):
+    return operation.opname.startswith(EXPRESSION_PREFIXES)
+
+def break_line (code):
+    # Line of the first break statement of the function, None if there is none or the source is unknown.
+    # Every python version compiles break differently, the source is the only common ground.
+    for offset, line in dis.findlinestarts(code):
+        if line is not None and BREAK_STATEMENT.search(linecache.getline(code.co_filename, line).strip()):
+            return line
+    return None
+
+class BasicBlock:
+    __slots__ = ( "index", "start", "end", "successors", "predecessors" )
+
+    def __init__(self, index, start, end):
+        self.index = index
+        self.start = start
+        self.end   = end
+
+        self.successors   = []
+        self.predecessors = []
+
+    def __repr__(self):
+        return f"BasicBlock({self.index}, [{self.start}, {self.end}) -> {self.successors})"
+
+class IfRegion(NamedTuple):
+    negated:     bool
+    true_start:  int
+    true_end:    int
+    false_start: int
+    false_end:   int
+    follow:      int
+
+class LoopRegion(NamedTuple):
+    negated:         bool
+    condition_start: int
+    condition_end:   int
+    body_start:      int
+    body_end:        int
+    follow:          int
+
+class ForRegion(NamedTuple):
+    # The body starts with the store of the loop variable
+    body_start: int
+    body_end:   int
+    follow:     int
+
+class Loop:
+    __slots__ = ( "header", "latches", "body", "region" )
+
+    def __init__(self, header, latches, body):
+        self.header  = header
+        self.latches = latches
+        self.body    = body
+        self.region  = None
+
+def dominator_tree (count, root, successors, predecessors):
+    # Lengauer-Tarjan with path compression, idom[root] and idom of unreachable nodes are None
+    semi   = [ -1 ] * count
+    parent = [ -1 ] * count
+    vertex = []
+
+    stack = [ (root, -1) ]
+    while len(stack) != 0:
+        node, node_parent = stack.pop()
+        if semi[node] != -1: continue
+
+        parent[node] = node_parent
+        semi  [node] = len(vertex)
+        vertex.append(node)
+
+        for successor in reversed(successors[node]):
+            if semi[successor] == -1:
+                stack.append((successor, node))
+
+    ancestor = [ -1 ] * count
+    label    = list(range(count))
+    bucket   = [ [] for _ in range(count) ]
+    idom     = [ None ] * count
+
+    def evaluate (node):
+        if ancestor[node] == -1: return node
+
+        # Path compression, done from the top of the path like the recursive version
+        path = [ node ]
+        while ancestor[ancestor[path[-1]]] != -1:
+            path.append(ancestor[path[-1]])
+        for path_node in reversed(path[:-1]):
+            path_ancestor = ancestor[path_node]
+            if semi[label[path_ancestor]] < semi[label[path_node]]:
+                label[path_node] = label[path_ancestor]
+            ancestor[path_node] = ancestor[path_ancestor]
+
+        return label[node]
+
+    for number in range(len(vertex) - 1, 0, -1):
+        node = vertex[number]
+
+        for predecessor in predecessors[node]:
+            if semi[predecessor] == -1: continue
+
+            best = evaluate(predecessor)
+            if semi[best] < semi[node]:
+                semi[node] = semi[best]
+        bucket[vertex[semi[node]]].append(node)
+        ancestor[node] = parent[node]
+
+        for child in bucket[parent[node]]:
+            best = evaluate(child)
+            idom[child] = best if semi[best] < semi[child] else parent[node]
+        bucket[parent[node]] = []
+
+    for number in range(1, len(vertex)):
+        node = vertex[number]
+        if idom[node] != vertex[semi[node]]:
+            idom[node] = idom[idom[node]]
+
+    return idom
+
+class ControlFlowGraph:
+    def __init__(self, instructions: List[dis.Instruction]):
+        self.instructions = list(instructions)
+        self.indices      = { operation.offset: index for index, operation in enumerate(self.instructions) }
+        self.last_uses    = None
+
+        self.build_blocks()
+
+        # The exit node is a virtual block after every block, reached by every return
+        self.exit = len(self.blocks)
+        returns      = [ block.index for block in self.blocks if len(block.successors) == 0 ]
+        successors   = [ block.successors if len(block.successors) != 0 else [ self.exit ] for block in self.blocks ] + [ [] ]
+        predecessors = [ block.predecessors for block in self.blocks ] + [ returns ]
+
+        self.idom  = dominator_tree(self.exit + 1, 0, successors, predecessors)
+        self.ipdom = dominator_tree(self.exit + 1, self.exit, predecessors, successors)
+
+        self.build_dominator_intervals()
+        self.build_loops()
+
+    def __len__ (self):
+        return len(self.instructions)
+    def __getitem__ (self, index):
+        return self.instructions[index]
+    def __iter__ (self):
+        return iter(self.instructions)
+
+    def index_of (self, offset):
+        return self.indices[offset]
+    def jump_target (self, index):
+        return self.indices[self.instructions[index].argval]
+    def block_of (self, index):
+        return self.blocks[self.block_index[index]]
+
+    def build_blocks (self):
+        count   = len(self.instructions)
+        leaders = { 0 }
+
+        for index, operation in enumerate(self.instructions):
+            if operation.opname in CONDITIONAL_JUMPS or operation.opname in UNCONDITIONAL_JUMPS or operation.opname in ITERATION_JUMPS:
+                leaders.add(self.jump_target(index))
+                leaders.add(index + 1)
+            elif operation.opname in TERMINATORS:
+                leaders.add(index + 1)
+
+        leaders = sorted( leader for leader in leaders if leader < count )
+
+        self.blocks      = [ BasicBlock(index, start, end) for index, (start, end) in enumerate(zip(leaders, leaders[1:] + [ count ])) ]
+        self.block_index = [ 0 ] * count
+        for block in self.blocks:
+            for index in range(block.start, block.end):
+                self.block_index[index] = block.index
+
+        for block in self.blocks:
+            last = self.instructions[block.end - 1]
+
+            if last.opname in UNCONDITIONAL_JUMPS:
+                block.successors.append(self.block_index[self.jump_target(block.end - 1)])
+            elif last.opname not in TERMINATORS and block.end < count:
+                block.successors.append(block.index + 1)
+            if last.opname in CONDITIONAL_JUMPS or last.opname in ITERATION_JUMPS:
+                block.successors.append(self.block_index[self.jump_target(block.end - 1)])
+
+            for successor in block.successors:
+                self.blocks[successor].predecessors.append(block.index)
+
+    def build_dominator_intervals (self):
+        children = [ [] for _ in range(len(self.blocks)) ]
+        for block in self.blocks:
+            if self.idom[block.index] is not None:
+                children[self.idom[block.index]].append(block.index)
+
+        self.tree_in  = [ -1 ] * len(self.blocks)
+        self.tree_out = [ -1 ] * len(self.blocks)
+
+        clock = 0
+        stack = [ (0, False) ]
+        while len(stack) != 0:
+            node, leaving = stack.pop()
+            if leaving:
+                self.tree_out[node] = clock
+                continue
+
+            self.tree_in[node] = clock
+            clock += 1
+            stack.append((node, True))
+            stack.extend( (child, False) for child in children[node] )
+
+    def is_reachable (self, block):
+        # Blocks out of the dominator tree cannot be reached from the entry
+        return self.tree_in[block.index] != -1
+    def dominates (self, a, b):
+        return self.tree_in[a] != -1 and self.tree_in[a] <= self.tree_in[b] and self.tree_out[b] <= self.tree_out[a]
+
+    def build_loops (self):
+        latches = {}
+        for block in self.blocks:
+            for successor in block.successors:
+                if self.dominates(successor, block.index):
+                    latches.setdefault(successor, []).append(block.index)
+
+        self.loops        = []
+        self.loop_of      = [ None ] * len(self.blocks)
+        self.loop_regions = {}
+
+        for header, header_latches in latches.items():
+            body  = { header }
+            stack = [ latch for latch in header_latches if latch != header ]
+            while len(stack) != 0:
+                node = stack.pop()
+                if node in body: continue
+
+                body.add(node)
+                stack.extend(self.blocks[node].predecessors)
+
+            self.loops.append(Loop(header, header_latches, body))
+
+        # Outer loops first so that inner loops overwrite them and can refer to them
+        self.loops.sort(key=lambda loop: -len(loop.body))
+        for loop in self.loops:
+            loop.region = self.loop_region(loop)
+            for node in loop.body:
+                self.loop_of[node] = loop
+
+    def last_use (self, name):
+        # Index of the last instruction reading or writing the local variable, -1 if there is none
+        if self.last_uses is None:
+            self.last_uses = {}
+            for index, operation in enumerate(self.instructions):
+                if operation.opname.endswith("_FAST"):
+                    self.last_uses[operation.argval] = index
+        return self.last_uses.get(name, -1)
+
+    def is_read_after (self, name, index):
+        # Whether the local variable is read from index on before being written again, following the
+        # instructions in order
+        for operation in self.instructions[index:]:
+            if operation.argval != name: continue
+
+            if operation.opname == "LOAD_FAST":  return True
+            if operation.opname == "STORE_FAST": return False
+        return False
+
+    def line_of (self, index):
+        while index > 0 and self.instructions[index].starts_line is None:
+            index -= 1
+        return self.instructions[index].starts_line
+
+    def expression_start (self, block, end):
+        start = end
+        while start > block.start and is_expression(self.instructions[start - 1]):
+            start -= 1
+        return start
+
+    def loop_region (self, loop):
+        header = self.blocks[loop.header]
+        test   = header.end - 1
+        line   = self.line_of(header.start)
+
+        # for loops, FOR_ITER leaves the loop once the iterator is exhausted
+        operation = self.instructions[test]
+        if operation.opname in ITERATION_JUMPS:
+            follow = self.jump_target(test)
+            region = ForRegion(test + 1, follow, follow)
+
+            self.loop_regions[test] = region
+            return region
+
+        # Condition tested at the top, leaving the loop when it fails (python < 3.10)
+        if operation.opname in CONDITIONAL_JUMPS \
+            and self.expression_start(header, test) == header.start \
+            and self.block_index[self.jump_target(test)] not in loop.body:
+            follow = self.jump_target(test)
+            # The exit of an inner loop can jump straight back to the header of the outer loop
+            if follow < header.start:
+                follow = self.loop_of[self.block_index[follow]].region.body_end
+            region = LoopRegion(CONDITIONAL_JUMPS[operation.opname], header.start, test, test + 1, follow, follow)
+
+            self.loop_regions[test] = region
+            return region
+
+        # Condition tested at the bottom and guarded by the same condition before the loop (python >= 3.10)
+        assert len(loop.latches) == 1, f"Unsupported loop at line {line}, continue statements are not implemented"
+        latch = self.blocks[loop.latches[0]]
+        jump  = latch.end - 1
+        guard = header.start - 1
+
+        assert self.instructions[jump].opname in CONDITIONAL_JUMPS and latch.end < len(self.instructions), f"Unsupported loop at line {line}"
+        follow          = latch.end
+        condition_start = self.expression_start(latch, jump)
+
+        assert guard >= 0 and self.instructions[guard].opname in CONDITIONAL_JUMPS, f"Unsupported loop at line {line}"
+        guard_block = self.block_of(guard)
+        guard_start = self.expression_start(guard_block, guard)
+
+        same_condition = [ (operation.opname, operation.argval) for operation in self.instructions[guard_start:guard] ] \
+            == [ (operation.opname, operation.argval) for operation in self.instructions[condition_start:jump] ]
+        same_jumps     = CONDITIONAL_JUMPS[self.instructions[guard].opname] != CONDITIONAL_JUMPS[self.instructions[jump].opname] \
+            and self.jump_target(guard) == follow
+        assert same_condition and same_jumps, f"Unsupported loop at line {line}"
+
+        region = LoopRegion(not CONDITIONAL_JUMPS[self.instructions[jump].opname], condition_start, jump, header.start, condition_start, follow)
+
+        self.loop_regions[guard] = region
+        return region
+
+    def region (self, position):
+        if position in self.loop_regions:
+            return self.loop_regions[position]
+
+        operation   = self.instructions[position]
+        false_start = self.jump_target(position)
+        assert false_start > position, "Backward conditional jumps are only supported as loop conditions"
+
+        follow = self.follow(position, false_start)
+        return IfRegion(CONDITIONAL_JUMPS[operation.opname], position + 1, false_start, false_start, max(follow, false_start), max(follow, false_start))
+
+    def follow (self, position, false_start):
+        block = self.block_of(position)
+        loop  = self.loop_of[block.index]
+        post  = self.ipdom[block.index]
+
+        # Both branches meet again at the immediate post dominator
+        if post is not None and post != self.exit:
+            if loop is not None and post == loop.header:
+                return loop.region.body_end
+            return self.blocks[post].start
+
+        # One of the branches leaves the function, the other one goes on after the if statement
+        last = self.instructions[false_start - 1]
+        if last.opname in UNCONDITIONAL_JUMPS:
+            target = self.jump_target(false_start - 1)
+            if target > false_start - 1: return target
+            if loop is not None:         return loop.region.body_end
+        return false_start
+
+    def chained_if (self, region: IfRegion):
+        # Index of the jump of the if statement filling the whole else branch, None if there is none
+        if region.false_start == region.false_end: return None
+
+        block = self.block_of(region.false_start)
+        jump  = block.end - 1
+        if block.start != region.false_start or jump in self.loop_regions: return None
+        if self.instructions[jump].opname not in CONDITIONAL_JUMPS or self.jump_target(jump) < jump: return None
+        if self.expression_start(block, jump) != block.start: return None
+
+        if self.region(jump).follow != region.follow: return None
+        return jump
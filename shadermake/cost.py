@@ -0,0 +1,179 @@
+# Static cost estimate of a translated function, computed on its optimized statements. It is an upper
+# bound of the work of one invocation rather than a measure : every branch of an if statement is counted,
+# as a divergent group of invocations runs them all, loops with a constant range count their body once per
+# iteration and the other loops once.
+
+from shadermake.ir import Expression, Constant, Attribute, Unary, Binary, Call, Select
+from shadermake.ir import Assign, Return, If, While, For, Block
+
+# ALU lanes of an operation on each type, by GLSL type name
+COMPONENTS = {
+    "bool":  1,
+    "int":   1,
+    "float": 1,
+    "vec2":  2,
+    "vec3":  3,
+    "vec4":  4,
+    "mat4": 16
+}
+# Matrix products are dot products, one multiply-add per component of every row
+MATRIX_PRODUCTS = {
+    ("mat4", "vec4"): 16,
+    ("vec4", "mat4"): 16,
+    ("mat4", "mat4"): 64
+}
+
+class CostReport:
+    METRICS = ( "alu", "ops", "calls", "branches", "loops", "dynamic_loops", "depth" )
+
+    def __init__(self):
+        # Operations counted by the widest type of their operands
+        self.ops           = {}
+        # Weighted ALU cost, the component count of every operation
+        self.alu           = 0
+        # Calls to GLSL functions and bound shaders by name, constructors are free
+        self.calls         = {}
+        self.branches      = 0
+        self.loops         = 0
+        # Loops whose number of iterations is not known at translation time
+        self.dynamic_loops = 0
+        # Deepest nesting of if statements and loops
+        self.depth         = 0
+
+    def add (self, other, times=1):
+        for name, count in other.ops.items():
+            self.ops[name] = self.ops.get(name, 0) + count * times
+        for name, count in other.calls.items():
+            self.calls[name] = self.calls.get(name, 0) + count * times
+
+        self.alu           += other.alu * times
+        self.branches      += other.branches * times
+        self.loops         += other.loops * times
+        self.dynamic_loops += other.dynamic_loops * times
+        self.depth          = max(self.depth, other.depth)
+
+    def metric (self, name):
+        # ops and calls are totals for a budget
+        assert name in self.METRICS, f"Unknown cost metric {name}, expected one of {', '.join(self.METRICS)}"
+
+        value = getattr(self, name)
+        return sum(value.values()) if isinstance(value, dict) else value
+
+    def as_dict (self):
+        return { name: dict(getattr(self, name)) if isinstance(getattr(self, name), dict) else getattr(self, name) for name in self.METRICS }
+    @staticmethod
+    def from_dict (values):
+        report = CostReport()
+        for name in CostReport.METRICS:
+            setattr(report, name, dict(values[name]) if isinstance(values[name], dict) else values[name])
+        return report
+
+    def __repr__ (self):
+        return "CostReport(" + ", ".join( f"{name}={getattr(self, name)!r}" for name in self.METRICS ) + ")"
+
+def over_budget (report: CostReport, budget):
+    # (metric, value, limit) of every metric of the budget dict exceeded by the report
+    exceeded = []
+    for name, limit in budget.items():
+        value = report.metric(name)
+        if value > limit:
+            exceeded.append((name, value, limit))
+    return exceeded
+
+class CostEstimator:
+    # typename gives the GLSL type name of an IR type. bound_cost(name, argument types) gives the CostReport
+    # of the bound shader a call goes to, inlined at each call, or None for other functions : bound shaders
+    # sharing a name are overloads told apart by the argument types. Types are the constructors, not counted
+    # as calls.
+    def __init__(self, typename, bound_cost, types=()):
+        self.typename   = typename
+        self.bound_cost = bound_cost
+        self.types      = set(types)
+
+    def expression (self, node: Expression, report: CostReport, visited):
+        # A node shared inside a statement is computed once, in a temporary
+        if node in visited: return
+        visited.add(node)
+
+        for child in node.children():
+            self.expression(child, report, visited)
+
+        if isinstance(node, (Unary, Binary)):
+            operands = [ self.typename(child.type) for child in node.children() ]
+            widest   = max(operands, key=lambda name: COMPONENTS.get(name, 1))
+
+            if isinstance(node, Binary) and node.operand == "*" and tuple(operands) in MATRIX_PRODUCTS:
+                alu = MATRIX_PRODUCTS[tuple(operands)]
+            else:
+                alu = COMPONENTS.get(widest, 1)
+
+            report.ops[widest] = report.ops.get(widest, 0) + 1
+            report.alu        += alu
+        elif isinstance(node, Select):
+            # One select instruction per component, both values are already counted
+            typename = self.typename(node.type)
+            report.ops[typename] = report.ops.get(typename, 0) + 1
+            report.alu          += COMPONENTS.get(typename, 1)
+        elif isinstance(node, Call) and node.function not in self.types:
+            report.calls[node.function] = report.calls.get(node.function, 0) + 1
+
+            cost = self.bound_cost(node.function, [ arg.type for arg in node.args ])
+            if cost is not None:
+                report.add(cost)
+            else:
+                report.alu += COMPONENTS.get(self.typename(node.type), 1)
+
+    def statements (self, statements, report: CostReport):
+        for statement in statements:
+            if isinstance(statement, (Assign, Return)):
+                for node in statement.expressions():
+                    self.expression(node, report, set())
+            elif isinstance(statement, If):
+                report.branches += len(statement.branches)
+
+                bodies = [ body for (condition, body) in statement.branches ]
+                if statement.orelse is not None:
+                    bodies.append(statement.orelse)
+                for condition, body in statement.branches:
+                    self.expression(condition, report, set())
+                self.nested(bodies, report, 1)
+            elif isinstance(statement, While):
+                report.branches      += 1
+                report.loops         += 1
+                report.dynamic_loops += 1
+
+                self.expression(statement.condition, report, set())
+                self.nested([ statement.body ], report, 1)
+            elif isinstance(statement, For):
+                report.branches += 1
+                report.loops    += 1
+
+                times = 1
+                if isinstance(statement.start, Constant) and isinstance(statement.stop, Constant):
+                    times = len(range(statement.start.value, statement.stop.value, statement.step))
+                else:
+                    report.dynamic_loops += 1
+                    self.expression(statement.start, report, set())
+
+                # The test and the increment run on every iteration
+                body = CostReport()
+                self.expression(statement.stop, body, set())
+                body.ops["int"] = body.ops.get("int", 0) + 1
+                body.alu       += 1
+                self.nested([ statement.body ], report, times, body)
+            elif isinstance(statement, Block):
+                self.statements(statement.body, report)
+
+    def nested (self, bodies, report: CostReport, times, nested=None):
+        nested = nested or CostReport()
+        for body in bodies:
+            self.statements(body, nested)
+
+        depth = nested.depth
+        report.add(nested, times)
+        report.depth = max(report.depth, depth + 1)
+
+    def estimate (self, statements) -> CostReport:
+        report = CostReport()
+        self.statements(statements, report)
+        return report
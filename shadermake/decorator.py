@@ -1,17 +1,31 @@
-
 from typing import List, Tuple, Any
 
-from shadermake.engine         import AbstractEngine
+from shadermake.engine         import AbstractEngine, LazyShader, ShaderPermutations
 from shadermake.engines.opengl import OpenGLEngine, ShaderOptions
 
 from shadermake.engines.opengl import vec2, vec3, vec4
 
-def make_shader(engine, argument_types=[], bound_shaders=[], *args, **kwargs):
+# Used when make_shader is called without lazy, the batch compiler enables it to import modules without translating
+DEFAULT_LAZY = False
+
+def make_shader(engine, argument_types=(), bound_shaders=(), *args, lazy=None, **kwargs):
     manager: AbstractEngine = engine()
 
     def wrapper(function):
+        if lazy or (lazy is None and DEFAULT_LAZY):
+            return LazyShader(manager, function, argument_types, bound_shaders, *args, **kwargs)
+
         shader = manager.generate(function, argument_types, bound_shaders, *args, **kwargs)
 
         return shader
     
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+def make_permutations(engine, specializations, argument_types=(), bound_shaders=(), *args, lazy=None, **kwargs):
+    # specializations maps each constant name to the list of its values, one shader is made per combination
+    manager: AbstractEngine = engine()
+
+    def wrapper(function):
+        return ShaderPermutations(manager, function, argument_types, bound_shaders, specializations, lazy or (lazy is None and DEFAULT_LAZY), *args, **kwargs)
+    
+    return wrapper
@@ -1,7 +1,168 @@
+import itertools
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from shadermake.profiling import ShaderStats
+
+class OpcodeDispatcher:
+    # Bytecode handlers are the compute__<OPNAME> methods and the registered handlers, found along the MRO
+    # like methods. Each class keeps them in one table, built again when a base class registers a handler.
+    opcode_handlers    = {}
+    registered_opcodes = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        cls.registered_opcodes = {}
+        cls.collect_opcodes()
+
+    @classmethod
+    def collect_opcodes (cls):
+        handlers = {}
+        for base in reversed(cls.__mro__):
+            for name in vars(base):
+                if name.startswith("compute__"):
+                    handlers[name[len("compute__"):]] = getattr(cls, name)
+            handlers.update(vars(base).get("registered_opcodes", {}))
+        cls.opcode_handlers = handlers
+
+        for subclass in cls.__subclasses__():
+            subclass.collect_opcodes()
+
+    @classmethod
+    def register_opcode (cls, opname, handler=None):
+        def register (handler):
+            cls.registered_opcodes[opname] = handler
+            cls.collect_opcodes()
+            return handler
+        
+        if handler is None: return register
+        return register(handler)
+
+    def validate_opcodes (self, function_code):
+        missing = sorted({ operation.opname for operation in function_code if operation.opname not in self.opcode_handlers })
+        assert len(missing) == 0, f"{', '.join(missing)} not implemented by {self.__class__.__name__}"
+
+class AbstractEngine(OpcodeDispatcher):
+    # Set to a shadermake.profiling.TranslationProfiler to collect the statistics of every translation
+    profiler = None
+    # Statistics of the translation in progress, None when profiling is disabled
+    stats    = None
 
-class AbstractEngine:
     def __init__(self):
         assert self.__class__ != AbstractEngine, "Cannot create AbstractEngine object"
 
     def generate (self, function):
-        return None
\ No newline at end of file
+        return None
+
+    def begin_stats (self, name):
+        self.stats = None if self.profiler is None else ShaderStats(name)
+        return self.stats
+    def end_stats (self, cached=None):
+        if self.stats is None: return
+
+        self.stats.finish(cached)
+        self.profiler.record(self.stats)
+
+    def generate_many (self, jobs, max_workers=None, **kwargs):
+        # Translates shaders on a thread pool, each job is a tuple of the positional arguments of generate
+        # (function, argument_types, bound_shaders, ...) and kwargs are given to every translation.
+        # The shaders are returned in the order of the jobs.
+        with ThreadPoolExecutor(max_workers) as pool:
+            return list(pool.map(lambda job: self.generate(*job, **kwargs), jobs))
+
+    def resolve_shaders (self, bound_shaders):
+        return [ shader.resolve() if isinstance(shader, LazyShader) else shader for shader in bound_shaders ]
+
+class LazyShader:
+    def __init__(self, manager: AbstractEngine, function, argument_types, bound_shaders, *args, **kwargs):
+        self.manager = manager
+
+        self.__function       = function
+        self.__argument_types = argument_types
+        self.__bound_shaders  = bound_shaders
+
+        self.__args   = args
+        self.__kwargs = kwargs
+        self.__shader = None
+        # Shaders binding this one may resolve it from several threads at once
+        self.__lock   = threading.RLock()
+    
+    def python_function (self):
+        return self.__function
+    def bound_shaders (self):
+        return self.__bound_shaders
+
+    def resolved (self):
+        return self.__shader is not None
+    def resolve (self):
+        if self.__shader is None:
+            with self.__lock:
+                if self.__shader is None:
+                    self.__shader = self.manager.generate(self.__function, self.__argument_types, self.__bound_shaders, *self.__args, **self.__kwargs)
+        return self.__shader
+
+    def c_code (self, minify=False):
+        return self.resolve().c_code(minify)
+    def write_c_code (self, out, minify=False):
+        return self.resolve().write_c_code(out, minify)
+    def name (self):
+        return self.resolve().name()
+    def args (self):
+        return self.resolve().args()
+    def find_variant (self, variables):
+        return self.resolve().find_variant(variables)
+
+    def __getattr__ (self, name):
+        if name.startswith("_LazyShader__"): raise AttributeError(name)
+
+        return getattr(self.resolve(), name)
+
+class ShaderPermutations:
+    # Variants of one function specialized on every combination of the values of its constants. Each variant
+    # is translated once, for its set of constants, with the constants inlined as literals.
+    def __init__(self, manager: AbstractEngine, function, argument_types, bound_shaders, specializations, lazy, *args, **kwargs):
+        self.manager = manager
+
+        self.__function       = function
+        self.__argument_types = argument_types
+        self.__bound_shaders  = bound_shaders
+        self.__names          = tuple(specializations)
+        self.__lazy           = lazy
+
+        self.__args     = args
+        self.__kwargs   = kwargs
+        self.__variants = {}
+
+        for values in itertools.product(*specializations.values()):
+            self.get(**dict(zip(self.__names, values)))
+
+    def python_function (self):
+        return self.__function
+    def names (self):
+        return self.__names
+
+    def variant_key (self, constants):
+        assert set(constants) == set(self.__names), f"Expected values for the constants {', '.join(self.__names)}"
+        # 1, 1.0 and True are different variants
+        return tuple( (name, constants[name].__class__, constants[name]) for name in self.__names )
+    def get (self, **constants):
+        key = self.variant_key(constants)
+        if key not in self.__variants:
+            kwargs = dict(self.__kwargs, constants=dict(self.__kwargs.get("constants") or {}, **constants))
+
+            if self.__lazy:
+                self.__variants[key] = LazyShader(self.manager, self.__function, self.__argument_types, self.__bound_shaders, *self.__args, **kwargs)
+            else:
+                self.__variants[key] = self.manager.generate(self.__function, self.__argument_types, self.__bound_shaders, *self.__args, **kwargs)
+        return self.__variants[key]
+    def __getitem__ (self, constants):
+        return self.get(**constants)
+
+    def __len__ (self):
+        return len(self.__variants)
+    def __iter__ (self):
+        # (constants, shader) for every variant built so far
+        for key, shader in self.__variants.items():
+            yield { name: value for (name, type, value) in key }, shader
@@ -0,0 +1,254 @@
+# Runs translated shaders on numpy arrays, one row per vertex or fragment. The executor walks the optimized
+# statements the GLSL code is printed from, so what it checks is the translation and not the python function :
+# folded constants, unrolled loops, flattened branches and conditional expressions run as they are emitted.
+
+from typing import List
+
+import numpy as np
+
+from shadermake.engine         import LazyShader
+from shadermake.engines.opengl import GLSL_Authorized_Functions, _GLSL_Shader
+from shadermake.engines.opengl import _t_NoneType, _t_void, _t_bool, _t_int, _t_float, _t_vec2, _t_vec3, _t_vec4, _t_mat4
+from shadermake.ir             import Expression, Constant, Variable, Attribute, Unary, Binary, Call, Select
+from shadermake.ir             import Statement, Assign, Return, If, While, For, Declare, Block, Raw
+
+NUMPY_DTYPES = {
+    _t_bool:  np.bool_,
+    _t_int:   np.int32,
+    _t_float: np.float32,
+    _t_vec2:  np.float32,
+    _t_vec3:  np.float32,
+    _t_vec4:  np.float32,
+    _t_mat4:  np.float32
+}
+# Shape of one element, matrices are stored column major like in GLSL : m[column][row]
+NUMPY_SHAPES = {
+    _t_bool:  (),
+    _t_int:   (),
+    _t_float: (),
+    _t_vec2:  (2, ),
+    _t_vec3:  (3, ),
+    _t_vec4:  (4, ),
+    _t_mat4:  (4, 4)
+}
+NUMPY_OPERANDS = {
+    '+':  np.add,
+    '-':  np.subtract,
+    '*':  np.multiply,
+    '>':  np.greater,
+    '>=': np.greater_equal,
+    '<':  np.less,
+    '<=': np.less_equal,
+    '==': np.equal,
+    '!=': np.not_equal,
+    '&&': np.logical_and,
+    '||': np.logical_or,
+    '^^': np.logical_xor
+}
+
+def select (mask, value, previous):
+    mask = mask.reshape(mask.shape + (1, ) * (np.ndim(value) - 1))
+    return np.where(mask, value, previous)
+
+class _Frame:
+    def __init__(self, variables, count):
+        self.variables = variables
+        self.returned  = np.zeros(count, dtype=np.bool_)
+        self.result    = None
+
+class NumpyExecutor:
+    def __init__(self, shader: _GLSL_Shader):
+        if isinstance(shader, LazyShader):
+            shader = shader.resolve()
+
+        self.shader = shader
+
+    def make_value (self, type, value, count):
+        value = np.asarray(value, dtype=NUMPY_DTYPES[type])
+        shape = (count, ) + NUMPY_SHAPES[type]
+
+        if value.shape == NUMPY_SHAPES[type]:
+            return np.broadcast_to(value, shape)
+        assert value.shape == shape, f"Expected shape {shape}, got {value.shape}"
+
+        return value
+
+    def run (self, inputs={}, uniforms={}, arguments=[], count=None):
+        options = self.shader.shader_options
+
+        if count is None:
+            sized = list(inputs.values()) + list(arguments)
+            assert len(sized) != 0, "Cannot guess the number of elements without inputs or arguments, use count"
+            count = len(sized[0])
+
+        self.globals = {}
+        for (type, name, *args) in options.allVars():
+            if name in inputs:
+                self.globals[name] = (type, self.make_value(type, inputs[name], count))
+            elif name in uniforms:
+                self.globals[name] = (type, self.make_value(type, uniforms[name], count))
+            else:
+                self.globals[name] = (type, np.zeros((count, ) + NUMPY_SHAPES[type], dtype=NUMPY_DTYPES[type]))
+
+        arguments = [ (type, self.make_value(type, value, count)) for (type, name), value in zip(self.shader.args(), arguments) ]
+        result    = self.call(self.shader, arguments, np.ones(count, dtype=np.bool_))
+
+        block_members = [ member for (name, members, layout, binding) in options.uniformBlocks() for member in members ]
+        input_names   = set(inputs) | set(uniforms) | { name for (type, name, *args) in options.inputs() + options.uniform() + block_members }
+        outputs       = { name: value for name, (type, value) in self.globals.items() if name not in input_names }
+        if result is not None:
+            outputs["return"] = result[1]
+
+        return outputs
+
+    def call (self, shader, arguments, mask):
+        # Only the elements of the mask write the globals, the others get the value of a skipped call
+        frame = _Frame({ name: value for (type, name), value in zip(shader.args(), arguments) }, len(mask))
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.execute(shader.statements(), frame, mask, shader)
+
+        if frame.result is None:
+            return None
+        return (shader.end_type(), frame.result)
+
+    def store (self, frame: _Frame, mask, name, value):
+        variables = frame.variables
+        if name not in variables and name in self.globals:
+            variables = self.globals
+
+        active = mask & ~frame.returned
+        if name in variables and not active.all():
+            type, previous = variables[name]
+            value = (value[0], select(active, value[1], previous))
+
+        variables[name] = value
+
+    def broadcast (self, type, value, mask):
+        return np.broadcast_to(value, mask.shape + NUMPY_SHAPES[type])
+
+    def condition (self, node: Expression, frame: _Frame, mask, shader):
+        assert node.type.castable(_t_bool), "Only a boolean can be used as a condition"
+        return np.broadcast_to(self.evaluate(node, frame, mask, shader, {}), mask.shape)
+
+    def execute (self, statements: List[Statement], frame: _Frame, mask, shader):
+        for statement in statements:
+            mask = mask & ~frame.returned
+            if not mask.any(): return
+
+            if isinstance(statement, Assign):
+                value = self.evaluate(statement.value, frame, mask, shader, {})
+                self.store(frame, mask, statement.name, (statement.value.type, self.broadcast(statement.value.type, value, mask)))
+            elif isinstance(statement, Return):
+                if statement.value is not None and statement.value.type not in (_t_NoneType, _t_void):
+                    value = self.broadcast(statement.value.type, self.evaluate(statement.value, frame, mask, shader, {}), mask)
+                    frame.result = value if frame.result is None else select(mask, value, frame.result)
+
+                frame.returned = frame.returned | mask
+            elif isinstance(statement, If):
+                # Every branch runs on the elements taking it, a condition is only evaluated where the
+                # previous ones failed
+                remaining = mask
+                for condition, body in statement.branches:
+                    taken = remaining & self.condition(condition, frame, remaining, shader)
+                    if taken.any():
+                        self.execute(body, frame, taken, shader)
+                    remaining = remaining & ~taken
+                if statement.orelse is not None and remaining.any():
+                    self.execute(statement.orelse, frame, remaining, shader)
+            elif isinstance(statement, While):
+                # Every element runs the loop until its own condition fails
+                active = mask & self.condition(statement.condition, frame, mask, shader)
+                while active.any():
+                    self.execute(statement.body, frame, active, shader)
+
+                    active = active & ~frame.returned
+                    active = active & self.condition(statement.condition, frame, active, shader)
+            elif isinstance(statement, For):
+                # Every element runs the loop until its own range ends
+                value = self.broadcast(_t_int, self.evaluate(statement.start, frame, mask, shader, {}), mask).astype(np.int32)
+                while True:
+                    stop   = self.evaluate(statement.stop, frame, mask, shader, {})
+                    active = mask & ~frame.returned & ((value < stop) if statement.step > 0 else (value > stop))
+                    if not active.any(): break
+
+                    self.store(frame, active, statement.name, (_t_int, value))
+                    self.execute(statement.body, frame, active, shader)
+                    value = (value + statement.step).astype(np.int32)
+            elif isinstance(statement, Block):
+                self.execute(statement.body, frame, mask, shader)
+            elif isinstance(statement, Declare):
+                continue
+            else:
+                assert not isinstance(statement, Raw), "Code given as text by an opcode handler cannot be executed"
+                assert False, f"Unsupported statement {statement.__class__.__name__}"
+
+    def evaluate (self, node: Expression, frame: _Frame, mask, shader, values):
+        # values keeps the nodes already computed in the statement, an expression is a graph of shared nodes
+        if node in values:
+            return values[node]
+
+        if isinstance(node, Constant):
+            value = None if node.value is None else NUMPY_DTYPES[node.type](node.value)
+        elif isinstance(node, Variable):
+            variables = frame.variables if node.name in frame.variables else self.globals
+            assert node.name in variables, f"{node.name} is read before being assigned"
+            value = variables[node.name][1]
+        elif isinstance(node, Attribute):
+            value = self.evaluate(node.value, frame, mask, shader, values)[..., "xyzw".index(node.name)]
+        elif isinstance(node, Unary):
+            value = self.evaluate(node.value, frame, mask, shader, values)
+            value = np.logical_not(value) if node.operand == "!" else np.negative(value)
+        elif isinstance(node, Binary):
+            value = self.binary(node, self.evaluate(node.left, frame, mask, shader, values), self.evaluate(node.right, frame, mask, shader, values))
+        elif isinstance(node, Select):
+            condition, a, b = [ self.evaluate(child, frame, mask, shader, values) for child in node.children() ]
+            value = select(np.broadcast_to(condition, mask.shape), self.broadcast(node.type, a, mask), self.broadcast(node.type, b, mask))
+        elif isinstance(node, Call):
+            value = self.make_call(node, [ (arg.type, self.evaluate(arg, frame, mask, shader, values)) for arg in node.args ], mask, shader)
+        else:
+            assert False, f"Unsupported expression {node.__class__.__name__}"
+
+        if value is not None and node.type in NUMPY_DTYPES:
+            value = np.asarray(value).astype(NUMPY_DTYPES[node.type], copy=False)
+
+        values[node] = value
+        return value
+
+    def binary (self, node: Binary, a, b):
+        type_a, type_b = node.left.type, node.right.type
+
+        if node.operand == '*' and type_a == _t_mat4 and type_b == _t_vec4:
+            return np.einsum("...ij,...i->...j", a, b)
+        if node.operand == '*' and type_a == _t_mat4 and type_b == _t_mat4:
+            return np.einsum("...kj,...ik->...ij", a, b)
+        if node.operand == '/' and node.type == _t_int:
+            # GLSL integer division truncates toward zero
+            return np.trunc(np.true_divide(a, b))
+        if node.operand == '/':
+            return np.true_divide(a, b)
+        if node.operand == '%' and node.type == _t_int:
+            return np.fmod(a, b)
+        if node.operand == '%':
+            return np.mod(a, b)
+
+        return NUMPY_OPERANDS[node.operand](a, b)
+
+    def make_call (self, node: Call, args, mask, shader):
+        if node.function in GLSL_Authorized_Functions:
+            # Builtin constructors : every component is broadcast then stacked on the last axis
+            components = np.broadcast_arrays(*[ np.asarray(value, dtype=NUMPY_DTYPES[node.type]) for type, value in args ], np.empty(mask.shape))
+            return np.stack(components[:-1], axis=-1)
+
+        # Bound shaders of the same name are overloads, told apart by their parameter types
+        for bound_shader in shader.bound_shaders():
+            if bound_shader.name() != node.function: continue
+
+            variant = bound_shader.find_variant(args)
+            if variant is None: continue
+
+            arguments = [ (type, self.broadcast(type, value, mask)) for type, value in args ]
+            result    = self.call(variant, arguments, mask)
+            return None if result is None else result[1]
+
+        assert False, f"No shader named {node.function} accepts these arguments"
@@ -1,14 +1,26 @@
 
 from typing import List
 from shadermake.engine import AbstractEngine
-
+from shadermake.cache  import MemoryCache, code_signature, make_key
+from shadermake.cfg    import ControlFlowGraph, LoopRegion, ForRegion, break_line
+from shadermake.cost   import CostEstimator, CostReport, over_budget
+from shadermake.layout import BlockLayout, VertexLayout
+from shadermake.minify import minify
+from shadermake.ir     import Expression, Constant, Variable, Attribute, Unary, Binary, Call, Select
+from shadermake.ir     import Statement, Assign, Return, If, While, For, Declare, Block, Raw, ExpressionTable, common_subexpressions
+from shadermake.optimize import Optimizer, used_names, assigned_names, is_impure
+from shadermake.scope    import Scope
+
+import copy
 import dis
+import io
 
 class ShaderOptions:
     def __init__(self):
         self.__inputs  = []
         self.__outputs = []
         self.__uniform = []
+        self.__blocks  = []
 
         self.__type = None
     
@@ -21,12 +33,24 @@ class ShaderOptions:
     def inputs (self): return self.__inputs
     def outputs(self): return self.__outputs
     def uniform(self): return self.__uniform
+    def uniformBlocks(self): return self.__blocks
+    def uniformBlockLayout(self, name):
+        for (block_name, members, layout, binding) in self.__blocks:
+            if block_name == name:
+                return BlockLayout(name, [ (type.typename(), member_name) for (type, member_name) in members ], layout)
+        assert False, f"No uniform block named {name}"
+    def vertexLayout(self):
+        # Interleaved vertex buffer layout of the inputs
+        return VertexLayout([ (type.typename(), name, location) for (type, name, location) in self.inputs() ])
     def allVars(self):
+        # The members of uniform blocks are used like loose uniforms
+        block_members = [ member for (name, members, layout, binding) in self.__blocks for member in members ]
+
         if self.__type == "vertex":
-            return self.inputs() + self.outputs() + self.uniform() + [ (_t_vec4, "gl_Position"), (_t_float, "gl_PointSize") ]
+            return self.inputs() + self.outputs() + self.uniform() + block_members + [ (_t_vec4, "gl_Position"), (_t_float, "gl_PointSize") ]
         if self.__type == "fragment":
-            return self.inputs() + self.outputs() + self.uniform()
-        return self.inputs() + self.outputs() + self.uniform()
+            return self.inputs() + self.outputs() + self.uniform() + block_members
+        return self.inputs() + self.outputs() + self.uniform() + block_members
 
     def addInput (self, type, name, location=None):
         type = transform_native_type(type)
@@ -40,27 +64,104 @@ class ShaderOptions:
         type = transform_native_type(type)
         self.__uniform.append((type, name))
         return self
+    def addUniformBlock(self, name, members, layout="std140", binding=None):
+        # members is a list of (type, name), the layout gives the offset of every member (see uniformBlockLayout)
+        members = [ (transform_native_type(type), member_name) for (type, member_name) in members ]
+        BlockLayout(name, [ (type.typename(), member_name) for (type, member_name) in members ], layout)
+
+        self.__blocks.append((name, members, layout, binding))
+        return self
+    def signature(self):
+        return (
+            self.__type,
+            tuple( (type.typename(), name, *args) for (type, name, *args) in self.inputs() ),
+            tuple( (type.typename(), name, *args) for (type, name, *args) in self.outputs() ),
+            tuple( (type.typename(), name) for (type, name) in self.uniform() ),
+            tuple(
+                (name, tuple( (type.typename(), member_name) for (type, member_name) in members ), layout, binding)
+                for (name, members, layout, binding) in self.uniformBlocks()
+            )
+        )
+
+
+class _GLSL_Operation_Table:
+    # Resulting type of every (operand, left type, right type), in a flat list indexed by the operand
+    # and type ids. None when the operation is not allowed.
+    OPERANDS = [ '+', '-', '*', '/', '%', '>', '>=', '<', '<=', '==', '!=', '&&', '||', '^^' ]
 
+    def __init__(self):
+        self.operand_ids = { operand: idx for idx, operand in enumerate(self.OPERANDS) }
+        self.types       = []
+        self.capacity    = 16
+        self.table       = [ None ] * (len(self.operand_ids) * self.capacity * self.capacity)
+
+        # link_any results apply to every operand, including the ones added later
+        self.any_links = {}
+
+    def index (self, operand_id, left_id, right_id):
+        return (operand_id * self.capacity + left_id) * self.capacity + right_id
+
+    def resize (self, capacity):
+        count = len(self.types)
+        table = [ None ] * (len(self.operand_ids) * capacity * capacity)
+        for operand_id in range(len(self.operand_ids)):
+            for left_id in range(count):
+                row     = self.index(operand_id, left_id, 0)
+                new_row = (operand_id * capacity + left_id) * capacity
+                table[new_row:new_row + count] = self.table[row:row + count]
+
+        self.table    = table
+        self.capacity = capacity
+    def add_type (self, type):
+        if len(self.types) == self.capacity:
+            self.resize(self.capacity * 2)
+
+        self.types.append(type)
+        return len(self.types) - 1
+    def operand_id (self, operand):
+        if operand not in self.operand_ids:
+            self.table.extend([ None ] * (self.capacity * self.capacity))
+            self.operand_ids[operand] = len(self.operand_ids)
+
+            for (left_id, right_id), end_type in self.any_links.items():
+                self.table[self.index(self.operand_ids[operand], left_id, right_id)] = end_type
+        return self.operand_ids[operand]
+
+    def link (self, operand, left, right, end_type):
+        if (left.id, right.id) in self.any_links: return
+        self.table[self.index(self.operand_id(operand), left.id, right.id)] = end_type
+    def link_any (self, left, right, end_type):
+        self.any_links[(left.id, right.id)] = end_type
+        for operand_id in self.operand_ids.values():
+            self.table[self.index(operand_id, left.id, right.id)] = end_type
+
+    def lookup (self, operand, left, right):
+        operand_id = self.operand_ids.get(operand)
+        if operand_id is None: return None
+
+        return self.table[(operand_id * self.capacity + left.id) * self.capacity + right.id]
+
+GLSL_Operations = _GLSL_Operation_Table()
 
 class _GLSL_Type:
+    __slots__ = ( "id", "__typename", "__castable", "__attributes" )
+
     def __init__(self, typename):
         self.__typename = typename
-        self.__operands = {}
-        self.__any_oper = {}
         self.__castable = set()
         self.__attributes = {}
+
+        self.id = GLSL_Operations.add_type(self)
     def typename(self):
         return self.__typename
     def castable (self, other_type):
         return other_type in self.__castable or other_type == self
     
     def link_operand (self, operand, type, end_type):
-        if operand not in self.__operands: self.__operands[operand] = {}
-        
-        self.__operands[operand][type] = end_type
+        GLSL_Operations.link(operand, self, type, end_type)
         return self
     def link_any (self, type, end_type):
-        self.__any_oper[type] = end_type
+        GLSL_Operations.link_any(self, type, end_type)
         return self
     def link_array(self, operands, type, end_type):
         for operand in operands:
@@ -78,12 +179,14 @@ class _GLSL_Type:
     def get_attribute_type (self, name):
         return self.__attributes[name]
     def get_resulting_type (self, operand, type):
-        if type in self.__any_oper:
-            return self.__any_oper[type]
-        assert operand in self.__operands, f"Operand {operand} cannot be used on type {self.typename()}"
-        assert type in self.__operands[operand], f"Type {type.typename()} cannot be used with operand {operand} on type {self.typename()}"
+        end_type = GLSL_Operations.lookup(operand, self, type)
+        if end_type is None:
+            # Only failures pay for finding out which part of the operation is wrong
+            allowed = any( GLSL_Operations.lookup(operand, self, other) is not None for other in GLSL_Operations.types )
+            assert allowed, f"Operand {operand} cannot be used on type {self.typename()}"
+            assert False, f"Type {type.typename()} cannot be used with operand {operand} on type {self.typename()}"
 
-        return self.__operands[operand][type]
+        return end_type
 
 class _GLSL_Variant:
     def __init__(self, end_type, input_types=[]):
@@ -98,34 +201,59 @@ class _GLSL_Variant:
         
         return True
     def end_type(self): return self.__end_type
-    def make (self, args):
-        arr = []
-        for typename, arg in args:
-            arr.append(arg)
-        return f"({', '.join(map(str, arr))})"
 
 class _GLSL_Pure_Function:
     def __init__(self, name):
         self.__name     = name
         self.__variants = []
+
+        # Variant chosen for each tuple of argument type ids
+        self.__resolved = {}
     def name (self):
         return self.__name
     def find_variant(self, variables):
-        for variant in self.__variants:
-            if variant.validate(variables):
-                return variant
+        key = tuple( type.id for (type, value) in variables )
+        if key in self.__resolved:
+            return self.__resolved[key]
+
+        variant = None
+        for candidate in self.__variants:
+            if candidate.validate(variables):
+                variant = candidate
+                break
         
-        return None
+        self.__resolved[key] = variant
+        return variant
     def link_variant (self, variant):
         self.__variants.append(variant)
+        self.__resolved.clear()
         return self
 
+class _GLSL_Overloads:
+    # Bound shaders sharing a name, a call goes to the first one accepting its arguments
+    def __init__(self, shaders):
+        self.__shaders = shaders
+    def name (self):
+        return self.__shaders[0].name()
+    def find_variant(self, variables):
+        for shader in self.__shaders:
+            variant = shader.find_variant(variables)
+            if variant is not None:
+                return variant
+        return None
+
 class _GLSL_Shader(_GLSL_Variant):
-    def __init__(self, name, args, end_type, c_code, bound_shaders, python_function, shader_options: ShaderOptions):
+    def __init__(self, name, args, end_type, c_code, bound_shaders, python_function, shader_options: ShaderOptions, key=None, cost=None, constants=None, statements=None):
         super().__init__(end_type, list(map(lambda T: T[0], args)))
         self.__args   = args
         self.__name   = name
         self.__c_code = c_code
+        self.__key    = key
+        self.__cost   = cost
+        # Specialization constants inlined in the code, closure values included
+        self.constants = dict(constants or {})
+        # Optimized statements the code is printed from, or a function translating them again
+        self.__statements = statements
 
         self.__bound_shaders = bound_shaders
 
@@ -136,114 +264,510 @@ class _GLSL_Shader(_GLSL_Variant):
             return self
         return None
         
-    def c_code(self):
-        try:
-            return self.__r_c_code
-        except Exception: pass
-
-        self.__r_c_code = ""
+    def vertex_layout(self):
+        return self.shader_options.vertexLayout()
+    def declarations(self):
+        declarations = []
 
         for (type, name, *args) in self.shader_options.inputs():
             if len(args) == 0 or args[0] is None:
-                self.__r_c_code += f"in {type.typename()} {name};\n"
+                declarations.append((name, f"in {type.typename()} {name};\n"))
             else:
                 location = args[0]
-                self.__r_c_code += f"layout(location = {location}) in {type.typename()} {name};\n"
+                declarations.append((name, f"layout(location = {location}) in {type.typename()} {name};\n"))
         for (type, name, *args) in self.shader_options.outputs():
             if len(args) == 0 or args[0] is None:
-                self.__r_c_code += f"out {type.typename()} {name};\n"
+                declarations.append((name, f"out {type.typename()} {name};\n"))
             else:
                 location = args[0]
-                self.__r_c_code += f"layout(location = {location}) out {type.typename()} {name};\n"
+                declarations.append((name, f"layout(location = {location}) out {type.typename()} {name};\n"))
         for (type, name) in self.shader_options.uniform():
-            self.__r_c_code += f"uniform {type.typename()} {name};\n"
+            declarations.append((name, f"uniform {type.typename()} {name};\n"))
+        for (name, members, layout, binding) in self.shader_options.uniformBlocks():
+            qualifiers = layout if binding is None else f"{layout}, binding = {binding}"
+            body       = "".join( f"\t{type.typename()} {member_name};\n" for (type, member_name) in members )
+            # std430 is only allowed on shader storage blocks
+            storage    = "buffer" if layout == "std430" else "uniform"
+            declarations.append((name, f"layout({qualifiers}) {storage} {name} {{\n{body}}};\n"))
+        
+        return declarations
+    def called_shaders(self):
+        # Bound shaders the function never refers to are not linked
+        code  = self.__python_function.__code__
+        names = set(code.co_names) | set(code.co_freevars)
+
+        return [ shader for shader in self.__bound_shaders if shader.name() in names ]
+    def link(self):
+        # Topological order of the call graph, every shader appears once even when reachable through several paths
+        linked  = []
+        visited = { self.key() }
+        stack   = [ (self, iter(self.called_shaders())) ]
+
+        while len(stack) != 0:
+            shader, called_shaders = stack[-1]
+
+            for called_shader in called_shaders:
+                if called_shader.key() in visited: continue
+
+                visited.add(called_shader.key())
+                stack.append((called_shader, iter(called_shader.called_shaders())))
+                break
+            else:
+                stack.pop()
+                linked.append(shader)
+
+        # Different shaders may share a name as GLSL overloads, not with the same parameter types
+        signatures = set()
+        for shader in linked:
+            parameters = ", ".join( type.typename() for (type, name) in shader.args() )
+            assert (shader.name(), parameters) not in signatures, f"Cannot link two different shaders named {shader.name()} ({parameters}), rename one of them"
+            signatures.add((shader.name(), parameters))
+        
+        return linked
+    def function_c_code(self):
+        return self.__c_code
+    def statements(self):
+        # IR of the function, run by shadermake.engines.executor
+        if callable(self.__statements):
+            self.__statements = self.__statements()
+        return self.__statements
+    def cost(self):
+        # CostReport of the function, the costs of the bound shaders it calls included
+        return self.__cost
+    def interface_names(self):
+        # Names the application refers to, kept by the minifier
+        names = { self.__name }
+        for shader in [ self ] + self.link()[:-1]:
+            names.update( name for (type, name, *args) in shader.shader_options.allVars() )
+            names.update( name for (name, members, layout, binding) in shader.shader_options.uniformBlocks() )
+        return names
+    def type_names(self):
+        # Names introducing a declaration in the code
+        return [ type.typename() for type in GLSL_Operations.types ]
+    def minified(self):
+        # MinifiedCode of the linked code, with its size before and after
+        try:
+            return self.__r_minified
+        except Exception: pass
 
-        self.__r_c_code += "\n".join([ shader.c_code() for shader in self.__bound_shaders ])
-        self.__r_c_code += "\n"
-        self.__r_c_code += self.__c_code
+        self.__r_minified = minify(self.c_code(), self.interface_names(), self.type_names())
+
+        return self.__r_minified
+    def write_c_code(self, out, minify=False):
+        # Streams the linked code to a text sink (file, io.StringIO, ...) without building it as one string,
+        # the minified code is built whole to rename the variables consistently
+        if minify:
+            out.write(self.minified().code)
+            return
+
+        linked = self.link()
+
+        declarations = {}
+        for shader in [ self ] + linked[:-1]:
+            for name, declaration in shader.declarations():
+                if name in declarations:
+                    assert declarations[name] == declaration, f"Conflicting declarations of {name} in linked shaders"
+                    continue
+                
+                declarations[name] = declaration
+                out.write(declaration)
+
+        for shader in linked:
+            out.write("\n")
+            out.write(shader.function_c_code())
+    def c_code(self, minify=False):
+        if minify:
+            return self.minified().code
+        try:
+            return self.__r_c_code
+        except Exception: pass
+
+        output = io.StringIO()
+        self.write_c_code(output)
+        self.__r_c_code = output.getvalue()
         
         return self.__r_c_code
     def name(self):
         return self.__name
     def args(self):
         return self.__args
+    def bound_shaders(self):
+        return self.__bound_shaders
+    def python_function(self):
+        return self.__python_function
+    def key(self):
+        if self.__key is None:
+            self.__key = make_key(self.__c_code, self.shader_options.signature(), tuple( shader.key() for shader in self.__bound_shaders ))
+        return self.__key
+
+# Binding strength of GLSL operators, lower binds tighter
+GLSL_Precedence = {
+    "*": 4, "/": 4, "%": 4,
+    "+": 5, "-": 5,
+    "<": 7, ">": 7, "<=": 7, ">=": 7,
+    "==": 8, "!=": 8,
+    "&&": 12, "^^": 13, "||": 14
+}
+_PRIMARY_PRECEDENCE = 1
+_POSTFIX_PRECEDENCE = 2
+_UNARY_PRECEDENCE   = 3
+_SELECT_PRECEDENCE  = 15
+
+class _GLSL_Printer:
+    # Writes the statements of a function as GLSL lines to a text sink, expressions evaluated more than once
+    # in a block are computed once in a temporary
+    def __init__(self, get_typename, reserved_names=()):
+        self.get_typename   = get_typename
+        self.reserved_names = set(reserved_names)
+
+        self.temporaries     = {}
+        self.temporary_count = 0
+        self.line_count      = 0
+
+    def temporary_name (self):
+        while True:
+            name = f"cse{self.temporary_count}"
+            self.temporary_count += 1
+            if name not in self.reserved_names: return name
+
+    def precedence (self, node: Expression):
+        if node in self.temporaries: return _PRIMARY_PRECEDENCE
+
+        if isinstance(node, Binary): return GLSL_Precedence[node.operand]
+        if isinstance(node, Unary):  return _UNARY_PRECEDENCE
+        if isinstance(node, Select): return _SELECT_PRECEDENCE
+        if isinstance(node, (Attribute, Call)): return _POSTFIX_PRECEDENCE
+        if isinstance(node, Constant) and isinstance(node.value, (int, float)) and node.value < 0: return _UNARY_PRECEDENCE
+        return _PRIMARY_PRECEDENCE
+
+    def write_operand (self, node: Expression, parts: List, parenthesize):
+        if parenthesize:
+            parts.append("(")
+            self.write_expression(node, parts)
+            parts.append(")")
+        else:
+            self.write_expression(node, parts)
+    def write_expression (self, node: Expression, parts: List, expand=False):
+        if not expand and node in self.temporaries:
+            parts.append(self.temporaries[node])
+        elif isinstance(node, Constant) and isinstance(node.value, bool):
+            parts.append("true" if node.value else "false")
+        elif isinstance(node, Constant):
+            parts.append(str(node.value))
+        elif isinstance(node, Variable):
+            parts.append(node.name)
+        elif isinstance(node, Attribute):
+            self.write_operand(node.value, parts, self.precedence(node.value) > _POSTFIX_PRECEDENCE)
+            parts.append(f".{node.name}")
+        elif isinstance(node, Unary):
+            parts.append(node.operand)
+            self.write_operand(node.value, parts, self.precedence(node.value) >= _UNARY_PRECEDENCE)
+        elif isinstance(node, Binary):
+            # Operators are left associative, a right operand as loose as the operator needs parentheses
+            precedence = GLSL_Precedence[node.operand]
+            self.write_operand(node.left, parts, self.precedence(node.left) > precedence)
+            parts.append(f" {node.operand} ")
+            self.write_operand(node.right, parts, self.precedence(node.right) >= precedence)
+        elif isinstance(node, Select):
+            # Right associative, an elif chain reads as a ? x : b ? y : z
+            self.write_operand(node.condition, parts, self.precedence(node.condition) >= _SELECT_PRECEDENCE)
+            parts.append(" ? ")
+            self.write_operand(node.value, parts, self.precedence(node.value) >= _SELECT_PRECEDENCE)
+            parts.append(" : ")
+            self.write_operand(node.orelse, parts, self.precedence(node.orelse) > _SELECT_PRECEDENCE)
+        elif isinstance(node, Call):
+            parts.append(f"{node.function}(")
+            for idx_arg, arg in enumerate(node.args):
+                if idx_arg != 0: parts.append(", ")
+                self.write_expression(arg, parts)
+            parts.append(")")
+        else:
+            assert False, f"Cannot print expression {node}"
+    def expression (self, node: Expression, expand=False):
+        parts = []
+        self.write_expression(node, parts, expand)
+        return "".join(parts)
+
+    def write_line (self, out, line):
+        out.write(line)
+        out.write("\n")
+        self.line_count += 1
+    def write_statements (self, statements: List[Statement], indentation: int, out):
+        tabs = "\t" * indentation
+
+        for statement, temporaries in zip(statements, common_subexpressions(statements)):
+            for node in temporaries:
+                name = self.temporary_name()
+                self.write_line(out, tabs + f"{self.get_typename(node.type)} {name} = {self.expression(node, expand=True)};")
+                self.temporaries[node] = name
+
+            if isinstance(statement, Assign):
+                if statement.declaration is None:
+                    self.write_line(out, tabs + f"{statement.name} = {self.expression(statement.value)};")
+                else:
+                    self.write_line(out, tabs + f"{self.get_typename(statement.declaration)} {statement.name} = {self.expression(statement.value)};")
+            elif isinstance(statement, Return):
+                if statement.value is None: self.write_line(out, tabs + "return;")
+                else: self.write_line(out, tabs + f"return {self.expression(statement.value)};")
+            elif isinstance(statement, If):
+                for idx_branch, (condition, body) in enumerate(statement.branches):
+                    if idx_branch == 0: self.write_line(out, tabs + f"if ({self.expression(condition)}) {{")
+                    else: self.write_line(out, tabs + f"}} else if ({self.expression(condition)}) {{")
+                    self.write_statements(body, indentation + 1, out)
+                if statement.orelse is not None:
+                    self.write_line(out, tabs + "} else {")
+                    self.write_statements(statement.orelse, indentation + 1, out)
+                self.write_line(out, tabs + "}")
+            elif isinstance(statement, While):
+                self.write_line(out, tabs + f"while ({self.expression(statement.condition)}) {{")
+                self.write_statements(statement.body, indentation + 1, out)
+                self.write_line(out, tabs + "}")
+            elif isinstance(statement, For):
+                init = f"{statement.name} = {self.expression(statement.start)}"
+                if statement.declaration is not None:
+                    init = f"{self.get_typename(statement.declaration)} {init}"
+
+                test = f"{statement.name} {'<' if statement.step > 0 else '>'} {self.expression(statement.stop)}"
+                if   statement.step ==  1: increment = f"{statement.name}++"
+                elif statement.step == -1: increment = f"{statement.name}--"
+                elif statement.step  >  0: increment = f"{statement.name} += {statement.step}"
+                else:                      increment = f"{statement.name} -= {-statement.step}"
+
+                self.write_line(out, tabs + f"for ({init}; {test}; {increment}) {{")
+                self.write_statements(statement.body, indentation + 1, out)
+                self.write_line(out, tabs + "}")
+            elif isinstance(statement, Declare):
+                self.write_line(out, tabs + f"{self.get_typename(statement.type)} {statement.name};")
+            elif isinstance(statement, Block):
+                self.write_line(out, tabs + "{")
+                self.write_statements(statement.body, indentation + 1, out)
+                self.write_line(out, tabs + "}")
+            elif isinstance(statement, Raw):
+                self.write_line(out, tabs + statement.code)
+            else:
+                assert False, f"Cannot print statement {statement}"
+
+
+def terminates (statements: List[Statement]):
+    # Whether the statements always end with a return
+    if len(statements) == 0: return False
+
+    last = statements[-1]
+    if isinstance(last, Return): return True
+    if isinstance(last, If):
+        return last.orelse is not None and all( terminates(body) for condition, body in last.branches ) and terminates(last.orelse)
+    if isinstance(last, Block): return terminates(last.body)
+    return False
 
 class OpenGLEngine(AbstractEngine):
-    def generate (self, function, argument_types, bound_shaders, shader_options=ShaderOptions()):
+    # Shared by every engine instance, identical translations return the same shader
+    memory_cache = MemoryCache()
+    # Set to a shadermake.cache.DiskCache to persist translations between processes
+    disk_cache   = None
+    # Constant folding and dead store elimination, make_shader(..., optimize=False) disables them for one shader
+    optimize     = True
+    # for loops over a constant range of at most this many iterations are unrolled, make_shader(..., unroll_limit=0) disables it
+    unroll_limit = 16
+    # if statements only assigning values become selects (a ? x : y) when the values computed on every path
+    # cost at most this many ALU operations (see shadermake.cost), None keeps every branch
+    flatten_threshold = None
+
+    def translation_key (self, function, argument_types, bound_shaders, shader_options, optimize=True, constants=None, unroll_limit=16, flatten_threshold=None):
+        return make_key(
+            self.__class__.__name__,
+            code_signature(function.__code__),
+            tuple( self.get_typename(transform_native_type(type)) for type in argument_types ),
+            shader_options.signature(),
+            tuple( shader.key() for shader in bound_shaders ),
+            optimize,
+            tuple( (name, value.__class__.__name__, repr(value)) for name, value in sorted((constants or {}).items()) ),
+            unroll_limit,
+            flatten_threshold
+        )
+
+    def specialization_constants (self, function, constants=None):
+        # Numbers and booleans captured by the closure of the function are compile-time constants as well,
+        # the constants given to generate take precedence over them
+        specialization = {}
+        for name, cell in zip(function.__code__.co_freevars, function.__closure__ or ()):
+            try:
+                value = cell.cell_contents
+            except ValueError: continue
+
+            if isinstance(value, (bool, int, float)):
+                specialization[name] = value
+        
+        for name, value in (constants or {}).items():
+            assert isinstance(value, (bool, int, float)), f"Specialization constant {name} should be a bool, an int or a float"
+            specialization[name] = value
+        return specialization
+    def constant_expression (self, value):
+        if isinstance(value, bool):  return self.expressions.constant(_t_bool,  value)
+        if isinstance(value, int):   return self.expressions.constant(_t_int,   value)
+        return self.expressions.constant(_t_float, value)
+
+    def optimizer (self, shader_options: ShaderOptions):
+        return Optimizer(
+            _t_bool, _t_int, _t_float, { "vec2": _t_vec2, "vec3": _t_vec3, "vec4": _t_vec4 }, [ name for (type, name, *args) in shader_options.allVars() ],
+            self.flatten_threshold, CostEstimator(self.get_typename, lambda name, types: None, GLSL_Types)
+        )
+
+    def generate (self, function, argument_types, bound_shaders, shader_options=None, optimize=None, constants=None, unroll_limit=None, budget=None, flatten_threshold=None):
+        # The state of a translation (expressions, constants, stats) lives on a copy of the engine, so
+        # translations running in other threads or nested in this one never share it
+        shader = copy.copy(self).translate(function, argument_types, bound_shaders, shader_options, optimize, constants, unroll_limit, flatten_threshold)
+
+        # budget maps cost metrics to their maximum (see shadermake.cost), cached shaders are checked as well
+        if budget is not None:
+            exceeded = over_budget(shader.cost(), budget)
+            assert len(exceeded) == 0, f"{shader.name()} exceeds its cost budget : " + ", ".join( f"{name} {value} > {limit}" for (name, value, limit) in exceeded )
+        return shader
+    def translate (self, function, argument_types, bound_shaders, shader_options=None, optimize=None, constants=None, unroll_limit=None, flatten_threshold=None):
+        bound_shaders = self.resolve_shaders(bound_shaders)
         for shader in bound_shaders:
             assert isinstance(shader, _GLSL_Shader)
-        for idx_arg_type in range(len(argument_types)):
-            argument_types[idx_arg_type] = transform_native_type(argument_types[idx_arg_type])
+        self.begin_stats(function.__name__)
+        if shader_options is None:
+            shader_options = ShaderOptions()
+        argument_types = [ transform_native_type(type) for type in argument_types ]
         
         argument_array = function.__code__.co_varnames[:function.__code__.co_argcount]
         assert len(argument_array) == len(argument_types), "Missing argument types in shader declaration"
         
         argument_data = [(type, name) for (type, name) in zip(argument_types, argument_array)]
 
+        if optimize is None:
+            optimize = self.optimize
+        if unroll_limit is not None:
+            self.unroll_limit = unroll_limit
+        if flatten_threshold is not None:
+            self.flatten_threshold = flatten_threshold
+
+        constants = self.specialization_constants(function, constants)
+
+        key = self.translation_key(function, argument_types, bound_shaders, shader_options, optimize, constants, self.unroll_limit, self.flatten_threshold)
+        if self.memory_cache is not None:
+            shader = self.memory_cache.get(key)
+
+            if shader is not None:
+                self.end_stats("memory")
+                return shader
+        if self.disk_cache is not None:
+            payload = self.disk_cache.get(key)
+
+            # Entries written before the cost estimate was stored are translated again
+            if payload is not None and "cost" in payload:
+                cost   = CostReport.from_dict(payload["cost"])
+                # Only the code is cached, the statements are translated again if the shader is ever executed
+                engine = copy.copy(self)
+                engine.memory_cache = engine.disk_cache = None
+                statements = lambda: engine.translate(function, argument_types, bound_shaders, shader_options, optimize, constants).statements()
+
+                shader = _GLSL_Shader(function.__name__, argument_data, GLSL_Types[payload["end_type"]], payload["c_code"], bound_shaders, function, shader_options, key, cost, constants, statements)
+                if self.memory_cache is not None:
+                    self.memory_cache.put(key, shader)
+
+                self.end_stats("disk")
+                return shader
+
         code_data = dis.Bytecode(function)
         stack     = []
 
         indentation = 1
-        glsl_shader = []
-        type_array  = { name:type for (type, name) in zip(argument_types, argument_array)}
-
-        for (type, name, *args) in shader_options.allVars():
-            type_array[name] = type
+        # Inputs, outputs and uniforms are in the root scope, shared by every block without being copied
+        global_types = Scope({ name:type for (type, name, *args) in shader_options.allVars() })
+        type_array   = Scope({ name:type for (type, name) in zip(argument_types, argument_array) }, global_types)
 
         user_code   = list(code_data)
-        glsl_shader = self.generate_c_code( 0, len( user_code ), stack, type_array, 1, bound_shaders, user_code )
-        
+        line        = break_line(function.__code__)
+        assert line is None, f"Unsupported break statement at line {line}, a loop can only end on its condition"
+        self.validate_opcodes(user_code)
+        user_code   = ControlFlowGraph(user_code)
+
+        self.expressions = ExpressionTable()
+        self.constants   = constants
+        # (name, version) of the loop variables of unrolled loops, with their value in the current copy of the body
+        self.unrolled    = {}
+        statements       = self.generate_c_code( 0, len( user_code ), stack, type_array, 1, bound_shaders, user_code )
+        if optimize:
+            statements = self.optimizer(shader_options).optimize(statements)
+        # Python ends every function with a return, it is implicit at the end of a void GLSL function. Pruned
+        # branches can leave more of them there, so this comes after the optimizer.
+        while len(statements) != 0 and isinstance(statements[-1], Return) and statements[-1].value is None:
+            statements.pop()
+        cost = CostEstimator(self.get_typename, lambda name, types: self.bound_cost(bound_shaders, name, types), GLSL_Types).estimate(statements)
+
         if '<return>' not in type_array:
             type_array['<return>'] = _t_void
-        
-        function_parameters  = ", ".join([ f"{self.get_typename(type)} {name}" for (type, name) in argument_data ])
-        function_declaration = f"{self.get_typename(type_array['<return>'])} {function.__name__} ({function_parameters})" + " {\n"
-        function_end         = "\n}"
-        
-        function_c_code = (function_declaration + "\n".join(glsl_shader) + function_end)
 
-        return _GLSL_Shader(function.__name__, argument_data, type_array['<return>'], function_c_code, bound_shaders, function, shader_options)
+        function_parameters = ", ".join([ f"{self.get_typename(type)} {name}" for (type, name) in argument_data ])
+
+        code    = function.__code__
+        printer = _GLSL_Printer(self.get_typename, set(code.co_varnames) | set(code.co_names) | set(code.co_freevars) | set(type_array))
+        output  = io.StringIO()
+        output.write(f"{self.get_typename(type_array['<return>'])} {function.__name__} ({function_parameters})" + " {\n")
+        printer.write_statements(statements, 1, output)
+        if printer.line_count == 0:
+            output.write("\n")
+        output.write("}")
+
+        function_c_code = output.getvalue()
+
+        shader = _GLSL_Shader(function.__name__, argument_data, type_array['<return>'], function_c_code, bound_shaders, function, shader_options, key, cost, constants, statements)
+
+        if self.memory_cache is not None:
+            self.memory_cache.put(key, shader)
+        if self.disk_cache is not None:
+            self.disk_cache.put(key, { "end_type": type_array['<return>'].typename(), "c_code": function_c_code, "cost": cost.as_dict() })
+
+        self.end_stats()
+        return shader
+
+    def generate_c_code (self, start, end, stack: List, type_array, indentation: int, bound_shaders, function_code: ControlFlowGraph):
+        # Gives back the statements of the range, printed once the whole function is translated
+        statements = []
+        handlers   = self.opcode_handlers
+        stats      = self.stats
 
-    def generate_c_code (self, start, end, stack: List, type_array, indentation: int, bound_shaders, function_code):
-        glsl_shader = []
+        if stats is not None:
+            stats.enter_range(start, end)
 
         code_piece_id = start
         while code_piece_id < end:
             code_piece = function_code[code_piece_id]
-            disassembler_name = f"compute__{code_piece.opname}"
-            assert hasattr(self, disassembler_name), f"{code_piece.opname} is not implemented : {str(code_piece)}"
-        
-            disassembler                 = getattr(self, disassembler_name)
-            c_code, n_indentation, delta = disassembler(stack, type_array, code_piece, indentation, bound_shaders, function_code)
-
-            if hasattr(code_piece, "appended_blocks"):
-                delta_indentation = 0
-                for appended_block, end_indentation, local_indetation in code_piece.appended_blocks:
-                    delta_indentation = end_indentation - indentation
-                    
-                    glsl_shader.append("\t" * local_indetation + appended_block)
-                n_indentation += delta_indentation
-                indentation += delta_indentation
+            block      = function_code.block_of(code_piece_id)
+            # Dead code, such as the implicit return after an if statement returning in every branch
+            if not function_code.is_reachable(block):
+                code_piece_id = block.end
+                continue
+            if block.start == code_piece_id:
+                self.expressions.barrier()
+
+            if stats is None:
+                c_code, n_indentation, delta = handlers[code_piece.opname](self, stack, type_array, code_piece, indentation, bound_shaders, function_code)
+            else:
+                c_code, n_indentation, delta = stats.call(code_piece.opname, handlers[code_piece.opname], self, stack, type_array, code_piece, indentation, bound_shaders, function_code)
 
-            if c_code is not None:
-                glsl_shader.append("\t" * indentation + c_code)
+            if isinstance(c_code, list):
+                statements.extend(c_code)
+            elif isinstance(c_code, str):
+                statements.append(Raw(c_code))
+            elif c_code is not None:
+                statements.append(c_code)
 
             code_piece_id += 1 + delta
             indentation    = n_indentation
         
-        return glsl_shader
-
-    def find_lca (self, user_code, a, b):
-        while a != b:
-            if a > b: a, b = b, a
-
-            next_a = a + 1
-            if user_code[a].opname == "JUMP_FORWARD":
-                next_a = self.binary_search(user_code, user_code[a].argval)
-            
-            a = next_a
-        
-        return a
+        if stats is not None:
+            stats.exit_range()
+        return statements
+
+    def bound_cost (self, bound_shaders, name, types):
+        # CostReport of the bound shader a call goes to, resolved like the call itself so that overloads
+        # are told apart. None for the other functions.
+        overloads = [ shader for shader in bound_shaders if shader.name() == name ]
+        variant   = _GLSL_Overloads(overloads).find_variant([ (type, None) for type in types ]) if len(overloads) != 0 else None
+        return None if variant is None else variant.cost()
     def get_typename (self, value_type):
         type_name = None
         if isinstance(value_type, _GLSL_Type):
@@ -253,18 +777,6 @@ class OpenGLEngine(AbstractEngine):
 
         return type_name
     
-    def binary_search(self, function_code, offset):
-        a = 0
-        b = len(function_code)
-
-        while b - a > 1:
-            c = (a + b) >> 1
-
-            if function_code[c].offset <= offset: a = c
-            else: b = c
-        
-        return a
-
     # Python no-op so nothing happens
     def compute__RESUME(self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
         return None, indentation, 0
@@ -274,68 +786,257 @@ class OpenGLEngine(AbstractEngine):
         return None, indentation, 0
     def compute__PUSH_NULL(self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
         return None, indentation, 0
-    def compute__JUMP_FORWARD(self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
-        return None, indentation, self.binary_search(function_code, operation.argval) - self.binary_search(function_code, operation.offset) - 1
-    def compute__POP_JUMP_FORWARD_IF_FALSE(self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
-        return self.compute__POP_JUMP_IF_FALSE(stack, type_array, operation, indentation, bound_shaders, function_code)
-    def compute__POP_JUMP_IF_FALSE(self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
-        main_branch = self.binary_search(function_code, operation.offset) + 1
-        altr_branch = self.binary_search(function_code, operation.argval)
+    def compute__EXTENDED_ARG(self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
+        return None, indentation, 0
+    def compute__NOP(self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
+        return None, indentation, 0
+    def compute__SETUP_LOOP(self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
+        return None, indentation, 0
+    def compute__POP_BLOCK(self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
+        return None, indentation, 0
 
-        condition_type, condition_expr = stack.pop()
-        assert condition_type.castable(_t_bool), "Only a boolean can be used in an if statement"
+    def compute__JUMP_FORWARD(self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
+        position = function_code.index_of(operation.offset)
+        target   = function_code.jump_target(position)
+
+        # Jumping back to the loop header ends the iteration, which is the end of the range being translated
+        if target < position:
+            return None, indentation, len(function_code)
+        return None, indentation, target - position - 1
+    def compute__JUMP_ABSOLUTE(self, *args, **kwargs):
+        return self.compute__JUMP_FORWARD(*args, **kwargs)
+    def compute__JUMP_BACKWARD(self, *args, **kwargs):
+        return self.compute__JUMP_FORWARD(*args, **kwargs)
+
+    def pop_condition(self, stack: List, negated):
+        condition = stack.pop()
+        assert condition.type.castable(_t_bool), "Only a boolean can be used in an if statement"
+
+        if negated:
+            return self.expressions.unary(_t_bool, "!", condition)
+        return condition
+    def compute__POP_JUMP_FORWARD_IF_FALSE(self, *args, **kwargs):
+        return self.compute__POP_JUMP_IF_FALSE(*args, **kwargs)
+    def compute__POP_JUMP_FORWARD_IF_TRUE(self, *args, **kwargs):
+        return self.compute__POP_JUMP_IF_FALSE(*args, **kwargs)
+    def compute__POP_JUMP_IF_TRUE(self, *args, **kwargs):
+        return self.compute__POP_JUMP_IF_FALSE(*args, **kwargs)
+    def compute__POP_JUMP_BACKWARD_IF_FALSE(self, *args, **kwargs):
+        return self.compute__POP_JUMP_IF_FALSE(*args, **kwargs)
+    def compute__POP_JUMP_BACKWARD_IF_TRUE(self, *args, **kwargs):
+        return self.compute__POP_JUMP_IF_FALSE(*args, **kwargs)
+    def compute__POP_JUMP_IF_FALSE(self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code: ControlFlowGraph):
+        position = function_code.index_of(operation.offset)
+        region   = function_code.region(position)
+
+        if isinstance(region, LoopRegion):
+            # The condition is evaluated again on every iteration, it is rebuilt without the values known before the loop
+            stack.pop()
+            self.expressions.barrier()
+            self.generate_c_code(region.condition_start, region.condition_end, stack, type_array, indentation, bound_shaders, function_code)
+            condition = self.pop_condition(stack, region.negated)
+
+            body_scope = type_array.child()
+            body       = self.generate_c_code(region.body_start, region.body_end, stack, body_scope, indentation + 1, bound_shaders, function_code)
+
+            declarations = self.hoist_declarations(type_array, [ (body_scope, body) ], region.follow, function_code)
+            return declarations + [ While(condition, body) ], indentation, region.follow - position - 1
+
+        # An if statement alone in an else branch is chained as an else if, so elif chains stay flat. Every
+        # branch runs on its own copy of the stack : a conditional expression leaves one value per branch, and
+        # python 3.10 copies the code following the if statement, operands already on the stack included,
+        # into the branches ending with a return.
+        line     = function_code.line_of(position)
+        branches = []
+        orelse   = None
+        scopes   = []
+        stacks   = []
+        while True:
+            condition = self.pop_condition(stack, region.negated)
+            entry     = list(stack)
+            scope     = type_array.child()
+            branch    = list(stack)
+            body      = self.generate_c_code(region.true_start, region.true_end, branch, scope, indentation + 1, bound_shaders, function_code)
+            branches.append((condition, body))
+            scopes.append((scope, body))
+            stacks.append((branch, body))
+            if region.false_start == region.false_end:
+                stacks.append((list(stack), []))
+                break
+
+            chained_jump = function_code.chained_if(region)
+            if chained_jump is None:
+                orelse_scope = type_array.child()
+                branch       = list(stack)
+                orelse       = self.generate_c_code(region.false_start, region.false_end, branch, orelse_scope, indentation + 1, bound_shaders, function_code)
+                scopes.append((orelse_scope, orelse))
+                stacks.append((branch, orelse))
+                break
+
+            self.generate_c_code(region.false_start, chained_jump, stack, type_array, indentation, bound_shaders, function_code)
+            region = function_code.region(chained_jump)
+
+        # The stack after the if statement only comes from the branches reaching it
+        reaching = [ branch for (branch, body) in stacks if not terminates(body) ]
+        def balanced (extra):
+            return all( len(branch) == len(entry) + extra and all( a is b for a, b in zip(branch, entry) ) for branch in reaching )
+
+        stack[:] = entry
+        if balanced(0):
+            declarations = self.hoist_declarations(type_array, scopes, region.follow, function_code)
+            return declarations + [ If(branches, orelse) ], indentation, region.follow - position - 1
+
+        # a if condition else b : every branch gives one value and nothing else
+        assert len(reaching) == len(stacks) and balanced(1), f"Unbalanced stack after the branches of the if statement at line {line}"
+        assert all( len(body) == 0 for (branch, body) in stacks ), f"Unsupported statements in the conditional expression at line {line}"
+        values = [ branch[-1] for (branch, body) in stacks ]
+        assert all( isinstance(value, Expression) and value.type == values[0].type for value in values ), f"Both values of the conditional expression at line {line} should have the same type"
+
+        value = values[-1]
+        for (condition, body), branch_value in reversed(list(zip(branches, values))):
+            value = Select(value.type, condition, branch_value, value)
+        stack.append(value)
+        return None, indentation, region.follow - position - 1
+
+    def compute__GET_ITER(self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
+        assert isinstance(stack[-1], tuple) and stack[-1][0] == "range" and stack[-1][1] is not None, "Only range(...) can be iterated by a for loop"
 
-        end_branch = self.find_lca(function_code, main_branch, altr_branch)
+        return None, indentation, 0
+    def compute__FOR_ITER(self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code: ControlFlowGraph):
+        position = function_code.index_of(operation.offset)
+        region   = function_code.region(position)
+        line     = function_code.line_of(position)
+        assert isinstance(region, ForRegion), f"Unsupported for loop at line {line}"
+
+        start, stop, step = stack.pop()[1]
+        target = function_code[region.body_start]
+        assert target.opname == "STORE_FAST", f"Unsupported for loop at line {line}, the loop variable should be a local variable"
+        name = target.argval
+        assert type_array.get(name, _t_int) == _t_int, f"The loop variable {name} should be an int"
+
+        # Bounds computed from constants, or from the variables of enclosing unrolled loops, are known without
+        # running the optimizer
+        known  = { name: value for (name, version), value in self.unrolled.items() if self.expressions.versions.get(name, 0) == version }
+        folder = self.optimizer(ShaderOptions())
+        start, stop, step = [ folder.fold(bound, known) for bound in (start, stop, step) ]
+        assert isinstance(step, Constant) and step.value != 0, f"The step of the for loop at line {line} should be a constant other than 0"
+
+        if isinstance(start, Constant) and isinstance(stop, Constant):
+            values = range(start.value, stop.value, step.value)
+            if len(values) <= self.unroll_limit:
+                return self.unroll_loop(name, values, region, stack, type_array, indentation, bound_shaders, function_code), indentation, region.follow - position - 1
+
+        # GLSL leaves the loop variable one step further than python does
+        assert not function_code.is_read_after(name, region.follow), f"The loop variable {name} of the for loop at line {line} is used after the loop"
+
+        declaration = None
+        loop_scope  = type_array.child()
+        if name not in type_array:
+            loop_scope[name] = declaration = _t_int
+
+        # The loop variable changes on every iteration
+        self.expressions.store(_t_int, name, self.expressions.variable(_t_int, name))
+        self.expressions.barrier()
+        body_scope = loop_scope.child()
+        body       = self.generate_c_code(region.body_start + 1, region.body_end, stack, body_scope, indentation + 1, bound_shaders, function_code)
+
+        assert not is_impure(stop) and used_names(stop).isdisjoint(assigned_names(body) | { name }), f"The end of the for loop at line {line} cannot change inside the loop"
+
+        declarations = self.hoist_declarations(type_array, [ (body_scope, body) ], region.follow, function_code)
+        return declarations + [ For(name, start, stop, step.value, body, declaration) ], indentation, region.follow - position - 1
+    def unroll_loop (self, name, values, region: ForRegion, stack: List, type_array, indentation: int, bound_shaders, function_code: ControlFlowGraph):
+        # One copy of the body per iteration, in its own scope, after the store of the value of the loop variable
+        statements = []
+        scopes     = []
+        for value in values:
+            constant    = self.expressions.constant(_t_int, value)
+            declaration = None
+            if name not in type_array:
+                type_array[name] = declaration = _t_int
+
+            self.expressions.store(_t_int, name, constant)
+            self.unrolled[(name, self.expressions.versions[name])] = constant
+            statements.append(Assign(name, constant, declaration))
+
+            # The variables declared by a copy go out of scope with its block, the next copy cannot reuse them
+            self.expressions.barrier()
+            scope = type_array.child()
+            body  = self.generate_c_code(region.body_start + 1, region.body_end, stack, scope, indentation + 1, bound_shaders, function_code)
+            scopes.append((scope, body))
+            statements.append(Block(body))
+        self.expressions.barrier()
+
+        return self.hoist_declarations(type_array, scopes, region.follow, function_code) + statements
+
+    def hoist_declarations (self, type_array: Scope, scopes, follow, function_code: ControlFlowGraph):
+        # Variables declared inside the branches and used after them are declared before the statement,
+        # as long as every branch gives them the same type
+        types       = {}
+        conflicting = set()
+        for scope, body in scopes:
+            for name, type in scope.escaping(lambda name: function_code.last_use(name) >= follow).items():
+                if types.setdefault(name, type) != type:
+                    conflicting.add(name)
+
+        declarations = []
+        for name, type in types.items():
+            if name in conflicting: continue
 
-        if not hasattr ( function_code[end_branch], "appended_blocks" ):
-            function_code[end_branch].appended_blocks = []
+            type_array[name] = type
+            declarations.append(Declare(type, name))
 
-        function_code[end_branch].appended_blocks.insert( 0, ("}", indentation, indentation) )
-        if end_branch != altr_branch:
-            shader_inner_code = self.generate_c_code(altr_branch, end_branch, stack, { k:type_array[k] for k in type_array.keys() }, indentation + 1, bound_shaders, function_code)
-            
-            function_code[end_branch].appended_blocks.insert( 0, ("\n".join(shader_inner_code), indentation, 0) )
-            function_code[end_branch].appended_blocks.insert( 0, ("} else {", indentation, indentation) )
+            for scope, body in scopes:
+                if not scope.is_local(name): continue
 
-            pass
+                body[:] = [ statement for statement in body if not (isinstance(statement, Declare) and statement.name == name) ]
+                for idx_statement, statement in enumerate(body):
+                    if isinstance(statement, Assign) and statement.name == name and statement.declaration is not None:
+                        body[idx_statement] = Assign(name, statement.value)
         
-        return "if (" + str(condition_expr) + ") {\n" \
-            + "\n".join(self.generate_c_code(main_branch, end_branch, stack, { k:type_array[k] for k in type_array.keys() }, indentation + 1, bound_shaders, function_code)), \
-            indentation, end_branch - self.binary_search(function_code, operation.offset) - 1
+        return declarations
 
     def compute__LOAD_CONST (self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
-        if isinstance(operation.argval, float): stack.append((_t_float, operation.argval))
-        elif isinstance(operation.argval, int): stack.append((_t_int, operation.argval))
-        elif operation.argval is None: stack.append((_t_NoneType, None))
+        if isinstance(operation.argval, float): stack.append(self.expressions.constant(_t_float, operation.argval))
+        elif isinstance(operation.argval, int): stack.append(self.expressions.constant(_t_int, operation.argval))
+        elif operation.argval is None: stack.append(self.expressions.constant(_t_NoneType, None))
         else: assert False, f"Only integers and floats are implemented in LOAD_CONST : {operation.argval}"
 
         return None, indentation, 0
     def compute__STORE_FAST (self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
-        value_type, value = stack.pop()
+        value = stack.pop()
 
-        assert value_type != _t_NoneType, "Cannot store none type"
+        assert value.type != _t_NoneType, "Cannot store none type"
 
-        if operation.argval in type_array:
-            return f"{operation.argval} = {value};", indentation, 0
+        declaration = None
+        if operation.argval not in type_array:
+            self.get_typename(value.type)
+            type_array[operation.argval] = declaration = value.type
 
-        type_name = self.get_typename(value_type)
-        type_array[operation.argval] = value_type
+        self.expressions.store(type_array[operation.argval], operation.argval, value)
 
-        return f"{type_name} {operation.argval} = {value};", indentation, 0
+        return Assign(operation.argval, value, declaration), indentation, 0
     def compute__LOAD_FAST (self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
         assert operation.argval in type_array, f"Could not compute {operation.argval} type"
-        stack.append((type_array[operation.argval], operation.argval))
+        stack.append(self.expressions.variable(type_array[operation.argval], operation.argval))
 
         return None, indentation, 0
     def compute__LOAD_GLOBAL(self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
         if operation.argval in type_array:
-            stack.append((type_array[operation.argval], operation.argval))
+            stack.append(self.expressions.variable(type_array[operation.argval], operation.argval))
 
             return None, indentation, 0
-        for bound_shader in bound_shaders:
-            if bound_shader.name() == operation.argval:
-                stack.append(("function", bound_shader))
-                return None, indentation, 0
+        if operation.argval == "range":
+            stack.append(("range", None))
+            return None, indentation, 0
+        if operation.argval in self.constants:
+            # Specialization constants are inlined as literals, the optimizer then folds the branches on them
+            stack.append(self.constant_expression(self.constants[operation.argval]))
+
+            return None, indentation, 0
+        overloads = [ bound_shader for bound_shader in bound_shaders if bound_shader.name() == operation.argval ]
+        if len(overloads) != 0:
+            stack.append(("function", _GLSL_Overloads(overloads)))
+            return None, indentation, 0
 
         assert operation.argval in GLSL_Authorized_Functions, f"Could not find {operation.argval} in authorized GLSL functions"
         stack.append(("function", GLSL_Authorized_Functions[operation.argval]))
@@ -344,21 +1045,21 @@ class OpenGLEngine(AbstractEngine):
     def compute__LOAD_DEREF(self, *args, **kwargs):
         return self.compute__LOAD_GLOBAL(*args, **kwargs)
     def compute__LOAD_ATTR (self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
-        value_type, value = stack.pop()
+        value = stack.pop()
 
-        next_type = value_type.get_attribute_type(operation.argval)
+        next_type = value.type.get_attribute_type(operation.argval)
 
-        stack.append( (next_type, f"{str(value)}.{operation.argval}") )
+        stack.append(self.expressions.attribute(next_type, value, operation.argval))
 
         return None, indentation, 0
 
     def compute__BINARY_OPERAND (self, stack, operand):
-        (type_b, b), (type_a, a) = stack.pop(), stack.pop()
-        type_c = type_a.get_resulting_type(operand, type_b)
+        b, a   = stack.pop(), stack.pop()
+        type_c = a.type.get_resulting_type(operand, b.type)
         
-        assert type_c is not None, f"combination of types {type_a} and {type_b} did not work"
+        assert type_c is not None, f"combination of types {a.type} and {b.type} did not work"
         
-        stack.append((type_c, f"{a} {operand} {b}"))
+        stack.append(self.expressions.binary(type_c, operand, a, b))
     
     def compute__BINARY_OP (self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
         self.compute__BINARY_OPERAND(stack, operation.argrepr)
@@ -386,31 +1087,41 @@ class OpenGLEngine(AbstractEngine):
         return None, indentation, 0
 
     def compute__RETURN_VALUE (self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
-        type_name, value = _t_int, 0
-        if len(stack) == 1: type_name, value = stack.pop()
+        line = function_code.line_of(function_code.index_of(operation.offset))
+        assert len(stack) == 1, f"Unbalanced stack at the return of line {line} : {len(stack)} values instead of 1"
+        value = stack.pop()
 
+        type_name = value.type
         if type_name == _t_NoneType:
-            type_name, value = _t_void, 0
+            type_name = _t_void
 
+        # The return type belongs to the whole function, whatever the block returning
         if '<return>' in type_array:
             assert type_name == type_array['<return>'], "Return type can only be unique"
-        else: type_array['<return>'] = type_name
+        else: type_array.root()['<return>'] = type_name
         
         if type_name == _t_void:
-            return None, indentation, 0
-        return f"return {value};", indentation, 0
+            return Return(), indentation, 0
+        return Return(value), indentation, 0
     
     def make_call(self, args, func, stack: List, indentation: int):
+        if func[0] == "range":
+            # Only iterated by for loops, the bounds are kept until FOR_ITER
+            assert 1 <= len(args) <= 3 and all( arg.type == _t_int for arg in args ), "range takes one to three ints"
+            if len(args) == 1: args = [ self.expressions.constant(_t_int, 0), args[0] ]
+            if len(args) == 2: args = args + [ self.expressions.constant(_t_int, 1) ]
+
+            stack.append(("range", args))
+            return None, indentation, 0
         assert func[0] == 'function', "The function called should be a function"
 
         func: _GLSL_Pure_Function = func[1]
-        variant: _GLSL_Variant    = func.find_variant(args)
+        variant: _GLSL_Variant    = func.find_variant([ (arg.type, arg) for arg in args ])
+        assert variant is not None, f"No variant of {func.name()} accepts the arguments ({', '.join( self.get_typename(arg.type) for arg in args )})"
         
+        # Other shaders can write outputs, they are not pure functions
         return_type = variant.end_type()
-        parameters  = variant.make (args)
-        func_call   = f"{func.name()}{parameters}"
-
-        stack.append((return_type, func_call))
+        stack.append(self.expressions.call(return_type, func.name(), args, pure=not isinstance(variant, _GLSL_Shader)))
 
         return None, indentation, 0
     def compute__CALL_FUNCTION (self, stack: List, type_array, operation: dis.Instruction, indentation: int, bound_shaders, function_code):
@@ -475,6 +1186,8 @@ vec4 = _GLSL_Pure_Function( "vec4" ) \
 mat4 = _t_mat4
 
 def transform_native_type (type):
+    if type == bool:
+        type = _t_bool
     if type == float:
         type = _t_float
     if type == int:
@@ -484,6 +1197,11 @@ def transform_native_type (type):
     if type == vec4: type = _t_vec4
     return type
 
+GLSL_Types = {
+    type.typename(): type
+    for type in [ _t_vec2, _t_vec3, _t_vec4, _t_mat4, _t_int, _t_float, _t_bool, _t_void ]
+}
+
 GLSL_Authorized_Functions = {
     "vec2": vec2,
     "vec3": vec3,
@@ -0,0 +1,183 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from shadermake.decorator         import make_shader, make_permutations
+from shadermake.engines.executor  import NumpyExecutor
+from shadermake.engines.opengl    import OpenGLEngine, ShaderOptions, vec2, vec3, vec4, mat4
+
+def test_vertex_shader():
+    options = ShaderOptions() \
+        .useVertex() \
+        .addInput( vec4, "position", 0 ) \
+        .addOutput( vec4, "color", 0 ) \
+        .addUniform( mat4, "matProj" ) \
+        .addUniform( mat4, "matView" )
+    @make_shader(OpenGLEngine, shader_options=options)
+    def main():
+        gl_Position = matProj * matView * position
+        color = position + vec4(1.0, 0.5, 0.25, 0.0)
+
+    rng      = np.random.default_rng(0)
+    position = rng.standard_normal((1000, 4)).astype(np.float32)
+    proj     = rng.standard_normal((4, 4)).astype(np.float32)
+    view     = rng.standard_normal((4, 4)).astype(np.float32)
+
+    outputs = NumpyExecutor(main).run(inputs={ "position": position }, uniforms={ "matProj": proj, "matView": view })
+
+    # Matrices are column major : the GLSL product M * v is v @ M with rows holding the columns
+    expected = position @ view @ proj
+    assert np.allclose(outputs["gl_Position"], expected, atol=1e-4)
+    assert np.allclose(outputs["color"], position + [ 1.0, 0.5, 0.25, 0.0 ])
+
+def test_branches():
+    @make_shader(OpenGLEngine, argument_types=[ float ])
+    def main(z):
+        y = 1
+        if z > 0.5:
+            y = 2
+        elif z >= 0:
+            y = 4
+        else:
+            y = 3
+        if z > 0.75:
+            return y * 10
+        return y
+
+    z = np.linspace(-1, 1, 9, dtype=np.float32)
+
+    outputs = NumpyExecutor(main).run(arguments=[ z ])
+    assert outputs["return"].tolist() == [ 3, 3, 3, 3, 4, 4, 4, 2, 20 ]
+
+def test_bound_shaders():
+    @make_shader(OpenGLEngine, argument_types=[ int, int ])
+    def f(x, y):
+        return x / y
+    @make_shader(OpenGLEngine, argument_types=[ int, float ], bound_shaders=[ f ])
+    def main(x, y):
+        return vec2(f(x, 2), y / 2).x + vec3(1.0, 2.0, y).z
+
+    x = np.arange(-3, 4, dtype=np.int32)
+    y = np.ones(7, dtype=np.float32)
+
+    outputs = NumpyExecutor(main).run(arguments=[ x, y ])
+    assert outputs["return"].tolist() == [ 0.0, 0.0, 1.0, 1.0, 1.0, 2.0, 2.0 ]
+
+def test_while_loop():
+    @make_shader(OpenGLEngine, argument_types=[ int ])
+    def main(n):
+        s = 0
+        k = 0
+        while k < n:
+            k = k + 1
+            if k > 3:
+                s = s + 10
+            else:
+                s = s + 1
+        return s
+
+    n = np.arange(8, dtype=np.int32)
+
+    outputs = NumpyExecutor(main).run(arguments=[ n ])
+    assert outputs["return"].tolist() == [ 0, 1, 2, 3, 13, 23, 33, 43 ]
+
+def test_for_loop():
+    @make_shader(OpenGLEngine, argument_types=[ int ])
+    def main(n):
+        s = 0
+        for i in range(1, n, 2):
+            s = s + i
+        for j in range(3):
+            s = s * 2 + j
+        return s
+
+    n = np.arange(8, dtype=np.int32)
+
+    outputs = NumpyExecutor(main).run(arguments=[ n ])
+    assert outputs["return"].tolist() == [ main.python_function()(value) for value in range(8) ]
+
+def test_specialization_constants():
+    def make(scale, shadows):
+        @make_shader(OpenGLEngine, argument_types=[ float ])
+        def main(x):
+            y = x * scale
+            if shadows:
+                y = y * 0.5
+            return y
+        return main
+
+    x = np.arange(4, dtype=np.float32)
+    assert NumpyExecutor(make(3.0, True)).run(arguments=[ x ])["return"].tolist() == [ 0.0, 1.5, 3.0, 4.5 ]
+
+    @make_permutations(OpenGLEngine, { "LIGHTS": [ 1, 2 ], "FOG": [ False, True ] }, argument_types=[ float ])
+    def lit(x):
+        y = x * LIGHTS
+        if FOG:
+            y = y + 1.0
+        return y
+
+    for constants, shader in lit:
+        expected = [ value * constants["LIGHTS"] + (1.0 if constants["FOG"] else 0.0) for value in x.tolist() ]
+        assert NumpyExecutor(shader).run(arguments=[ x ])["return"].tolist() == expected
+
+def test_uniform_block_members_are_not_outputs():
+    options = ShaderOptions() \
+        .useFragment() \
+        .addOutput( vec3, "result" ) \
+        .addUniformBlock( "Light", [ (vec3, "color"), (float, "intensity") ] )
+    @make_shader(OpenGLEngine, argument_types=[ vec3 ], shader_options=options)
+    def main(A):
+        result = A + color
+
+    outputs = NumpyExecutor(main).run(arguments=[ np.ones((2, 3)) ], uniforms={ "color": [ 1.0, 2.0, 3.0 ], "intensity": 2.0 })
+    assert set(outputs) == { "result" }
+    assert outputs["result"].tolist() == [ [ 2.0, 3.0, 4.0 ] ] * 2
+
+def test_runs_the_translated_statements():
+    @make_shader(OpenGLEngine, argument_types=[ float ], flatten_threshold=4)
+    def main(x):
+        y = 1.0 if x > 0.0 else 2.0
+        if x > 0.5:
+            y = y + 3.0
+        for i in range(3):
+            y = y + x
+        return y
+
+    assert "?" in main.c_code()
+
+    x = np.linspace(-1, 1, 9, dtype=np.float32)
+    assert np.allclose(NumpyExecutor(main).run(arguments=[ x ])["return"], [ main.python_function()(value) for value in x.tolist() ])
+
+def test_bound_shaders_write_under_the_mask():
+    options = ShaderOptions().useFragment().addOutput( float, "result" )
+    @make_shader(OpenGLEngine, argument_types=[ float ], shader_options=options)
+    def write(x):
+        result = x
+        return x
+    @make_shader(OpenGLEngine, argument_types=[ float ], bound_shaders=[ write ], shader_options=options)
+    def main(x):
+        result = 5.0
+        if x > 0.0:
+            y = write(x)
+
+    x = np.array([ -1.0, 2.0 ], dtype=np.float32)
+    assert NumpyExecutor(main).run(arguments=[ x ])["result"].tolist() == [ 5.0, 2.0 ]
+
+def test_shaders_from_the_disk_cache(tmp_path, monkeypatch):
+    from shadermake.cache import DiskCache
+
+    monkeypatch.setattr(OpenGLEngine, "memory_cache", None)
+    monkeypatch.setattr(OpenGLEngine, "disk_cache", DiskCache(str(tmp_path)))
+
+    def make():
+        @make_shader(OpenGLEngine, argument_types=[ int ])
+        def main(n):
+            return n * 2 + 1
+        return main
+    make()
+    assert OpenGLEngine.disk_cache.hits == 0
+
+    # Only the code is cached, the statements are translated again to run the shader
+    main = make()
+    assert OpenGLEngine.disk_cache.hits == 1
+    assert NumpyExecutor(main).run(arguments=[ np.arange(3) ])["return"].tolist() == [ 1, 3, 5 ]
@@ -1,3 +1,4 @@
+import pytest
 
 from shadermake.decorator      import make_shader
 from shadermake.engines.opengl import OpenGLEngine, ShaderOptions, vec2, vec3, vec4, mat4
@@ -10,7 +11,7 @@ def test_simple_function():
     assert main.c_code() == "\nvoid main () {\n\n}"
 
 def test_simple_arithmetic():
-    @make_shader(OpenGLEngine)
+    @make_shader(OpenGLEngine, optimize=False)
     def main():
         x = 0
         y = 1
@@ -40,7 +41,7 @@ def test_simple_arithmetic():
     ]) + "\n}"
 
 def test_vector_arithmetic ():
-    @make_shader(OpenGLEngine)
+    @make_shader(OpenGLEngine, optimize=False)
     def main():
         A = vec2(0, 1)
         B = vec2(1.0, 2.0)
@@ -55,7 +56,7 @@ def test_vector_arithmetic ():
     ]) + "\n}"
 
 def test_input_arithmetic ():
-    @make_shader(OpenGLEngine, argument_types=[ int, float, vec2 ])
+    @make_shader(OpenGLEngine, argument_types=[ int, float, vec2 ], optimize=False)
     def main(x, y, A):
         z = x + y
         A = A + vec2(x, z)
@@ -90,10 +91,10 @@ def test_options ():
     ]) + "\n}"
 
 def test_simple_added_function ():
-    @make_shader (OpenGLEngine, argument_types=[ float ])
+    @make_shader (OpenGLEngine, argument_types=[ float ], optimize=False)
     def f(x):
         return x + 1
-    @make_shader (OpenGLEngine, bound_shaders=[ f ])
+    @make_shader (OpenGLEngine, bound_shaders=[ f ], optimize=False)
     def main():
         a = 0
         b = 1
@@ -114,7 +115,7 @@ def test_matrix_multiplication ():
         .addUniform( mat4, "matProj" ) \
         .addUniform( mat4, "matModel" ) \
         .addUniform( mat4, "matView" )
-    @make_shader(OpenGLEngine, shader_options=options)
+    @make_shader(OpenGLEngine, shader_options=options, optimize=False)
     def main():
         L = matProj * position
         M = matProj * matModel * matView
@@ -133,11 +134,62 @@ def test_matrix_multiplication ():
         "\tvec4 L = matProj * position;",
         "\tmat4 M = matProj * matModel * matView;",
         "\tvec4 R = M * position;",
-        "\tvec4 U = matProj * matModel * matView * position;",
+        "\tvec4 U = R;",
         "\tvec4 gl_Position = U;",
         "}"
     ])
 
+def test_common_subexpressions ():
+    @make_shader(OpenGLEngine, argument_types=[ float, float, float ])
+    def main(a, b, c):
+        x = (a + b) * c + (a + b) * c
+        y = (a + b) * c
+        a = a + 1
+        z = (a + b) * c
+        return x + y + z
+
+    assert main.c_code() == "\n".join([
+        "\nfloat main (float a, float b, float c) {",
+        "\tfloat cse0 = (a + b) * c;",
+        "\tfloat x = cse0 + cse0;",
+        "\tfloat y = cse0;",
+        "\ta = a + 1;",
+        "\tfloat z = (a + b) * c;",
+        "\treturn x + y + z;",
+        "}"
+    ])
+
+def test_common_subexpressions_in_loops ():
+    @make_shader(OpenGLEngine, argument_types=[ int, int ], optimize=False)
+    def main(a, n):
+        s = a + 1
+        while a + 1 < n:
+            a = a + 1
+        return a + 1
+    
+    assert main.c_code() == "\n".join([
+        "\nint main (int a, int n) {",
+        "\tint s = a + 1;",
+        "\twhile (a + 1 < n) {",
+        "\t\ta = a + 1;",
+        "\t}",
+        "\treturn a + 1;",
+        "}"
+    ])
+
+def test_shader_calls_are_not_merged ():
+    options = ShaderOptions() \
+        .addOutput( float, "count" )
+    @make_shader (OpenGLEngine, argument_types=[ float ], shader_options=options)
+    def f(x):
+        count = count + x
+        return count
+    @make_shader (OpenGLEngine, bound_shaders=[ f ], shader_options=options)
+    def main():
+        y = f(1.0) + f(1.0)
+    
+    assert main.c_code().endswith("\tfloat y = f(1.0) + f(1.0);\n}")
+
 EXPECTED_IF_STATEMENT_RESULT = [ """
 void main () {
 \tint x = 0;
@@ -145,18 +197,18 @@ void main () {
 \tint z = x + y;
 \tif (z > 0.5) {
 \t\ty = 2;
+\t} else if (z >= 1) {
+\t\ty = 4;
 \t} else {
-\t\tif (z >= 1) {
-\t\t\ty = 4;
-\t\t} else {
-\t\t\ty = 3;
-\t\t}
+\t\ty = 3;
 \t}
 \tint u = 0;
+\tint a;
 \tif (u + z > 0.2) {
-\t\tint a = u - z;
+\t\ta = u - z;
+\t\treturn;
 \t}
-\tint a = u + y;
+\ta = u + y;
 }""", """
 void main () {
 \tint x = 0;
@@ -164,12 +216,10 @@ void main () {
 \tint z = x + y;
 \tif (z > 0.5) {
 \t\ty = 2;
+\t} else if (z >= 1) {
+\t\ty = 4;
 \t} else {
-\t\tif (z >= 1) {
-\t\t\ty = 4;
-\t\t} else {
-\t\t\ty = 3;
-\t\t}
+\t\ty = 3;
 \t}
 \tint u = 0;
 \tif (u + z > 0.2) {
@@ -179,7 +229,7 @@ void main () {
 \t}
 }"""]
 def test_if_statement ():
-    @make_shader(OpenGLEngine)
+    @make_shader(OpenGLEngine, optimize=False)
     def main():
         x = 0
         y = 1
@@ -198,7 +248,7 @@ def test_if_statement ():
     assert main.c_code() in EXPECTED_IF_STATEMENT_RESULT
 
 def test_attributes():
-    @make_shader(OpenGLEngine)
+    @make_shader(OpenGLEngine, optimize=False)
     def main():
         x = 0
         y = 1
@@ -217,4 +267,660 @@ def test_attributes():
         "\tfloat u = W.x;",
         "\tfloat v = W.y;",
         "}"
-    ])
\ No newline at end of file
+    ])
+def test_linked_diamond ():
+    options = ShaderOptions() \
+        .addUniform( float, "scale" )
+    @make_shader (OpenGLEngine, argument_types=[ float ], shader_options=options)
+    def d(x):
+        return x * scale
+    @make_shader (OpenGLEngine, argument_types=[ float ], bound_shaders=[ d ], shader_options=options)
+    def b(x):
+        return d(x) + 1
+    @make_shader (OpenGLEngine, argument_types=[ float ], bound_shaders=[ d ], shader_options=options)
+    def c(x):
+        return d(x) - 1
+    @make_shader (OpenGLEngine, argument_types=[ float ])
+    def unused(x):
+        return x
+    @make_shader (OpenGLEngine, bound_shaders=[ b, c, unused ], shader_options=options)
+    def main():
+        y = b(1.0) + c(2.0)
+    
+    assert main.c_code() == "\n".join([
+        "uniform float scale;",
+        "",
+        "float d (float x) {",
+        "\treturn x * scale;",
+        "}",
+        "float b (float x) {",
+        "\treturn d(x) + 1;",
+        "}",
+        "float c (float x) {",
+        "\treturn d(x) - 1;",
+        "}",
+        "void main () {",
+        "\tfloat y = b(1.0) + c(2.0);",
+        "}"
+    ])
+
+def test_linked_conflicting_declarations ():
+    @make_shader (OpenGLEngine, argument_types=[ float ], shader_options=ShaderOptions().addUniform( float, "scale" ))
+    def f(x):
+        return x * scale
+    @make_shader (OpenGLEngine, bound_shaders=[ f ], shader_options=ShaderOptions().addUniform( vec2, "scale" ))
+    def main():
+        y = f(1.0)
+    
+    with pytest.raises(AssertionError, match="Conflicting declarations of scale in linked shaders"):
+        main.c_code()
+
+def test_linked_name_clash ():
+    def make_helper(offset):
+        @make_shader (OpenGLEngine, argument_types=[ float ])
+        def helper(x):
+            return x + offset
+        return helper
+    @make_shader (OpenGLEngine, argument_types=[ vec2 ])
+    def helper(A):
+        return A + A
+    @make_shader (OpenGLEngine, argument_types=[ float ], bound_shaders=[ make_helper(1.0) ])
+    def g(x):
+        return helper(x)
+
+    # Overloads with different parameter types link
+    @make_shader (OpenGLEngine, argument_types=[ vec2 ], bound_shaders=[ helper, g ])
+    def overloads(A):
+        return helper(A) + vec2(g(1.0), 0.0)
+    assert overloads.c_code().count(" helper (") == 2
+
+    @make_shader (OpenGLEngine, argument_types=[ float ], bound_shaders=[ make_helper(2.0), g ])
+    def main(x):
+        return helper(x) + g(x)
+
+    with pytest.raises(AssertionError, match=r"^Cannot link two different shaders named helper \(float\), rename one of them$"):
+        main.c_code()
+
+def test_write_c_code (tmp_path):
+    import io
+    @make_shader (OpenGLEngine, argument_types=[ float ], shader_options=ShaderOptions().addUniform( float, "scale" ))
+    def f(x):
+        return x * scale
+    @make_shader (OpenGLEngine, bound_shaders=[ f ], shader_options=ShaderOptions().addUniform( float, "scale" ))
+    def main():
+        y = f(1.0)
+
+    output = io.StringIO()
+    main.write_c_code(output)
+    assert output.getvalue() == main.c_code()
+
+    path = tmp_path / "main.glsl"
+    with open(path, "w", encoding="utf-8") as file:
+        main.write_c_code(file)
+    assert path.read_text(encoding="utf-8") == main.c_code()
+
+    class Sink:
+        def __init__(self):
+            self.chunks = []
+        def write(self, text):
+            self.chunks.append(text)
+    sink = Sink()
+    main.write_c_code(sink)
+    # Declarations and functions are written one by one
+    assert sink.chunks[0] == "uniform float scale;\n"
+    assert sink.chunks[-1] == main.function_c_code()
+
+def test_unsupported_opcodes ():
+    def main():
+        x = 0
+        y = [ x, x ]
+        z = { x: y }
+    
+    with pytest.raises(AssertionError, match="BUILD_LIST, BUILD_MAP not implemented by OpenGLEngine"):
+        make_shader(OpenGLEngine)(main)
+
+def test_register_opcode ():
+    class NegationEngine(OpenGLEngine):
+        pass
+
+    @NegationEngine.register_opcode("UNARY_NEGATIVE")
+    def compute__UNARY_NEGATIVE (self, stack, type_array, operation, indentation, bound_shaders, function_code):
+        value = stack.pop()
+        stack.append(self.expressions.unary(value.type, "-", value))
+
+        return None, indentation, 0
+
+    @make_shader(NegationEngine, argument_types=[ float ])
+    def main(x):
+        return -x
+    
+    assert main.c_code() == "\nfloat main (float x) {\n\treturn -x;\n}"
+    assert "UNARY_NEGATIVE" not in OpenGLEngine.opcode_handlers
+
+def test_register_opcode_on_a_base_class ():
+    class BaseEngine(OpenGLEngine):
+        pass
+    class DerivedEngine(BaseEngine):
+        pass
+    class OverridingEngine(BaseEngine):
+        def compute__UNARY_NEGATIVE (self, stack, type_array, operation, indentation, bound_shaders, function_code):
+            value = stack.pop()
+            stack.append(self.expressions.binary(value.type, "-", self.expressions.constant(value.type, 0.0), value))
+
+            return None, indentation, 0
+
+    # Registered after the subclasses were created
+    @BaseEngine.register_opcode("UNARY_NEGATIVE")
+    def compute__UNARY_NEGATIVE (self, stack, type_array, operation, indentation, bound_shaders, function_code):
+        value = stack.pop()
+        stack.append(self.expressions.unary(value.type, "-", value))
+
+        return None, indentation, 0
+
+    def main(x):
+        return -x
+
+    assert make_shader(DerivedEngine, argument_types=[ float ])(main).c_code() == "\nfloat main (float x) {\n\treturn -x;\n}"
+    assert make_shader(OverridingEngine, argument_types=[ float ])(main).c_code() == "\nfloat main (float x) {\n\treturn 0.0 - x;\n}"
+    assert "UNARY_NEGATIVE" not in OpenGLEngine.opcode_handlers
+
+def test_pruned_return_is_implicit ():
+    def make(early):
+        @make_shader (OpenGLEngine, argument_types=[ float ])
+        def main(x):
+            y = x
+            if early:
+                return
+            y = x + 1.0
+        return main
+
+    # Only the return of the pruned branch is left, it is the end of the function
+    assert make(True).c_code() == "\nvoid main (float x) {\n\n}"
+
+def test_unbalanced_stack_is_rejected ():
+    class BrokenEngine(OpenGLEngine):
+        pass
+
+    # Forgets to push its result, the return has nothing to give back
+    @BrokenEngine.register_opcode("UNARY_NEGATIVE")
+    def compute__UNARY_NEGATIVE (self, stack, type_array, operation, indentation, bound_shaders, function_code):
+        stack.pop()
+        return None, indentation, 0
+
+    def main(x):
+        y = 1.0
+        if x > 0:
+            y = 2.0
+        return -y
+
+    with pytest.raises(AssertionError, match="Unbalanced stack at the return of line"):
+        make_shader(BrokenEngine, argument_types=[ float ])(main)
+
+def test_while_statement ():
+    @make_shader(OpenGLEngine, argument_types=[ int ])
+    def main(n):
+        s = 0
+        while s < n:
+            if s > 5:
+                s = s + 2
+            else:
+                s = s + 1
+            k = 0
+            while k < s:
+                k = k + 1
+        return s
+    
+    assert main.c_code() == "\n".join([
+        "\nint main (int n) {",
+        "\tint s = 0;",
+        "\twhile (s < n) {",
+        "\t\tif (s > 5) {",
+        "\t\t\ts = s + 2;",
+        "\t\t} else {",
+        "\t\t\ts = s + 1;",
+        "\t\t}",
+        "\t\tint k = 0;",
+        "\t\twhile (k < s) {",
+        "\t\t\tk = k + 1;",
+        "\t\t}",
+        "\t}",
+        "\treturn s;",
+        "}"
+    ])
+
+def test_for_statement ():
+    @make_shader(OpenGLEngine, argument_types=[ float, int ])
+    def main(x, n):
+        s = 0.0
+        for i in range(1, n, 2):
+            t = x * i
+            s = s + t
+        for j in range(100, 0, -1):
+            s = s - x
+        z = s + x
+        return z
+
+    assert main.c_code() == "\n".join([
+        "\nfloat main (float x, int n) {",
+        "\tfloat s = 0.0;",
+        "\tfor (int i = 1; i < n; i += 2) {",
+        "\t\tfloat t = x * i;",
+        "\t\ts = s + t;",
+        "\t}",
+        "\tfor (int j = 100; j > 0; j--) {",
+        "\t\ts = s - x;",
+        "\t}",
+        "\tfloat z = s + x;",
+        "\treturn z;",
+        "}"
+    ])
+
+def test_unrolled_for_statement ():
+    def main(n):
+        s = 0
+        for i in range(3):
+            for j in range(i, 2):
+                s = s + n * j
+        z = s + i
+        return z
+
+    # The loop variable keeps its last value after the loop, like in python
+    assert make_shader(OpenGLEngine, argument_types=[ int ])(main).c_code() == "\n".join([
+        "\nint main (int n) {",
+        "\tint s;",
+        "\ts = 0 + n * 0;",
+        "\ts = s + n * 1;",
+        "\ts = s + n * 1;",
+        "\tint z = s + 2;",
+        "\treturn z;",
+        "}"
+    ])
+
+    with pytest.raises(AssertionError, match="The loop variable i of the for loop at line"):
+        make_shader(OpenGLEngine, argument_types=[ int ], unroll_limit=0)(main)
+
+def test_unrolled_copies_do_not_share_locals ():
+    @make_shader (OpenGLEngine, argument_types=[ float, float ])
+    def main(a, b):
+        s = 0.0
+        for i in range(3):
+            y = a * b
+            s = s + y
+        return s
+
+    # Every copy declares y in its own block, none can read the y of the previous one
+    assert main.c_code() == "\n".join([
+        "\nfloat main (float a, float b) {",
+        "\tfloat s;",
+        "\t{",
+        "\t\tfloat y = a * b;",
+        "\t\ts = 0.0 + y;",
+        "\t}",
+        "\t{",
+        "\t\tfloat y = a * b;",
+        "\t\ts = s + y;",
+        "\t}",
+        "\t{",
+        "\t\tfloat y = a * b;",
+        "\t\ts = s + y;",
+        "\t}",
+        "\treturn s;",
+        "}"
+    ])
+
+def test_unroll_limit ():
+    def main(x):
+        s = 0.0
+        for i in range(4):
+            s = s + x
+        z = s + x
+        return z
+
+    assert make_shader(OpenGLEngine, argument_types=[ float ])(main).c_code().count("s = s + x;") == 3
+    assert "\tfor (int i = 0; i < 4; i++) {\n\t\ts = s + x;\n\t}" in make_shader(OpenGLEngine, argument_types=[ float ], unroll_limit=3)(main).c_code()
+
+    # An empty range is not translated at all
+    def empty(x):
+        s = x
+        for i in range(4, 4):
+            s = s + x
+        return s
+    assert make_shader(OpenGLEngine, argument_types=[ float ])(empty).c_code() == "\nfloat empty (float x) {\n\tfloat s = x;\n\treturn s;\n}"
+
+def test_conditional_expression ():
+    @make_shader(OpenGLEngine, argument_types=[ float ])
+    def main(x):
+        y = 1.0 if x > 0 else 2.0
+        z = y * x + y
+        w = z * z - x
+        return w
+
+    assert main.c_code() == "\n".join([
+        "\nfloat main (float x) {",
+        "\tfloat y = x > 0 ? 1.0 : 2.0;",
+        "\tfloat z = y * x + y;",
+        "\tfloat w = z * z - x;",
+        "\treturn w;",
+        "}"
+    ])
+
+    @make_shader(OpenGLEngine, argument_types=[ float ])
+    def chained(x):
+        y = 1.0 if x > 0 else 2.0 if x < -1.0 else 3.0
+        z = y + (x if x < 0.5 else 0.5)
+        return z
+
+    # python 3.10 copies the end of the function into the branches of the second one
+    code = chained.c_code()
+    assert code.startswith("\nfloat chained (float x) {\n\tfloat y = x > 0 ? 1.0 : x < -1.0 ? 2.0 : 3.0;\n")
+    assert "float z = y + (x < 0.5 ? x : 0.5);" in code or "z = y + x;" in code
+
+    @make_shader(OpenGLEngine, argument_types=[ float ])
+    def returned(x):
+        return x + 1.0 if x > 0 else x
+
+    assert returned.c_code() in (
+        "\nfloat returned (float x) {\n\treturn x > 0 ? x + 1.0 : x;\n}",
+        "\nfloat returned (float x) {\n\tif (x > 0) {\n\t\treturn x + 1.0;\n\t}\n\treturn x;\n}"
+    )
+
+def test_flatten_branches ():
+    def main(z, A):
+        y = 1
+        if z > 0.5:
+            y = 2
+        elif z >= 0:
+            y = 4
+        else:
+            y = 3
+        if y > 2:
+            B = A + A
+            A = B + vec2(z, 1.0)
+        w = A.x + y
+        return w
+
+    assert make_shader(OpenGLEngine, argument_types=[ float, vec2 ], flatten_threshold=8)(main).c_code() == "\n".join([
+        "\nfloat main (float z, vec2 A) {",
+        "\tint y = z > 0.5 ? 2 : z >= 0 ? 4 : 3;",
+        "\tA = y > 2 ? A + A + vec2(z, 1.0) : A;",
+        "\tfloat w = A.x + y;",
+        "\treturn w;",
+        "}"
+    ])
+    # Each vec2 addition costs 2
+    lines = make_shader(OpenGLEngine, argument_types=[ float, vec2 ], flatten_threshold=3)(main).c_code().split("\n")
+    assert lines[2] == "\tint y = z > 0.5 ? 2 : z >= 0 ? 4 : 3;" and lines[3] == "\tif (y > 2) {"
+
+    assert "?" not in make_shader(OpenGLEngine, argument_types=[ float, vec2 ])(main).c_code()
+
+def test_long_elif_chain ():
+    count  = 400
+    source = "def main(x):\n    y = 0\n    if x < 0:\n        y = 0\n"
+    source += "".join( f"    elif x < {idx}:\n        y = {idx}\n" for idx in range(1, count) )
+    source += "    z = y + x\n    return z\n"
+
+    scope = {}
+    exec(source, scope)
+    main = make_shader(OpenGLEngine, argument_types=[ int ])(scope["main"])
+
+    lines = main.c_code().split("\n")
+    assert lines[3] == "\tif (x < 0) {"
+    assert lines[5] == "\t} else if (x < 1) {"
+    assert lines[-5] == f"\t\ty = {count - 1};"
+    assert max( len(line) - len(line.lstrip("\t")) for line in lines ) == 2
+
+def test_constant_folding ():
+    @make_shader(OpenGLEngine, argument_types=[ vec2 ])
+    def main(A):
+        x = 0
+        y = 1
+        z = x + y
+        W = vec2(1.0, 2.0) + vec2(3, 4)
+        if z > 0.5:
+            y = z * 7 / 2
+        else:
+            y = 3
+        return A + vec2(W.x * y, z - 2)
+
+    assert main.c_code() == "\n".join([
+        "\nvec2 main (vec2 A) {",
+        "\treturn A + vec2(12.0, -1);",
+        "}"
+    ])
+
+def test_dead_stores ():
+    options = ShaderOptions() \
+        .addOutput( float, "color" )
+    @make_shader(OpenGLEngine, argument_types=[ float, int ], shader_options=options)
+    def main(x, n):
+        unused = x * 2.0
+        w = x + 1.0
+        w = x - 1.0
+        k = 0
+        while k < n:
+            w = w * x
+            k = k + 1
+        color = w
+    
+    assert main.c_code() == "\n".join([
+        "out float color;",
+        "",
+        "void main (float x, int n) {",
+        "\tfloat w;",
+        "\tw = x - 1.0;",
+        "\tint k = 0;",
+        "\twhile (k < n) {",
+        "\t\tw = w * x;",
+        "\t\tk = k + 1;",
+        "\t}",
+        "\tcolor = w;",
+        "}"
+    ])
+
+def test_optimize_option ():
+    def main(x):
+        y = 2
+        return x + y
+    
+    assert make_shader(OpenGLEngine, argument_types=[ int ])(main).c_code() == "\nint main (int x) {\n\treturn x + 2;\n}"
+    assert make_shader(OpenGLEngine, argument_types=[ int ], optimize=False)(main).c_code() == "\nint main (int x) {\n\tint y = 2;\n\treturn x + y;\n}"
+
+def test_hoisted_declarations ():
+    @make_shader(OpenGLEngine, argument_types=[ float ])
+    def main(x):
+        if x > 0:
+            a = x * 2.0
+            b = 1.0
+        elif x < -1:
+            a = 0.0
+            b = 2
+        else:
+            a = x
+            b = 3.0
+        z = a + x
+        return z
+    
+    assert main.c_code() == "\n".join([
+        "\nfloat main (float x) {",
+        "\tfloat a;",
+        "\tif (x > 0) {",
+        "\t\ta = x * 2.0;",
+        "\t} else if (x < -1) {",
+        "\t\ta = 0.0;",
+        "\t} else {",
+        "\t\ta = x;",
+        "\t}",
+        "\tfloat z = a + x;",
+        "\treturn z;",
+        "}"
+    ])
+
+def test_operation_table ():
+    from shadermake.engines.opengl import GLSL_Operations, _GLSL_Type, _t_float, _t_int, _t_bool
+
+    assert _t_int.get_resulting_type("+", _t_float) == _t_float
+    assert _t_float.get_resulting_type("<=", _t_int) == _t_bool
+
+    # Growing the table past its capacity keeps the existing operations
+    types = [ _GLSL_Type(f"test{idx}") for idx in range(GLSL_Operations.capacity) ]
+    types[0].link_operand("+", types[-1], types[1])
+    types[-1].link_operand("<<", types[0], types[2])
+
+    assert _t_int.get_resulting_type("*", _t_int) == _t_int
+    assert types[0].get_resulting_type("+", types[-1]) == types[1]
+    assert types[-1].get_resulting_type("<<", types[0]) == types[2]
+
+    with pytest.raises(AssertionError, match="cannot be used on type bool"):
+        _t_bool.get_resulting_type("+", _t_int)
+
+def test_variant_resolution ():
+    from shadermake.engines.opengl import _GLSL_Pure_Function, _GLSL_Variant, _t_float, _t_int, _t_vec2, _t_vec3
+
+    function = _GLSL_Pure_Function("f") \
+        .link_variant( _GLSL_Variant( _t_vec2, [ _t_vec2 ] ) ) \
+        .link_variant( _GLSL_Variant( _t_vec3, [ _t_float ] ) )
+
+    variant = function.find_variant([ (_t_int, "x") ])
+    assert variant.end_type() == _t_vec3
+    assert function.find_variant([ (_t_int, "y") ]) is variant
+    assert function.find_variant([ (_t_vec2, "z") ]).end_type() == _t_vec2
+    assert function.find_variant([ (_t_vec3, "w") ]) is None
+
+def test_specialization_constants ():
+    def make(scale, shadows):
+        @make_shader (OpenGLEngine, argument_types=[ float ], constants={ "BIAS": 1 })
+        def main(x):
+            y = x * scale + BIAS
+            if shadows:
+                y = y * 0.5
+            z = y + x
+            return z
+        return main
+
+    # Closure values are inlined and the branches on them are removed
+    assert make(2.0, False).c_code() == "\n".join([
+        "",
+        "float main (float x) {",
+        "\tfloat y = x * 2.0 + 1;",
+        "\tfloat z = y + x;",
+        "\treturn z;",
+        "}"
+    ])
+    assert make(2.0, True).c_code() == "\n".join([
+        "",
+        "float main (float x) {",
+        "\tfloat y = x * 2.0 + 1;",
+        "\ty = y * 0.5;",
+        "\tfloat z = y + x;",
+        "\treturn z;",
+        "}"
+    ])
+    assert make(2.0, True) is make(2.0, True)
+    assert make(2.0, True) is not make(3.0, True)
+
+def test_uniform_blocks ():
+    options = ShaderOptions() \
+        .addUniformBlock( "Light", [ (vec3, "color"), (float, "intensity") ], binding=1 ) \
+        .addUniform( float, "scale" )
+    @make_shader (OpenGLEngine, argument_types=[ vec3 ], shader_options=options)
+    def main(A):
+        return A + color
+    
+    assert main.c_code() == "\n".join([
+        "uniform float scale;",
+        "layout(std140, binding = 1) uniform Light {",
+        "\tvec3 color;",
+        "\tfloat intensity;",
+        "};",
+        "",
+        "vec3 main (vec3 A) {",
+        "\treturn A + color;",
+        "}"
+    ])
+
+    layout = options.uniformBlockLayout("Light")
+    assert [ (member.name, member.offset) for member in layout.members ] == [ ("color", 0), ("intensity", 12) ]
+    assert layout.size == 16
+
+def test_storage_blocks ():
+    options = ShaderOptions().addUniformBlock( "Particles", [ (vec2, "speed") ], layout="std430", binding=2 )
+    @make_shader (OpenGLEngine, argument_types=[ vec2 ], shader_options=options)
+    def main(A):
+        return A + speed
+
+    assert main.c_code().split("\n")[:3] == [
+        "layout(std430, binding = 2) buffer Particles {",
+        "\tvec2 speed;",
+        "};"
+    ]
+
+def test_vertex_layout ():
+    options = ShaderOptions() \
+        .useVertex() \
+        .addInput( vec2, "uv", 1 ) \
+        .addInput( vec4, "position", 0 ) \
+        .addOutput( vec2, "frag_uv" )
+    @make_shader (OpenGLEngine, shader_options=options)
+    def main():
+        gl_Position = position
+        frag_uv = uv
+    
+    layout = main.vertex_layout()
+    assert [ (attribute.name, attribute.location, attribute.components, attribute.offset) for attribute in layout.attributes ] == [
+        ("position", 0, 4, 0), ("uv", 1, 2, 16)
+    ]
+    assert layout.stride == 24
+
+def test_every_branch_returns ():
+    # The implicit return following the if statements is never reached
+    def if_else(c):
+        if c > 0.0:
+            return 1.0
+        else:
+            return 3.0
+    def elif_chain(c):
+        if c > 0.0:
+            return 1.0
+        elif c > -1.0:
+            return 2.0
+        else:
+            return 3.0
+
+    assert make_shader(OpenGLEngine, argument_types=[ float ])(if_else).c_code() == "\n".join([
+        "\nfloat if_else (float c) {",
+        "\tif (c > 0.0) {",
+        "\t\treturn 1.0;",
+        "\t}",
+        "\treturn 3.0;",
+        "}"
+    ])
+    assert make_shader(OpenGLEngine, argument_types=[ float ])(elif_chain).c_code() == "\n".join([
+        "\nfloat elif_chain (float c) {",
+        "\tif (c > 0.0) {",
+        "\t\treturn 1.0;",
+        "\t}",
+        "\tif (c > -1.0) {",
+        "\t\treturn 2.0;",
+        "\t}",
+        "\treturn 3.0;",
+        "}"
+    ])
+
+def test_break_is_rejected ():
+    def while_break(c):
+        s = 0.0
+        while s < c:
+            s = s + 1.0
+            if s > 3.0:
+                break
+        return s
+    def for_break(c):
+        s = 0.0
+        for i in range(4):
+            s = s + 1.0
+            if s > c: break
+        return s
+
+    for function in ( while_break, for_break ):
+        with pytest.raises(AssertionError, match="Unsupported break statement at line [0-9]+, a loop can only end on its condition"):
+            make_shader(OpenGLEngine, argument_types=[ float ])(function)
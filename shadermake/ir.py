@@ -0,0 +1,253 @@
+from typing import List
+
+# Expressions, every node is typed with the engine's type objects
+
+class Expression:
+    __slots__ = ( "type", )
+
+    def children (self):
+        return ()
+
+class Constant(Expression):
+    __slots__ = ( "value", )
+
+    def __init__(self, type, value):
+        self.type  = type
+        self.value = value
+
+class Variable(Expression):
+    # The version changes with every store, two reads of the same version hold the same value
+    __slots__ = ( "name", "version" )
+
+    def __init__(self, type, name, version=0):
+        self.type    = type
+        self.name    = name
+        self.version = version
+
+class Attribute(Expression):
+    __slots__ = ( "value", "name" )
+
+    def __init__(self, type, value: Expression, name):
+        self.type  = type
+        self.value = value
+        self.name  = name
+
+    def children (self):
+        return ( self.value, )
+
+class Unary(Expression):
+    __slots__ = ( "operand", "value" )
+
+    def __init__(self, type, operand, value: Expression):
+        self.type    = type
+        self.operand = operand
+        self.value   = value
+
+    def children (self):
+        return ( self.value, )
+
+class Binary(Expression):
+    __slots__ = ( "operand", "left", "right" )
+
+    def __init__(self, type, operand, left: Expression, right: Expression):
+        self.type    = type
+        self.operand = operand
+        self.left    = left
+        self.right   = right
+
+    def children (self):
+        return ( self.left, self.right )
+
+class Call(Expression):
+    # Impure calls, such as calls to other shaders, are never merged
+    __slots__ = ( "function", "args", "pure" )
+
+    def __init__(self, type, function, args: List[Expression], pure=True):
+        self.type     = type
+        self.function = function
+        self.args     = tuple(args)
+        self.pure     = pure
+
+    def children (self):
+        return self.args
+
+class Select(Expression):
+    # condition ? value : orelse, both values are evaluated
+    __slots__ = ( "condition", "value", "orelse" )
+
+    def __init__(self, type, condition: Expression, value: Expression, orelse: Expression):
+        self.type      = type
+        self.condition = condition
+        self.value     = value
+        self.orelse    = orelse
+
+    def children (self):
+        return ( self.condition, self.value, self.orelse )
+
+# Statements
+
+class Statement:
+    __slots__ = ()
+
+    def expressions (self):
+        return ()
+
+class Assign(Statement):
+    # declaration is the type of the variable when the assignment declares it
+    __slots__ = ( "name", "value", "declaration" )
+
+    def __init__(self, name, value: Expression, declaration=None):
+        self.name        = name
+        self.value       = value
+        self.declaration = declaration
+
+    def expressions (self):
+        return ( self.value, )
+
+class Return(Statement):
+    __slots__ = ( "value", )
+
+    def __init__(self, value: Expression = None):
+        self.value = value
+
+    def expressions (self):
+        return () if self.value is None else ( self.value, )
+
+class If(Statement):
+    # An elif chain is a single statement, branches is a list of (condition, body)
+    __slots__ = ( "branches", "orelse" )
+
+    def __init__(self, branches, orelse: List[Statement] = None):
+        self.branches = branches
+        self.orelse   = orelse
+
+    def expressions (self):
+        # Only the first condition is always evaluated before the statement
+        return ( self.branches[0][0], )
+
+class While(Statement):
+    __slots__ = ( "condition", "body" )
+
+    def __init__(self, condition: Expression, body: List[Statement]):
+        self.condition = condition
+        self.body      = body
+
+class For(Statement):
+    # Counting loop over range(start, stop, step), the loop variable is declared by the loop when declaration
+    # is its type. step is a python int, stop is evaluated again before every iteration.
+    __slots__ = ( "name", "start", "stop", "step", "body", "declaration" )
+
+    def __init__(self, name, start: Expression, stop: Expression, step: int, body: List[Statement], declaration=None):
+        self.name        = name
+        self.start       = start
+        self.stop        = stop
+        self.step        = step
+        self.body        = body
+        self.declaration = declaration
+
+    def expressions (self):
+        return ( self.start, )
+
+class Declare(Statement):
+    # Declaration left behind when the assignment declaring a variable is removed
+    __slots__ = ( "type", "name" )
+
+    def __init__(self, type, name):
+        self.type = type
+        self.name = name
+
+class Block(Statement):
+    # Statements in their own scope
+    __slots__ = ( "body", )
+
+    def __init__(self, body: List[Statement]):
+        self.body = body
+
+class Raw(Statement):
+    # Code given as text by an opcode handler
+    __slots__ = ( "code", )
+
+    def __init__(self, code):
+        self.code = code
+
+class ExpressionTable:
+    # Hash-conses expressions inside a basic block : building the same expression twice gives the same node,
+    # and an expression already stored in a variable gives back that variable
+    def __init__(self):
+        self.versions  = {}
+        self.nodes     = {}
+        self.available = {}
+
+    def barrier (self):
+        # Values cannot be shared across basic blocks, every variable may have changed on another path
+        self.nodes.clear()
+        self.available.clear()
+
+    def make (self, key, factory):
+        node = self.nodes.get(key)
+        if node is None:
+            node = self.nodes[key] = factory()
+
+        variable = self.available.get(node)
+        if variable is not None and self.versions.get(variable.name, 0) == variable.version:
+            return variable
+        return node
+
+    def constant (self, type, value):
+        # 1, 1.0 and True are equal python keys, the python type keeps them apart
+        return self.make((Constant, type, value.__class__, value), lambda: Constant(type, value))
+    def variable (self, type, name):
+        version = self.versions.get(name, 0)
+        return self.make((Variable, type, name, version), lambda: Variable(type, name, version))
+    def attribute (self, type, value, name):
+        return self.make((Attribute, type, value, name), lambda: Attribute(type, value, name))
+    def unary (self, type, operand, value):
+        return self.make((Unary, type, operand, value), lambda: Unary(type, operand, value))
+    def binary (self, type, operand, left, right):
+        return self.make((Binary, type, operand, left, right), lambda: Binary(type, operand, left, right))
+    def call (self, type, function, args, pure=True):
+        if not pure:
+            # The called function may write any global, nothing read before the call can be reused after it
+            self.barrier()
+            return Call(type, function, args, pure)
+        return self.make((Call, type, function, tuple(args)), lambda: Call(type, function, args, pure))
+
+    def store (self, type, name, value: Expression):
+        self.versions[name] = self.versions.get(name, 0) + 1
+
+        if value.children() and value.type == type:
+            self.available[value] = self.variable(type, name)
+
+def common_subexpressions (statements: List[Statement]):
+    # Nodes evaluated more than once by the statements, worth computing once in a temporary declared before
+    # the statement using them first. Gives the list of these nodes for every statement, operands first.
+    uses       = {}
+    first_uses = []
+    for statement in statements:
+        statement_uses = []
+        impure         = False
+
+        stack = [ (node, False) for node in reversed(statement.expressions()) ]
+        while len(stack) != 0:
+            node, expanded = stack.pop()
+
+            if expanded:
+                statement_uses.append(node)
+                continue
+            if node in uses:
+                uses[node] += 1
+                continue
+
+            uses[node] = 1
+            stack.append((node, True))
+            stack.extend( (child, False) for child in reversed(node.children()) )
+
+            impure = impure or (isinstance(node, Call) and not node.pure)
+
+        # Computing a value before the statement would move it before a call that may change what it reads
+        first_uses.append([] if impure else statement_uses)
+
+    return [
+        [ node for node in statement_uses if uses[node] > 1 and isinstance(node, (Unary, Binary, Call)) ]
+        for statement_uses in first_uses
+    ]
@@ -0,0 +1,142 @@
+# Memory layout of the data shared with the GPU. Types are given by their GLSL type name, so this module
+# does not depend on the engines, numpy is only needed to build the structured dtypes.
+
+from typing import NamedTuple
+
+LAYOUTS = [ "std140", "std430" ]
+
+# Size, base alignment, numpy scalar type and shape of each type in a uniform block. A vec3 is aligned
+# like a vec4, a mat4 is stored as 4 columns of vec4 : m[column][row]
+BLOCK_TYPES = {
+    "float": (  4,  4, "<f4", ()      ),
+    "int":   (  4,  4, "<i4", ()      ),
+    "vec2":  (  8,  8, "<f4", (2, )   ),
+    "vec3":  ( 12, 16, "<f4", (3, )   ),
+    "vec4":  ( 16, 16, "<f4", (4, )   ),
+    "mat4":  ( 64, 16, "<f4", (4, 4)  )
+}
+
+def align (offset, alignment):
+    return (offset + alignment - 1) // alignment * alignment
+
+def numpy_dtype (fields, itemsize):
+    # fields are (name, numpy scalar type, shape, offset)
+    import numpy as np
+
+    return np.dtype({
+        "names":    [ name for (name, format, shape, offset) in fields ],
+        "formats":  [ (format, shape) if len(shape) != 0 else format for (name, format, shape, offset) in fields ],
+        "offsets":  [ offset for (name, format, shape, offset) in fields ],
+        "itemsize": itemsize
+    })
+
+class BlockMember(NamedTuple):
+    name:      str
+    typename:  str
+    offset:    int
+    size:      int
+    alignment: int
+
+class BlockLayout:
+    # Offsets of the members of a uniform block following the std140 or std430 rules. For the supported
+    # types both layouts place the members at the same offsets, std140 rounds the size of the block up
+    # to a multiple of 16 bytes while std430 rounds it to the largest alignment of its members.
+    def __init__(self, name, members, layout="std140"):
+        assert layout in LAYOUTS, f"Unknown uniform block layout {layout}, expected one of {', '.join(LAYOUTS)}"
+        self.name    = name
+        self.layout  = layout
+        self.members = []
+
+        offset    = 0
+        alignment = 16 if layout == "std140" else 1
+        for (typename, member_name) in members:
+            assert typename in BLOCK_TYPES, f"Type {typename} of {member_name} cannot be used in a uniform block"
+            size, member_alignment, format, shape = BLOCK_TYPES[typename]
+
+            offset = align(offset, member_alignment)
+            self.members.append(BlockMember(member_name, typename, offset, size, member_alignment))
+
+            offset   += size
+            alignment = max(alignment, member_alignment)
+
+        self.size = align(offset, alignment)
+
+    def offset (self, name):
+        for member in self.members:
+            if member.name == name:
+                return member.offset
+        assert False, f"No member {name} in the uniform block {self.name}"
+
+    def numpy_dtype (self):
+        # One element is the whole block, padding included, so an array of shape (1, ) can be uploaded as is
+        return numpy_dtype([
+            (member.name, BLOCK_TYPES[member.typename][2], BLOCK_TYPES[member.typename][3], member.offset)
+            for member in self.members
+        ], self.size)
+
+# Component count and numpy scalar type of each type a vertex attribute can have
+VERTEX_TYPES = {
+    "float": (1, "<f4"),
+    "int":   (1, "<i4"),
+    "vec2":  (2, "<f4"),
+    "vec3":  (3, "<f4"),
+    "vec4":  (4, "<f4")
+}
+
+class VertexAttribute(NamedTuple):
+    name:       str
+    typename:   str
+    location:   int
+    components: int
+    # "float" or "int", integer attributes are set with glVertexAttribIPointer
+    scalar:     str
+    offset:     int
+    size:       int
+
+class VertexLayout:
+    # Interleaved buffer holding every attribute of a vertex one after the other, in the order of their
+    # locations (attributes without a location come last, in declaration order)
+    def __init__(self, attributes):
+        # attributes are (type name, name, location)
+        ordered = sorted(attributes, key=lambda attribute: (attribute[2] is None, attribute[2] or 0))
+
+        self.attributes = []
+        offset = 0
+        for (typename, name, location) in ordered:
+            assert typename in VERTEX_TYPES, f"Type {typename} of {name} cannot be used as a vertex attribute"
+            components, format = VERTEX_TYPES[typename]
+
+            size = components * 4
+            self.attributes.append(VertexAttribute(name, typename, location, components, "int" if typename == "int" else "float", offset, size))
+            offset += size
+
+        self.stride = offset
+
+    def attribute (self, name):
+        for attribute in self.attributes:
+            if attribute.name == name:
+                return attribute
+        assert False, f"No vertex attribute named {name}"
+
+    def numpy_dtype (self):
+        return numpy_dtype([
+            (attribute.name, VERTEX_TYPES[attribute.typename][1], () if attribute.components == 1 else (attribute.components, ), attribute.offset)
+            for attribute in self.attributes
+        ], self.stride)
+
+    def pack (self, arrays):
+        # arrays maps every attribute name to an array of shape (vertices, components), or (vertices, ) for
+        # one component. Each attribute is copied into the interleaved array at once.
+        import numpy as np
+
+        missing = [ attribute.name for attribute in self.attributes if attribute.name not in arrays ]
+        assert len(missing) == 0, f"Missing vertex attributes {', '.join(missing)}"
+
+        count  = len(arrays[self.attributes[0].name]) if len(self.attributes) != 0 else 0
+        packed = np.empty(count, dtype=self.numpy_dtype())
+        for attribute in self.attributes:
+            values = np.asarray(arrays[attribute.name])
+            assert len(values) == count, f"Vertex attribute {attribute.name} has {len(values)} vertices instead of {count}"
+
+            packed[attribute.name] = values
+        return packed
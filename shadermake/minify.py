@@ -0,0 +1,126 @@
+# Minified GLSL : whitespace is dropped and the names declared by the functions (locals, parameters,
+# temporaries, helper functions) become short identifiers. It works on the generated text, so shaders
+# loaded from a disk cache or a bundle can be minified as well.
+
+import re
+
+from typing import NamedTuple
+
+TOKEN = re.compile(r"""
+      (?P<space>   \s+ | //[^\n]* | /\*.*?\*/ )
+    | (?P<number>  (?: \d+\.?\d* | \.\d+ ) (?: [eE][-+]?\d+ )? [uUfF]? )
+    | (?P<name>    [A-Za-z_]\w* )
+    | (?P<operator> \+\+ | -- | <<= | >>= | [-+*/%<>=!&|^]= | && | \|\| | \^\^ | << | >> | . )
+""", re.VERBOSE | re.DOTALL)
+
+# Words a short name could collide with
+KEYWORDS = {
+    "attribute", "const", "uniform", "varying", "buffer", "shared", "layout", "centroid", "flat", "smooth",
+    "noperspective", "patch", "sample", "break", "continue", "do", "for", "while", "switch", "case", "default",
+    "if", "else", "subroutine", "in", "out", "inout", "true", "false", "invariant", "precise", "discard",
+    "return", "struct", "precision", "lowp", "mediump", "highp", "void", "bool", "int", "uint", "float",
+    "double", "asm", "class", "union", "enum", "typedef", "template", "this", "goto", "inline", "noinline",
+    "volatile", "public", "static", "extern", "external", "interface", "long", "short", "half", "fixed",
+    "unsigned", "input", "output", "sizeof", "cast", "namespace", "using"
+}
+NAME_START = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+NAME_REST  = NAME_START + "0123456789_"
+
+class MinifiedCode(NamedTuple):
+    code:          str
+    original_size: int
+    size:          int
+    # Original name to short name
+    renamed:       dict
+
+    def saved (self):
+        return self.original_size - self.size
+    def reduction (self):
+        # Fraction of the original size removed, 0.25 for a code a quarter smaller
+        return self.saved() / self.original_size if self.original_size != 0 else 0.0
+
+def tokenize (code):
+    tokens = []
+    for match in TOKEN.finditer(code):
+        if match.lastgroup != "space":
+            tokens.append((match.lastgroup, match.group()))
+    return tokens
+
+def short_names (reserved):
+    # a, b, ..., Z, aa, ab, ... skipping the words already used by the code
+    length = 1
+    while True:
+        for index in range(len(NAME_START) * len(NAME_REST) ** (length - 1)):
+            name = NAME_START[index % len(NAME_START)]
+            index //= len(NAME_START)
+            for _ in range(length - 1):
+                name  += NAME_REST[index % len(NAME_REST)]
+                index //= len(NAME_REST)
+
+            if name not in reserved and name not in KEYWORDS and "__" not in name:
+                yield name
+        length += 1
+
+def declared_names (tokens, types):
+    # Names following a type : variables, parameters and functions
+    declared = set()
+    for (kind, value), (next_kind, next_value) in zip(tokens, tokens[1:]):
+        if kind == "name" and value in types and next_kind == "name":
+            declared.add(next_value)
+    return declared
+
+def join_tokens (values, out):
+    # A space only where two tokens would read as one
+    previous = None
+    for value in values:
+        if previous is not None and TOKEN.match(previous + value).group() != previous:
+            out.append(" ")
+        out.append(value)
+        previous = value
+
+def minify (code, keep=(), types=()):
+    # keep are the names to leave untouched (inputs, outputs, uniforms, entry point), types the type names
+    # introducing a declaration. Names starting with gl_ are never renamed.
+    lines    = code.split("\n")
+    segments = []
+    tokens   = []
+    for line in lines:
+        # Preprocessor directives stay on their own line
+        if line.lstrip().startswith("#"):
+            segments.append(tokens)
+            segments.append(line.strip())
+            tokens = []
+        else:
+            tokens.extend(tokenize(line))
+    segments.append(tokens)
+
+    all_tokens = [ token for segment in segments if isinstance(segment, list) for token in segment ]
+    keep       = set(keep)
+    renamable  = { name for name in declared_names(all_tokens, set(types)) if name not in keep and not name.startswith("gl_") }
+
+    # The most used names get the shortest replacements
+    counts = {}
+    for kind, value in all_tokens:
+        if kind == "name" and value in renamable:
+            counts[value] = counts.get(value, 0) + 1
+    reserved = { value for kind, value in all_tokens if kind == "name" and value not in renamable }
+    renamed  = dict(zip(sorted(counts, key=lambda name: -counts[name]), short_names(reserved)))
+
+    out = []
+    for segment in segments:
+        if isinstance(segment, str):
+            if len(out) != 0: out.append("\n")
+            out.append(segment)
+            out.append("\n")
+            continue
+
+        # An attribute is not a variable even if it has the name of one
+        values = []
+        for idx, (kind, value) in enumerate(segment):
+            if kind == "name" and value in renamed and (idx == 0 or segment[idx - 1][1] != "."):
+                value = renamed[value]
+            values.append(value)
+        join_tokens(values, out)
+
+    minified = "".join(out)
+    return MinifiedCode(minified, len(code.encode("utf-8")), len(minified.encode("utf-8")), renamed)
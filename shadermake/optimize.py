@@ -0,0 +1,510 @@
+import math
+import operator
+
+from typing import List
+
+from shadermake.ir import Expression, Constant, Variable, Attribute, Unary, Binary, Call, Select
+from shadermake.ir import Statement, Assign, Return, If, While, For, Declare, Block, Raw
+
+INT_MIN = -2 ** 31
+INT_MAX =  2 ** 31 - 1
+
+ARITHMETIC = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul
+}
+COMPARISONS = {
+    ">":  operator.gt,
+    ">=": operator.ge,
+    "<":  operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne
+}
+COMPONENTS = "xyzw"
+
+def used_names (node: Expression):
+    names = set()
+    stack = [ node ]
+    while len(stack) != 0:
+        node = stack.pop()
+        if isinstance(node, Variable):
+            names.add(node.name)
+        stack.extend(node.children())
+
+    return names
+
+def is_impure (node: Expression):
+    stack = [ node ]
+    while len(stack) != 0:
+        node = stack.pop()
+        if isinstance(node, Call) and not node.pure:
+            return True
+        stack.extend(node.children())
+
+    return False
+
+def assigned_names (statements: List[Statement]):
+    names = set()
+    for statement in statements:
+        if isinstance(statement, Assign):
+            names.add(statement.name)
+        elif isinstance(statement, If):
+            for condition, body in statement.branches:
+                names |= assigned_names(body)
+            if statement.orelse is not None:
+                names |= assigned_names(statement.orelse)
+        elif isinstance(statement, (While, Block)):
+            names |= assigned_names(statement.body)
+        elif isinstance(statement, For):
+            names.add(statement.name)
+            names |= assigned_names(statement.body)
+
+    return names
+
+def referenced_names (statement: Statement):
+    names = set()
+    if isinstance(statement, (Assign, Declare)):
+        names.add(statement.name)
+    for node in statement.expressions():
+        names |= used_names(node)
+
+    if isinstance(statement, If):
+        for condition, body in statement.branches:
+            names |= used_names(condition)
+            for child in body: names |= referenced_names(child)
+        for child in statement.orelse or []:
+            names |= referenced_names(child)
+    elif isinstance(statement, While):
+        names |= used_names(statement.condition)
+        for child in statement.body: names |= referenced_names(child)
+    elif isinstance(statement, For):
+        names.add(statement.name)
+        names |= used_names(statement.stop)
+        for child in statement.body: names |= referenced_names(child)
+    elif isinstance(statement, Block):
+        for child in statement.body: names |= referenced_names(child)
+
+    return names
+
+def contains_raw (statements: List[Statement]):
+    for statement in statements:
+        if isinstance(statement, Raw):
+            return True
+        if isinstance(statement, If):
+            if any( contains_raw(body) for condition, body in statement.branches ): return True
+            if statement.orelse is not None and contains_raw(statement.orelse): return True
+        elif isinstance(statement, (While, For, Block)) and contains_raw(statement.body):
+            return True
+
+    return False
+
+class Optimizer:
+    # Folds constant expressions, propagates constants stored in variables, prunes if statements with a
+    # constant condition and removes the stores that are never read. Variables in global_names are the
+    # inputs, outputs and uniforms of the shader, their stores are always kept.
+    # With a flatten_threshold, if statements only assigning values become selects when the estimator (a
+    # shadermake.cost.CostEstimator) gives at most this ALU cost to the values computed on every path.
+    def __init__(self, bool_type, int_type, float_type, vector_types, global_names=(), flatten_threshold=None, estimator=None):
+        self.bool_type    = bool_type
+        self.int_type     = int_type
+        self.float_type   = float_type
+        self.vector_types = vector_types
+        self.global_names = set(global_names)
+
+        self.flatten_threshold = flatten_threshold
+        self.estimator         = estimator
+
+        # Folded version of every node, shared expressions stay shared once folded
+        self.folded = {}
+
+    def optimize (self, statements: List[Statement]):
+        # Code given as text by an opcode handler cannot be analyzed
+        if contains_raw(statements): return statements
+
+        statements = self.fold_statements(statements, {})
+        statements = self.eliminate(statements, set())[0]
+        if self.flatten_threshold is not None:
+            statements = self.flatten(statements)
+        return self.remove_declarations(statements)
+
+    def is_global (self, name):
+        return name in self.global_names or name.startswith("gl_")
+
+    def is_constant (self, node: Expression):
+        if isinstance(node, Constant): return node.value is not None
+        return self.is_vector (node)
+    def is_vector (self, node: Expression):
+        return isinstance(node, Call) and node.pure and self.vector_types.get(node.function) == node.type \
+            and all( isinstance(arg, Constant) and isinstance(arg.value, (int, float)) for arg in node.args )
+
+    def same_constant (self, a: Expression, b: Expression):
+        if a is b: return True
+        if isinstance(a, Constant) and isinstance(b, Constant):
+            return a.type == b.type and a.value.__class__ == b.value.__class__ and a.value == b.value
+        if self.is_vector(a) and self.is_vector(b):
+            return a.type == b.type and all( self.same_constant(x, y) for x, y in zip(a.args, b.args) )
+        return False
+
+    def make_scalar (self, type, value):
+        if isinstance(value, bool):
+            return Constant(type, value)
+        if type == self.float_type:
+            value = float(value)
+            if not math.isfinite(value): return None
+            return Constant(type, value)
+        if type == self.int_type:
+            if not isinstance(value, int) or not INT_MIN <= value <= INT_MAX: return None
+            return Constant(type, value)
+        return None
+
+    def evaluate (self, node: Binary, a, b):
+        if isinstance(a, bool) or isinstance(b, bool):
+            if node.operand in ( "==", "!=" ) and isinstance(a, bool) and isinstance(b, bool):
+                return self.make_scalar(self.bool_type, COMPARISONS[node.operand](a, b))
+            return None
+        if node.operand in COMPARISONS:
+            return self.make_scalar(self.bool_type, COMPARISONS[node.operand](a, b))
+
+        if node.operand in ARITHMETIC:
+            value = ARITHMETIC[node.operand](a, b)
+        elif node.operand == "/":
+            if b == 0: return None
+            if node.type == self.int_type:
+                # GLSL integer division truncates towards zero
+                if isinstance(a, float) or isinstance(b, float): return None
+                value = abs(a) // abs(b) * (1 if (a < 0) == (b < 0) else -1)
+            else:
+                value = a / b
+        else:
+            return None
+
+        return self.make_scalar(node.type, value)
+
+    def fold (self, node: Expression, constants):
+        if node in self.folded:
+            return self.folded[node]
+
+        result = node
+        if isinstance(node, Variable):
+            result = constants.get(node.name, node)
+        elif isinstance(node, Attribute):
+            value = self.fold(node.value, constants)
+            if self.is_vector(value) and len(node.name) == 1 and node.name in COMPONENTS[:len(value.args)]:
+                result = Constant(self.float_type, float(value.args[COMPONENTS.index(node.name)].value))
+            elif value is not node.value:
+                result = Attribute(node.type, value, node.name)
+        elif isinstance(node, Unary):
+            value = self.fold(node.value, constants)
+            if isinstance(value, Constant) and node.operand == "!" and isinstance(value.value, bool):
+                result = Constant(node.type, not value.value)
+            elif isinstance(value, Constant) and node.operand == "-" and isinstance(value.value, (int, float)) and not isinstance(value.value, bool):
+                result = self.make_scalar(node.type, -value.value) or Unary(node.type, node.operand, value)
+            elif value is not node.value:
+                result = Unary(node.type, node.operand, value)
+        elif isinstance(node, Binary):
+            left  = self.fold(node.left,  constants)
+            right = self.fold(node.right, constants)
+
+            folded = None
+            if isinstance(left, Constant) and isinstance(right, Constant) and left.value is not None and right.value is not None:
+                folded = self.evaluate(node, left.value, right.value)
+            elif self.is_vector(left) and self.is_vector(right) and left.type == right.type == node.type and node.operand in ( "+", "-" ):
+                components = [ self.make_scalar(self.float_type, ARITHMETIC[node.operand](a.value, b.value)) for a, b in zip(left.args, right.args) ]
+                if all( component is not None for component in components ):
+                    folded = Call(node.type, left.function, components)
+
+            if folded is not None:
+                result = folded
+            elif left is not node.left or right is not node.right:
+                result = Binary(node.type, node.operand, left, right)
+        elif isinstance(node, Call):
+            args = [ self.fold(arg, constants) for arg in node.args ]
+            if any( arg is not old for arg, old in zip(args, node.args) ):
+                result = Call(node.type, node.function, args, node.pure)
+        elif isinstance(node, Select):
+            condition, value, orelse = [ self.fold(child, constants) for child in node.children() ]
+            if isinstance(condition, Constant) and isinstance(condition.value, bool):
+                result = value if condition.value else orelse
+            elif condition is not node.condition or value is not node.value or orelse is not node.orelse:
+                result = Select(node.type, condition, value, orelse)
+
+        self.folded[node] = result
+        return result
+
+    def scoped (self, statements: List[Statement]):
+        # Body of a pruned if statement, its declarations keep their own scope
+        if any( isinstance(statement, Assign) and statement.declaration is not None for statement in statements ):
+            return [ Block(statements) ]
+        return statements
+
+    def fold_statements (self, statements: List[Statement], constants):
+        result = []
+        for statement in statements:
+            if isinstance(statement, Assign):
+                value = self.fold(statement.value, constants)
+
+                if self.is_constant(value) and not self.is_global(statement.name):
+                    constants[statement.name] = value
+                else:
+                    constants.pop(statement.name, None)
+                result.append(Assign(statement.name, value, statement.declaration))
+            elif isinstance(statement, Return):
+                result.append(Return(None if statement.value is None else self.fold(statement.value, constants)))
+            elif isinstance(statement, If):
+                branches = []
+                orelse   = statement.orelse
+                for condition, body in statement.branches:
+                    condition = self.fold(condition, constants)
+                    if isinstance(condition, Constant) and isinstance(condition.value, bool):
+                        if not condition.value: continue
+
+                        # Always taken, the following branches are never reached
+                        orelse = body
+                        break
+                    branches.append((condition, body))
+
+                if len(branches) == 0:
+                    result.extend(self.scoped(self.fold_statements(orelse or [], constants)))
+                    continue
+
+                paths           = []
+                folded_branches = []
+                for condition, body in branches:
+                    paths.append(dict(constants))
+                    folded_branches.append((condition, self.fold_statements(body, paths[-1])))
+                paths.append(dict(constants))
+                if orelse is not None:
+                    orelse = self.fold_statements(orelse, paths[-1])
+
+                # Only the constants every path agrees on are known after the if statement
+                merged = {
+                    name: value for name, value in paths[0].items()
+                    if all( name in path and self.same_constant(path[name], value) for path in paths[1:] )
+                }
+                constants.clear()
+                constants.update(merged)
+
+                result.append(If(folded_branches, orelse))
+            elif isinstance(statement, While):
+                # Variables stored in the loop are unknown from its first iteration on
+                for name in assigned_names(statement.body):
+                    constants.pop(name, None)
+
+                condition = self.fold(statement.condition, constants)
+                if isinstance(condition, Constant) and condition.value is False:
+                    continue
+                result.append(While(condition, self.fold_statements(statement.body, dict(constants))))
+            elif isinstance(statement, For):
+                start = self.fold(statement.start, constants)
+                for name in assigned_names([ statement ]):
+                    constants.pop(name, None)
+
+                stop = self.fold(statement.stop, constants)
+                if isinstance(start, Constant) and isinstance(stop, Constant) and len(range(start.value, stop.value, statement.step)) == 0:
+                    continue
+                result.append(For(statement.name, start, stop, statement.step, self.fold_statements(statement.body, dict(constants)), statement.declaration))
+            elif isinstance(statement, Block):
+                result.append(Block(self.fold_statements(statement.body, constants)))
+            else:
+                result.append(statement)
+
+        return result
+
+    def eliminate (self, statements: List[Statement], live):
+        # Walks the statements backwards, gives back the statements left and the variables read before them
+        live   = set(live)
+        result = []
+        for statement in reversed(statements):
+            if isinstance(statement, Assign):
+                if statement.name not in live and not self.is_global(statement.name) and not is_impure(statement.value):
+                    if statement.declaration is not None:
+                        result.append(Declare(statement.declaration, statement.name))
+                    continue
+
+                live.discard(statement.name)
+                live |= used_names(statement.value)
+                result.append(statement)
+            elif isinstance(statement, Return):
+                live = set() if statement.value is None else used_names(statement.value)
+                result.append(statement)
+            elif isinstance(statement, If):
+                live_in  = set()
+                branches = []
+                for condition, body in statement.branches:
+                    body, body_live = self.eliminate(body, live)
+                    branches.append((condition, body))
+                    live_in |= body_live | used_names(condition)
+
+                orelse = statement.orelse
+                if orelse is not None:
+                    orelse, orelse_live = self.eliminate(orelse, live)
+                    live_in |= orelse_live
+                    if len(orelse) == 0: orelse = None
+                else:
+                    live_in |= live
+
+                empty = all( len(body) == 0 and not is_impure(condition) for condition, body in branches ) and orelse is None
+                if not empty:
+                    result.append(If(branches, orelse))
+                    live = live_in
+            elif isinstance(statement, While):
+                # Whatever the body reads may come from a previous iteration
+                loop_live = live | used_names(statement.condition)
+                while True:
+                    body_live = self.eliminate(statement.body, loop_live)[1]
+                    if body_live <= loop_live: break
+                    loop_live |= body_live
+
+                result.append(While(statement.condition, self.eliminate(statement.body, loop_live)[0]))
+                live = loop_live
+            elif isinstance(statement, For):
+                # The loop variable is read by the increment and the test of every iteration
+                loop_live = live | used_names(statement.stop) | { statement.name }
+                while True:
+                    body_live = self.eliminate(statement.body, loop_live)[1]
+                    if body_live <= loop_live: break
+                    loop_live |= body_live
+
+                result.append(For(statement.name, statement.start, statement.stop, statement.step, self.eliminate(statement.body, loop_live)[0], statement.declaration))
+                live = (loop_live - { statement.name }) | used_names(statement.start)
+            elif isinstance(statement, Block):
+                body, live = self.eliminate(statement.body, live)
+                result.append(Block(body))
+            else:
+                result.append(statement)
+
+        result.reverse()
+        return result, live
+
+    def branch_values (self, body: List[Statement]):
+        # Value of every variable the body assigns, as an expression of the values before it. None when the
+        # body does more than assigning pure values. Variables declared in the body are not visible after it.
+        values      = {}
+        local_names = set()
+        for statement in body:
+            if not isinstance(statement, Assign) or is_impure(statement.value):
+                return None
+
+            values[statement.name] = self.substitute(statement.value, values)
+            if statement.declaration is not None:
+                local_names.add(statement.name)
+
+        return { name: value for name, value in values.items() if name not in local_names }
+    def substitute (self, node: Expression, values):
+        if isinstance(node, Variable):
+            return values.get(node.name, node)
+        children = node.children()
+        if len(children) == 0: return node
+
+        new_children = [ self.substitute(child, values) for child in children ]
+        if all( new is old for new, old in zip(new_children, children) ): return node
+
+        if isinstance(node, Attribute): return Attribute(node.type, new_children[0], node.name)
+        if isinstance(node, Unary):     return Unary(node.type, node.operand, new_children[0])
+        if isinstance(node, Binary):    return Binary(node.type, node.operand, *new_children)
+        if isinstance(node, Select):    return Select(node.type, *new_children)
+        return Call(node.type, node.function, new_children, node.pure)
+
+    def flatten_if (self, statement: If):
+        # The assignments of an if statement as selects, or None when it has to stay a branch
+        paths = [ self.branch_values(body) for condition, body in statement.branches ]
+        paths.append({} if statement.orelse is None else self.branch_values(statement.orelse))
+        if any( values is None for values in paths ): return None
+
+        conditions = [ condition for condition, body in statement.branches ]
+        if any( is_impure(condition) for condition in conditions ): return None
+
+        names = []
+        for values in paths:
+            names.extend( name for name in values if name not in names )
+
+        # Each select reads the values from before the if statement, so none may depend on another variable
+        # assigned by it, nor the conditions on one of them when there are several
+        assigned = set(names)
+        if len(names) > 1 and any( not used_names(condition).isdisjoint(assigned) for condition in conditions ): return None
+        if any( not (used_names(value) & assigned) <= { name } for values in paths for name, value in values.items() ): return None
+
+        # Every value and every condition after the first one is computed whatever the path taken
+        computed = conditions[1:] + [ value for values in paths for value in values.values() ]
+        if self.estimator.estimate([ Return(node) for node in computed ]).alu > self.flatten_threshold: return None
+
+        selects = []
+        for name in names:
+            types = { values[name].type for values in paths if name in values }
+            if len(types) != 1: return None
+            type = types.pop()
+
+            value = paths[-1].get(name, Variable(type, name))
+            for condition, values in reversed(list(zip(conditions, paths))):
+                branch_value = values.get(name, Variable(type, name))
+                if not (isinstance(branch_value, Variable) and isinstance(value, Variable) and branch_value.name == value.name):
+                    value = Select(type, condition, branch_value, value)
+            selects.append(Assign(name, value))
+
+        return selects
+    def flatten (self, statements: List[Statement]):
+        # Innermost if statements first, a flattened one leaves only assignments in the body around it
+        result = []
+        for statement in statements:
+            if isinstance(statement, If):
+                statement = If(
+                    [ (condition, self.flatten(body)) for condition, body in statement.branches ],
+                    None if statement.orelse is None else self.flatten(statement.orelse)
+                )
+
+                selects = self.flatten_if(statement)
+                if selects is not None:
+                    for select in selects:
+                        # The declaration hoisted before the if statement takes the value
+                        previous = result[-1] if len(result) != 0 else None
+                        if isinstance(previous, Declare) and previous.name == select.name and select.name not in used_names(select.value):
+                            result[-1] = Assign(select.name, select.value, previous.type)
+                        else:
+                            result.append(select)
+                    continue
+            elif isinstance(statement, While):
+                statement = While(statement.condition, self.flatten(statement.body))
+            elif isinstance(statement, For):
+                statement = For(statement.name, statement.start, statement.stop, statement.step, self.flatten(statement.body), statement.declaration)
+            elif isinstance(statement, Block):
+                statement = Block(self.flatten(statement.body))
+
+            result.append(statement)
+
+        return result
+
+    def remove_declarations (self, statements: List[Statement]):
+        # Declarations left behind are only needed when the variable is still used in their scope
+        referenced = set()
+        result     = []
+        for statement in reversed(statements):
+            if isinstance(statement, Declare) and statement.name not in referenced:
+                continue
+
+            if isinstance(statement, If):
+                statement = If(
+                    [ (condition, self.remove_declarations(body)) for condition, body in statement.branches ],
+                    None if statement.orelse is None else self.remove_declarations(statement.orelse)
+                )
+            elif isinstance(statement, While):
+                statement = While(statement.condition, self.remove_declarations(statement.body))
+            elif isinstance(statement, For):
+                statement = For(statement.name, statement.start, statement.stop, statement.step, self.remove_declarations(statement.body), statement.declaration)
+            elif isinstance(statement, Block):
+                body = self.remove_declarations(statement.body)
+
+                # A block without declarations left does not need its own scope
+                if not any( isinstance(child, Declare) or (isinstance(child, Assign) and child.declaration is not None) for child in body ):
+                    for child in reversed(body):
+                        referenced |= referenced_names(child)
+                        result.append(child)
+                    continue
+                statement = Block(body)
+
+            referenced |= referenced_names(statement)
+            result.append(statement)
+
+        result.reverse()
+        return result
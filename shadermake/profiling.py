@@ -0,0 +1,101 @@
+import time
+
+class OpcodeStats:
+    # seconds excludes the instructions translated by nested calls, inclusive_seconds counts them
+    __slots__ = ( "count", "seconds", "inclusive_seconds" )
+
+    def __init__(self):
+        self.count             = 0
+        self.seconds           = 0.0
+        self.inclusive_seconds = 0.0
+
+    def add (self, other):
+        self.count             += other.count
+        self.seconds           += other.seconds
+        self.inclusive_seconds += other.inclusive_seconds
+
+class ShaderStats:
+    # Collected while translating one shader, cached is "memory" or "disk" when no translation happened
+    def __init__(self, name):
+        self.name    = name
+        self.seconds = 0.0
+        self.cached  = None
+
+        self.opcodes = {}
+        self.ranges  = {}
+        self.depth     = 0
+        self.max_depth = 0
+
+        self.__start    = time.perf_counter()
+        self.__children = []
+
+    def retranslations (self):
+        # Instruction ranges translated more than once, with the number of translations
+        return { key: count for key, count in self.ranges.items() if count > 1 }
+
+    def enter_range (self, start, end):
+        key = (start, end)
+        self.ranges[key] = self.ranges.get(key, 0) + 1
+
+        self.depth    += 1
+        self.max_depth = max(self.max_depth, self.depth)
+    def exit_range (self):
+        self.depth -= 1
+
+    def call (self, opname, handler, *args):
+        self.__children.append(0.0)
+        start = time.perf_counter()
+        try:
+            return handler(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested  = self.__children.pop()
+            if len(self.__children) != 0:
+                self.__children[-1] += elapsed
+
+            stats = self.opcodes.get(opname)
+            if stats is None:
+                stats = self.opcodes[opname] = OpcodeStats()
+            stats.count             += 1
+            stats.seconds           += elapsed - nested
+            stats.inclusive_seconds += elapsed
+
+    def finish (self, cached=None):
+        self.cached  = cached
+        self.seconds = time.perf_counter() - self.__start
+
+class TranslationProfiler:
+    # Set as the profiler of an engine class to collect the ShaderStats of every translation.
+    # The callback, if any, receives each ShaderStats once its translation is done.
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.shaders  = []
+
+    def record (self, stats: ShaderStats):
+        self.shaders.append(stats)
+        if self.callback is not None:
+            self.callback(stats)
+
+    def clear (self):
+        self.shaders.clear()
+
+    def opcodes (self):
+        totals = {}
+        for shader in self.shaders:
+            for opname, stats in shader.opcodes.items():
+                totals.setdefault(opname, OpcodeStats()).add(stats)
+        return totals
+    def seconds (self):
+        return sum( shader.seconds for shader in self.shaders )
+
+    def report (self):
+        lines = [ f"{'opcode':>28} {'count':>8} {'ms':>10} {'inclusive ms':>13}" ]
+        for opname, stats in sorted(self.opcodes().items(), key=lambda item: -item[1].seconds):
+            lines.append(f"{opname:>28} {stats.count:>8} {stats.seconds * 1000:>10.3f} {stats.inclusive_seconds * 1000:>13.3f}")
+
+        lines.append("")
+        lines.append(f"{'shader':>28} {'ms':>10} {'depth':>6} {'retranslated':>13} {'cached':>7}")
+        for shader in self.shaders:
+            lines.append(f"{shader.name:>28} {shader.seconds * 1000:>10.3f} {shader.max_depth:>6} {len(shader.retranslations()):>13} {shader.cached or '':>7}")
+
+        return "\n".join(lines)
@@ -0,0 +1,166 @@
+# Incremental builds : after an edit, only the shaders declared in the changed files and the shaders
+# binding them, directly or not, are translated and written again.
+
+import importlib
+import os
+import sys
+import time
+
+from typing import List, NamedTuple
+
+import shadermake.decorator
+
+from shadermake.batch  import BatchTarget, discover, output_path
+
+class RebuildReport(NamedTuple):
+    changed_files:   tuple
+    # (module, attribute) of the translated shaders
+    rebuilt:         tuple
+    # Files whose code changed
+    changed_outputs: tuple
+    seconds:         float
+
+def source_files (target: BatchTarget):
+    # An edit of the file of the function or of the module declaring the shader can change it
+    files = { os.path.abspath(target.shader.python_function().__code__.co_filename) }
+
+    module_file = getattr(sys.modules.get(target.module), "__file__", None)
+    if module_file is not None:
+        files.add(os.path.abspath(module_file))
+    return files
+
+def file_state (path):
+    try:
+        stat = os.stat(path)
+    except OSError: return None
+
+    return (stat.st_mtime_ns, stat.st_size)
+
+class IncrementalBuild:
+    def __init__(self, module_names, output_dir):
+        self.module_names = module_names
+        self.output_dir   = output_dir
+
+        self.targets = {}
+        self.outputs = {}
+        self.files   = {}
+
+    def scan (self):
+        self.targets = { (target.module, target.attribute): target for target in discover(self.module_names) }
+        self.files   = { path: file_state(path) for target in self.targets.values() for path in source_files(target) }
+
+    def changed_files (self) -> List[str]:
+        return [ path for path, state in self.files.items() if file_state(path) != state ]
+    def changed_targets (self, files):
+        return { key for key, target in self.targets.items() if not source_files(target).isdisjoint(files) }
+
+    def dependents (self, keys):
+        # The targets and every target binding one of them, directly or not
+        binders = {}
+        for key, target in self.targets.items():
+            for dependency in target.dependencies:
+                binders.setdefault(dependency, []).append(key)
+
+        result = set()
+        stack  = list(keys)
+        while len(stack) != 0:
+            key = stack.pop()
+            if key in result: continue
+
+            result.add(key)
+            stack.extend(binders.get(key, ()))
+        return result
+    def ordered (self, keys):
+        # Dependencies come before the targets binding them
+        keys    = set(keys)
+        order   = []
+        visited = set()
+        for root in sorted(keys):
+            if root in visited: continue
+
+            visited.add(root)
+            stack = [ (root, iter(self.targets[root].dependencies)) ]
+            while len(stack) != 0:
+                key, dependencies = stack[-1]
+
+                for dependency in dependencies:
+                    if dependency in visited or dependency not in self.targets: continue
+
+                    visited.add(dependency)
+                    stack.append((dependency, iter(self.targets[dependency].dependencies)))
+                    break
+                else:
+                    stack.pop()
+                    if key in keys: order.append(key)
+        return order
+
+    def translate (self, keys, files, start) -> RebuildReport:
+        rebuilt         = []
+        changed_outputs = []
+        for key in self.ordered(keys):
+            shader = self.targets[key].shader
+            code   = shader.c_code()
+            rebuilt.append(key)
+
+            if self.outputs.get(key) == code: continue
+
+            path = output_path(self.output_dir, *key)
+            with open(path, "w", encoding="utf-8") as file:
+                shader.write_c_code(file)
+
+            self.outputs[key] = code
+            changed_outputs.append(path)
+
+        return RebuildReport(tuple(files), tuple(rebuilt), tuple(changed_outputs), time.perf_counter() - start)
+
+    def build (self) -> RebuildReport:
+        start = time.perf_counter()
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        self.outputs.clear()
+        self.scan()
+        return self.translate(self.targets, (), start)
+
+    def reload (self, module_names):
+        default_lazy = shadermake.decorator.DEFAULT_LAZY
+        shadermake.decorator.DEFAULT_LAZY = True
+
+        importlib.invalidate_caches()
+        try:
+            for module_name in module_names:
+                importlib.reload(sys.modules[module_name])
+        finally:
+            shadermake.decorator.DEFAULT_LAZY = default_lazy
+
+    def rebuild (self, files=None) -> RebuildReport:
+        # files defaults to the source files modified since the last build
+        start = time.perf_counter()
+        files = self.changed_files() if files is None else [ os.path.abspath(path) for path in files ]
+        if len(files) == 0:
+            return RebuildReport((), (), (), time.perf_counter() - start)
+
+        # Modules binding the changed shaders hold the previous ones until they are reloaded as well
+        affected = self.ordered(self.dependents(self.changed_targets(files)))
+
+        modules = []
+        for key in affected:
+            if key[0] not in modules:
+                modules.append(key[0])
+
+        self.reload(modules)
+        self.scan()
+
+        return self.translate(self.dependents(self.changed_targets(files)), files, start)
+
+def watch (build: IncrementalBuild, interval=0.5, callback=None, stop=None):
+    # Polls the source files of the shaders every interval seconds and rebuilds them when they change,
+    # callback receives the report of each rebuild. stop is a threading.Event ending the loop.
+    while stop is None or not stop.is_set():
+        report = build.rebuild()
+        if len(report.changed_files) != 0 and callback is not None:
+            callback(report)
+
+        if stop is None:
+            time.sleep(interval)
+        else:
+            stop.wait(interval)
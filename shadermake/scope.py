@@ -0,0 +1,52 @@
+_MISSING = object()
+
+class Scope:
+    # Types of the variables visible in a block of the translated function. A child scope sees the variables
+    # of its parents without copying them, and its own declarations stay local to it.
+    __slots__ = ( "parent", "variables" )
+
+    def __init__(self, variables=None, parent=None):
+        self.parent    = parent
+        self.variables = {} if variables is None else dict(variables)
+
+    def child (self):
+        return Scope(parent=self)
+    def root (self):
+        scope = self
+        while scope.parent is not None:
+            scope = scope.parent
+        return scope
+
+    def get (self, name, default=None):
+        scope = self
+        while scope is not None:
+            value = scope.variables.get(name, _MISSING)
+            if value is not _MISSING: return value
+
+            scope = scope.parent
+        return default
+    def is_local (self, name):
+        return name in self.variables
+
+    def __contains__ (self, name):
+        return self.get(name, _MISSING) is not _MISSING
+    def __getitem__ (self, name):
+        value = self.get(name, _MISSING)
+        if value is _MISSING: raise KeyError(name)
+        return value
+    def __setitem__ (self, name, type):
+        self.variables[name] = type
+    def __iter__ (self):
+        seen  = set()
+        scope = self
+        while scope is not None:
+            for name in scope.variables:
+                if name in seen: continue
+
+                seen.add(name)
+                yield name
+            scope = scope.parent
+
+    def escaping (self, is_used_after):
+        # Variables declared in this scope and still used once the block is left
+        return { name: type for name, type in self.variables.items() if is_used_after(name) }
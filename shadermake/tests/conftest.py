@@ -0,0 +1,22 @@
+import sys
+
+import pytest
+
+@pytest.fixture
+def make_package(tmp_path, monkeypatch):
+    # Writes a package of modules given as { module name: source } under tmp_path and makes it importable
+    def make(name, modules):
+        package = tmp_path / name
+        package.mkdir()
+        (package / "__init__.py").write_text("")
+        for module, source in modules.items():
+            (package / f"{module}.py").write_text(source)
+
+        monkeypatch.syspath_prepend(str(tmp_path))
+        # Edited modules are imported again from their source, never from a stale bytecode file
+        monkeypatch.setattr(sys, "dont_write_bytecode", True)
+        for module in list(sys.modules):
+            if module == name or module.startswith(name + "."):
+                monkeypatch.delitem(sys.modules, module)
+        return package
+    return make
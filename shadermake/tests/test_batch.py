@@ -0,0 +1,74 @@
+import os
+
+from shadermake.batch          import compile_modules, discover, main
+
+HELPERS = """
+from shadermake.decorator      import make_shader
+from shadermake.engines.opengl import OpenGLEngine
+
+@make_shader(OpenGLEngine, argument_types=[ float ])
+def f(x):
+    return x + 1
+"""
+
+SHADERS = """
+from shadermake.decorator      import make_shader
+from shadermake.engines.opengl import OpenGLEngine
+
+from batch_shaders.helpers import f
+
+@make_shader(OpenGLEngine, argument_types=[ float ], bound_shaders=[ f ])
+def g(x):
+    return f(x) * 2
+
+@make_shader(OpenGLEngine, bound_shaders=[ f, g ])
+def main():
+    a = g(f(1.0))
+"""
+
+def test_discover(make_package, tmp_path):
+    make_package("batch_shaders", { "helpers": HELPERS, "shaders": SHADERS })
+
+    targets = { (target.module, target.attribute): target for target in discover([ "batch_shaders" ]) }
+
+    assert set(targets) == {
+        ("batch_shaders.helpers", "f"),
+        ("batch_shaders.shaders", "g"),
+        ("batch_shaders.shaders", "main")
+    }
+    assert targets["batch_shaders.shaders", "main"].dependencies == (("batch_shaders.helpers", "f"), ("batch_shaders.shaders", "g"))
+    assert not targets["batch_shaders.helpers", "f"].shader.resolved()
+
+def test_compile_modules(make_package, tmp_path):
+    make_package("batch_shaders", { "helpers": HELPERS, "shaders": SHADERS })
+    output = tmp_path / "out"
+
+    results = compile_modules([ "batch_shaders" ], str(output), workers=2, cache_path=str(tmp_path / "cache"))
+
+    order = [ result.name for result in results ]
+    assert sorted(order) == [ "f", "g", "main" ]
+    assert order.index("f") < order.index("g") < order.index("main")
+
+    for result in results:
+        assert result.seconds >= 0
+        assert os.path.exists(result.path)
+    
+    with open(output / "batch_shaders.helpers.f.glsl") as file:
+        assert file.read() == "\nfloat f (float x) {\n\treturn x + 1;\n}"
+
+def test_bound_shaders_are_translated_once(make_package, tmp_path):
+    make_package("batch_shaders", { "helpers": HELPERS, "shaders": SHADERS })
+    cache_path = tmp_path / "cache"
+
+    results = compile_modules([ "batch_shaders" ], str(tmp_path / "out"), workers=3, cache_path=str(cache_path))
+
+    # The bound shaders come from the shared disk cache : without it, g would translate f again and main
+    # both f and g
+    assert { result.name: result.translations for result in results } == { "f": 1, "g": 1, "main": 1 }
+    assert len(list(cache_path.glob("*.json"))) == 3
+
+def test_main(make_package, tmp_path, capsys):
+    make_package("batch_shaders", { "helpers": HELPERS, "shaders": SHADERS })
+
+    assert main([ "batch_shaders.helpers", "-o", str(tmp_path / "out"), "-j", "1" ]) == 0
+    assert "batch_shaders.helpers.f" in capsys.readouterr().out
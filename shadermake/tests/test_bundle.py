@@ -0,0 +1,109 @@
+import io
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from shadermake.bundle         import export_bundle, load_bundle
+from shadermake.decorator      import make_shader
+from shadermake.engines.opengl import OpenGLEngine, ShaderOptions, vec2, vec3, vec4
+
+def make_shaders():
+    @make_shader(OpenGLEngine, argument_types=[ float ], shader_options=ShaderOptions().addUniform( float, "scale" ))
+    def f(x):
+        return x * scale
+
+    options = ShaderOptions() \
+        .useVertex() \
+        .addInput( vec4, "pos", 0 ) \
+        .addOutput( vec2, "uv" )
+    @make_shader(OpenGLEngine, argument_types=[ vec2 ], bound_shaders=[ f ], shader_options=options)
+    def main(A):
+        gl_Position = pos
+        uv = A + vec2(f(1.0), 1.0)
+    return f, main
+
+def test_bundle_round_trip(tmp_path):
+    f, main = make_shaders()
+    path = str(tmp_path / "shaders.json")
+    export_bundle([ f, main ], path)
+
+    shaders = load_bundle(path)
+    assert set(shaders) == { "f", "main" }
+
+    bundled = shaders["main"]
+    assert bundled.c_code() == main.c_code()
+    assert bundled.name()   == "main"
+    assert bundled.args()   == [ ("vec2", "A") ]
+    assert bundled.end_type() == "void"
+    assert bundled.stage()    == "vertex"
+    assert bundled.inputs()   == (("vec4", "pos", 0),)
+    assert bundled.outputs()  == (("vec2", "uv", None),)
+    # Declared by the linked shader f
+    assert bundled.uniform()  == (("float", "scale"),)
+
+    assert shaders["f"].args() == [ ("float", "x") ]
+    assert shaders["f"].end_type() == "float"
+
+def test_bundle_uniform_blocks(tmp_path):
+    options = ShaderOptions().addUniformBlock( "Light", [ (vec3, "color"), (float, "intensity") ], binding=1 )
+    @make_shader(OpenGLEngine, argument_types=[ vec3 ], shader_options=options)
+    def light(A):
+        return A + color
+
+    @make_shader(OpenGLEngine, argument_types=[ vec3 ], bound_shaders=[ light ])
+    def main(A):
+        return light(A)
+
+    path = str(tmp_path / "shaders.json")
+    export_bundle([ main ], path)
+
+    # Declared by the linked shader light
+    assert load_bundle(path)["main"].uniformBlocks() == (("Light", (("vec3", "color"), ("float", "intensity")), "std140", 1),)
+
+def test_bundle_minify(tmp_path):
+    f, main = make_shaders()
+    path = str(tmp_path / "shaders.json")
+    export_bundle([ main ], path)
+
+    bundled = load_bundle(path)["main"]
+    assert bundled.c_code(minify=True) == main.c_code(minify=True)
+
+    output = io.StringIO()
+    bundled.write_c_code(output, minify=True)
+    assert output.getvalue() == main.c_code(minify=True)
+
+def test_bundle_keys_and_files():
+    f, main = make_shaders()
+    output = io.StringIO()
+    export_bundle({ "shaders/f": f }, output)
+
+    shaders = load_bundle(io.StringIO(output.getvalue()))
+    assert list(shaders) == [ "shaders/f" ]
+    assert shaders["shaders/f"].name() == "f"
+
+    # Bundles of another version do not load
+    with pytest.raises(AssertionError):
+        load_bundle(io.StringIO('{ "version": 0, "shaders": {} }'))
+
+def test_bundle_loading_does_not_import_engines(tmp_path):
+    f, main = make_shaders()
+    path = str(tmp_path / "shaders.json")
+    export_bundle({ f"main{idx}": main for idx in range(1000) }, path)
+
+    script = "\n".join([
+        "import sys, time",
+        "from shadermake.bundle import load_bundle",
+        "start = time.perf_counter()",
+        f"shaders = load_bundle({path!r})",
+        "print(time.perf_counter() - start)",
+        "assert len(shaders) == 1000",
+        "assert 'shadermake.engines.opengl' not in sys.modules",
+        "assert 'dis' not in sys.modules"
+    ])
+    root   = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    result = subprocess.run([ sys.executable, "-c", script ], cwd=root, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+
+    assert float(result.stdout) < 0.5
@@ -0,0 +1,85 @@
+import os
+
+from shadermake.cache          import DiskCache, MemoryCache, make_key
+from shadermake.decorator      import make_shader
+from shadermake.engines.opengl import OpenGLEngine, ShaderOptions, vec2
+
+def make_main():
+    @make_shader(OpenGLEngine, argument_types=[ float ])
+    def main(x):
+        y = x + 1
+        return y
+    return main
+
+def test_disk_cache_hit(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path))
+    monkeypatch.setattr(OpenGLEngine, "disk_cache", cache)
+    monkeypatch.setattr(OpenGLEngine, "memory_cache", None)
+
+    first = make_main()
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    def fail(*args, **kwargs):
+        assert False, "dis.Bytecode should not be called on a cache hit"
+    monkeypatch.setattr("shadermake.engines.opengl.dis.Bytecode", fail)
+
+    second = make_main()
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert second.c_code() == first.c_code()
+    assert second.end_type() == first.end_type()
+    assert second.key() == first.key()
+
+def test_disk_cache_key():
+    def main(x):
+        return x + 1
+    def other(x):
+        return x - 1
+
+    engine  = OpenGLEngine()
+    options = ShaderOptions().addUniform( vec2, "E" )
+
+    key = engine.translation_key(main, [ float ], [], ShaderOptions())
+    assert key == engine.translation_key(main, [ float ], [], ShaderOptions())
+    assert key != engine.translation_key(other, [ float ], [], ShaderOptions())
+    assert key != engine.translation_key(main, [ int ], [], ShaderOptions())
+    assert key != engine.translation_key(main, [ float ], [], options)
+
+def test_disk_cache_eviction(tmp_path):
+    cache = DiskCache(str(tmp_path), max_size=256)
+
+    for idx in range(16):
+        cache.put(make_key(idx), { "c_code": "x" * 64 })
+        os.utime(cache.entry_path(make_key(idx)), (idx, idx))
+
+    assert cache.size() <= 256
+    assert cache.get(make_key(15)) is not None
+    assert cache.get(make_key(0)) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_memory_cache_identity(monkeypatch):
+    cache = MemoryCache()
+    monkeypatch.setattr(OpenGLEngine, "memory_cache", cache)
+
+    first  = make_main()
+    second = make_main()
+    assert first is second
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    @make_shader(OpenGLEngine, argument_types=[ int ])
+    def main(x):
+        y = x + 1
+        return y
+    assert main is not first
+
+def test_memory_cache_eviction():
+    cache = MemoryCache(max_entries=2)
+
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
@@ -0,0 +1,48 @@
+import dis
+
+from shadermake.cfg import CONDITIONAL_JUMPS, ControlFlowGraph, IfRegion, LoopRegion, dominator_tree
+
+def test_dominator_tree():
+    #   0 -> 1 -> 3 -> 4
+    #   0 -> 2 -> 3
+    successors   = [ [ 1, 2 ], [ 3 ], [ 3 ], [ 4 ], [] ]
+    predecessors = [ [], [ 0 ], [ 0 ], [ 1, 2 ], [ 3 ] ]
+
+    assert dominator_tree(5, 0, successors, predecessors) == [ None, 0, 0, 0, 3 ]
+    assert dominator_tree(5, 4, predecessors, successors) == [ 3, 3, 3, 4, None ]
+
+def test_if_region():
+    def main(x):
+        y = 0
+        if x > 0:
+            y = 1
+        else:
+            y = 2
+        z = y + x
+        return z
+    
+    graph = ControlFlowGraph(dis.Bytecode(main))
+    jump  = next( index for index, operation in enumerate(graph) if operation.opname in CONDITIONAL_JUMPS )
+    
+    region = graph.region(jump)
+    assert isinstance(region, IfRegion)
+    assert graph[region.false_start].argval == 2
+    assert graph[region.follow].opname == "LOAD_FAST" and graph[region.follow].argval == "y"
+    assert len(graph.loops) == 0
+
+def test_loop_region():
+    def main(n):
+        s = 0
+        while s < n:
+            s = s + 1
+        return s
+    
+    graph = ControlFlowGraph(dis.Bytecode(main))
+    assert len(graph.loops) == 1
+
+    region = graph.loops[0].region
+    assert isinstance(region, LoopRegion)
+    assert [ operation.opname for operation in graph[region.condition_start:region.condition_end] ][-1] == "COMPARE_OP"
+    assert "STORE_FAST" in [ operation.opname for operation in graph[region.body_start:region.body_end] ]
+    assert "RETURN_VALUE" in [ operation.opname for operation in graph[region.follow:] ]
+    assert "STORE_FAST" not in [ operation.opname for operation in graph[region.follow:] ]
@@ -0,0 +1,94 @@
+import pytest
+
+from shadermake.cache          import DiskCache
+from shadermake.cost           import CostReport, over_budget
+from shadermake.decorator      import make_shader
+from shadermake.engines.opengl import OpenGLEngine, ShaderOptions, vec2, vec4, mat4
+
+def make_shaders(**kwargs):
+    @make_shader(OpenGLEngine, argument_types=[ float ])
+    def helper(value):
+        if value > 0.5:
+            value = value * 2.0
+        return value + 1.0
+
+    options = ShaderOptions() \
+        .useVertex() \
+        .addInput( vec4, "position", 0 ) \
+        .addOutput( vec4, "color" ) \
+        .addUniform( mat4, "matProj" ) \
+        .addUniform( int, "n" )
+    @make_shader(OpenGLEngine, bound_shaders=[ helper ], shader_options=options, **kwargs)
+    def main():
+        s = 0.0
+        for i in range(n):
+            s = s + helper(position.x)
+        color = position + vec4(s, 1.0, 1.0, 1.0)
+        gl_Position = matProj * position
+    return helper, main
+
+def test_cost_report():
+    helper, main = make_shaders()
+
+    cost = helper.cost()
+    assert (cost.alu, cost.ops, cost.calls, cost.branches, cost.depth) == (3, { "float": 3 }, {}, 1, 1)
+
+    # The helper is inlined inside the loop, the matrix product costs 16 and the constructor nothing
+    cost = main.cost()
+    assert cost.ops   == { "int": 1, "float": 4, "vec4": 1, "mat4": 1 }
+    assert cost.alu   == 1 + 1 + 3 + 4 + 16
+    assert cost.calls == { "helper": 1 }
+    assert (cost.branches, cost.loops, cost.dynamic_loops, cost.depth) == (2, 1, 1, 2)
+    assert cost.metric("ops") == 7 and cost.metric("calls") == 1
+
+def test_constant_loops_are_multiplied():
+    @make_shader(OpenGLEngine, argument_types=[ float ], unroll_limit=0)
+    def main(x):
+        s = 0.0
+        for i in range(10):
+            s = s + x
+        return s
+
+    cost = main.cost()
+    assert (cost.alu, cost.loops, cost.dynamic_loops, cost.depth) == (20, 1, 0, 1)
+
+def test_budget():
+    helper, main = make_shaders(budget={ "alu": 25, "depth": 2 })
+    assert main.cost().alu == 25
+
+    with pytest.raises(AssertionError, match="^main exceeds its cost budget : alu 25 > 20, depth 2 > 1$"):
+        make_shaders(budget={ "alu": 20, "depth": 1, "branches": 2 })
+
+    assert over_budget(main.cost(), { "loops": 1, "calls": 0 }) == [ ("calls", 1, 0) ]
+
+def test_overloads_have_their_own_cost():
+    def make_helper_float():
+        @make_shader(OpenGLEngine, argument_types=[ float ])
+        def helper(x):
+            return x + 1.0
+        return helper
+    def make_helper_vec2():
+        @make_shader(OpenGLEngine, argument_types=[ vec2 ])
+        def helper(A):
+            return A + A + A
+        return helper
+    helper_float, helper_vec2 = make_helper_float(), make_helper_vec2()
+
+    # Both overloads are named helper, each call is charged the one it goes to
+    @make_shader(OpenGLEngine, argument_types=[ float, vec2 ], bound_shaders=[ helper_float, helper_vec2 ])
+    def main(x, A):
+        return helper(A) + vec2(helper(x), 0.0)
+
+    assert (helper_float.cost().alu, helper_vec2.cost().alu) == (1, 4)
+    assert main.cost().calls == { "helper": 2 }
+    assert main.cost().alu == 1 + 4 + 2
+
+def test_cost_from_disk_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(OpenGLEngine, "memory_cache", None)
+    monkeypatch.setattr(OpenGLEngine, "disk_cache", DiskCache(str(tmp_path)))
+
+    helper, main = make_shaders()
+    cached_helper, cached_main = make_shaders()
+
+    assert cached_main.cost().as_dict() == main.cost().as_dict()
+    assert repr(CostReport.from_dict(main.cost().as_dict())) == repr(main.cost())
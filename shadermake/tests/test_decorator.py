@@ -0,0 +1,97 @@
+from shadermake.decorator      import make_shader, make_permutations
+from shadermake.engine         import LazyShader
+from shadermake.engines.opengl import OpenGLEngine, _GLSL_Shader
+
+def count_generate(monkeypatch):
+    calls    = []
+    generate = OpenGLEngine.generate
+
+    def counted(self, function, *args, **kwargs):
+        calls.append(function.__name__)
+        return generate(self, function, *args, **kwargs)
+    monkeypatch.setattr(OpenGLEngine, "generate", counted)
+
+    return calls
+
+def test_lazy_shader(monkeypatch):
+    calls = count_generate(monkeypatch)
+
+    @make_shader(OpenGLEngine, argument_types=[ float ], lazy=True)
+    def main(x):
+        return x + 1
+    
+    assert isinstance(main, LazyShader)
+    assert not main.resolved()
+    assert calls == []
+
+    assert main.name() == "main"
+    assert main.c_code() == "\nfloat main (float x) {\n\treturn x + 1;\n}"
+    assert isinstance(main.resolve(), _GLSL_Shader)
+    assert calls == [ "main" ]
+
+def test_lazy_bound_shaders(monkeypatch):
+    calls = count_generate(monkeypatch)
+
+    @make_shader(OpenGLEngine, argument_types=[ float ], lazy=True)
+    def f(x):
+        return x + 1
+    @make_shader(OpenGLEngine, bound_shaders=[ f ], lazy=True, optimize=False)
+    def main():
+        a = 0
+        c = f(a)
+    
+    assert calls == []
+    assert main.c_code() == "\n\t".join([
+        "\nfloat f (float x) {",
+        "return x + 1;"
+    ]) + "\n}\n" + "\n\t".join([
+        "void main () {",
+        "int a = 0;",
+        "float c = f(a);"
+    ]) + "\n}"
+    assert calls == [ "main", "f" ]
+
+    @make_shader(OpenGLEngine, bound_shaders=[ f ])
+    def other():
+        c = f(1)
+    
+    assert calls == [ "main", "f", "other" ]
+
+def test_permutations(monkeypatch):
+    monkeypatch.setattr(OpenGLEngine, "memory_cache", None)
+    calls = count_generate(monkeypatch)
+
+    @make_permutations(OpenGLEngine, { "LIGHTS": [ 1, 2 ], "SHADOWS": [ False, True ] }, argument_types=[ float ])
+    def main(x):
+        y = x * LIGHTS
+        if SHADOWS:
+            y = y * 0.5
+        z = y + x
+        return z
+
+    assert len(main) == 4
+    assert calls == [ "main" ] * 4
+
+    shader = main.get(LIGHTS=2, SHADOWS=False)
+    assert shader is main[{ "SHADOWS": False, "LIGHTS": 2 }]
+    assert shader.c_code() == "\nfloat main (float x) {\n\tfloat y = x * 2;\n\tfloat z = y + x;\n\treturn z;\n}"
+    assert "0.5" in main.get(LIGHTS=2, SHADOWS=True).c_code()
+    assert [ constants for constants, shader in main ][0] == { "LIGHTS": 1, "SHADOWS": False }
+    assert calls == [ "main" ] * 4
+
+    # Values outside the product are translated once and kept
+    assert "x * 3" in main.get(LIGHTS=3, SHADOWS=False).c_code()
+    main.get(LIGHTS=3, SHADOWS=False)
+    assert calls == [ "main" ] * 5 and len(main) == 5
+
+def test_lazy_permutations(monkeypatch):
+    calls = count_generate(monkeypatch)
+
+    @make_permutations(OpenGLEngine, { "QUALITY": [ 0, 1, 2 ] }, argument_types=[ float ], lazy=True)
+    def main(x):
+        y = x + QUALITY
+        return y
+
+    assert len(main) == 3 and calls == []
+    assert "x + 1" in main.get(QUALITY=1).c_code()
+    assert calls == [ "main" ]
@@ -0,0 +1,36 @@
+from shadermake.ir import Assign, Binary, Call, ExpressionTable, common_subexpressions
+
+def test_hash_consing():
+    table = ExpressionTable()
+
+    a = table.variable("float", "a")
+    b = table.variable("float", "b")
+    assert table.binary("float", "+", a, b) is table.binary("float", "+", table.variable("float", "a"), b)
+    assert table.constant("int", 1) is not table.constant("int", 1.0)
+
+    table.barrier()
+    assert table.variable("float", "a") is not a
+
+def test_stored_values():
+    table = ExpressionTable()
+
+    a   = table.variable("float", "a")
+    sum = table.binary("float", "+", a, a)
+    table.store("float", "x", sum)
+    assert table.binary("float", "+", a, a).name == "x"
+
+    # Once x changes the value has to be computed again
+    table.store("float", "x", a)
+    assert table.binary("float", "+", a, a) is sum
+
+def test_common_subexpressions():
+    table = ExpressionTable()
+
+    a       = table.variable("float", "a")
+    sum     = table.binary("float", "+", a, a)
+    product = table.binary("float", "*", sum, sum)
+    call    = table.call("float", "f", [ product ], pure=False)
+
+    statements = [ Assign("x", product, "float"), Assign("y", product), Assign("z", call) ]
+    assert common_subexpressions(statements) == [ [ sum, product ], [], [] ]
+    assert common_subexpressions([ Assign("x", call), Assign("y", call) ]) == [ [], [] ]
@@ -0,0 +1,90 @@
+import pytest
+
+from shadermake.layout import BlockLayout, VertexLayout
+
+def offsets(layout):
+    return [ (member.name, member.offset) for member in layout.members ]
+
+def test_std140_offsets():
+    layout = BlockLayout("Block", [
+        ("float", "a"),
+        ("vec3",  "b"),
+        ("float", "c"),
+        ("vec2",  "d"),
+        ("mat4",  "e"),
+        ("int",   "f"),
+        ("vec4",  "g")
+    ])
+
+    # vec3 is aligned on 16 bytes, a float fits in the padding after it, a vec2 on 8 bytes
+    assert offsets(layout) == [ ("a", 0), ("b", 16), ("c", 28), ("d", 32), ("e", 48), ("f", 112), ("g", 128) ]
+    assert layout.size == 144
+    assert layout.offset("e") == 48
+
+def test_block_sizes():
+    scalars = [ ("float", "a"), ("float", "b"), ("int", "c") ]
+    assert BlockLayout("Block", scalars, "std140").size == 16
+    assert BlockLayout("Block", scalars, "std430").size == 12
+
+    vectors = [ ("vec2", "a"), ("float", "b") ]
+    assert offsets(BlockLayout("Block", vectors, "std430")) == [ ("a", 0), ("b", 8) ]
+    assert BlockLayout("Block", vectors, "std430").size == 16
+
+    with pytest.raises(AssertionError):
+        BlockLayout("Block", scalars, "packed")
+    with pytest.raises(AssertionError):
+        BlockLayout("Block", [ ("bool", "flag") ])
+
+def test_block_dtype():
+    np = pytest.importorskip("numpy")
+
+    layout = BlockLayout("Block", [ ("float", "a"), ("vec3", "b"), ("mat4", "m"), ("int", "i") ])
+    dtype  = layout.numpy_dtype()
+    assert dtype.itemsize == layout.size == 112
+    assert [ dtype.fields[name][1] for name in ("a", "b", "m", "i") ] == [ 0, 16, 32, 96 ]
+
+    data = np.zeros(1, dtype=dtype)
+    data["b"] = [ 1.0, 2.0, 3.0 ]
+    data["m"][0, 1] = np.arange(4)
+    data["i"] = 7
+
+    raw = data.view(np.uint8)
+    assert np.frombuffer(raw[16:28].tobytes(), dtype="<f4").tolist() == [ 1.0, 2.0, 3.0 ]
+    # Second column of the matrix
+    assert np.frombuffer(raw[48:64].tobytes(), dtype="<f4").tolist() == [ 0.0, 1.0, 2.0, 3.0 ]
+    assert np.frombuffer(raw[96:100].tobytes(), dtype="<i4").tolist() == [ 7 ]
+
+def test_vertex_layout():
+    layout = VertexLayout([ ("vec2", "uv", 2), ("vec3", "position", 0), ("int", "material", None), ("vec3", "normal", 1) ])
+
+    assert [ (attribute.name, attribute.location, attribute.components, attribute.offset) for attribute in layout.attributes ] == [
+        ("position", 0, 3, 0), ("normal", 1, 3, 12), ("uv", 2, 2, 24), ("material", None, 1, 32)
+    ]
+    assert layout.stride == 36
+    assert layout.attribute("material").scalar == "int"
+    assert layout.attribute("uv").scalar == "float"
+
+    with pytest.raises(AssertionError):
+        VertexLayout([ ("mat4", "transform", 0) ])
+
+def test_vertex_pack():
+    np = pytest.importorskip("numpy")
+
+    layout   = VertexLayout([ ("vec3", "position", 0), ("float", "weight", 1), ("vec2", "uv", 2) ])
+    count    = 1000
+    position = np.arange(count * 3, dtype=np.float32).reshape(count, 3)
+    weight   = np.linspace(0, 1, count)
+    uv       = np.ones((count, 2))
+
+    packed = layout.pack({ "position": position, "weight": weight, "uv": uv })
+    assert packed.dtype.itemsize == layout.stride == 24
+    assert packed.shape == (count, )
+
+    # Same bytes as a float buffer written vertex by vertex
+    expected = np.concatenate([ position, weight[:, None], uv ], axis=1).astype(np.float32)
+    assert packed.tobytes() == expected.tobytes()
+
+    with pytest.raises(AssertionError):
+        layout.pack({ "position": position, "weight": weight })
+    with pytest.raises(AssertionError):
+        layout.pack({ "position": position, "weight": weight[:10], "uv": uv })
@@ -0,0 +1,58 @@
+import io
+
+from shadermake.bundle         import export_bundle, load_bundle
+from shadermake.decorator      import make_shader
+from shadermake.engines.opengl import OpenGLEngine, ShaderOptions, vec4, mat4
+from shadermake.minify         import minify
+
+def make_shaders():
+    @make_shader(OpenGLEngine, argument_types=[ float ])
+    def helper_function(value):
+        doubled = value * 2.0
+        return doubled + value
+
+    options = ShaderOptions() \
+        .useVertex() \
+        .addInput( vec4, "position", 0 ) \
+        .addOutput( vec4, "color" ) \
+        .addUniform( mat4, "matProj" ) \
+        .addUniform( float, "x" )
+    @make_shader(OpenGLEngine, bound_shaders=[ helper_function ], shader_options=options)
+    def main():
+        intensity = helper_function(position.x) - -1.0
+        color = vec4(intensity * x, intensity, position.y, 1.0)
+        gl_Position = matProj * position
+    return helper_function, main
+
+def test_minified_shader():
+    helper_function, main = make_shaders()
+
+    minified = main.minified()
+    assert minified.code == (
+        "layout(location=0)in vec4 position;out vec4 color;uniform mat4 matProj;uniform float x;"
+        "float c(float a){float d=a*2.0;return d+a;}"
+        "void main(){float b=c(position.x)- -1.0;color=vec4(b*x,b,position.y,1.0);gl_Position=matProj*position;}"
+    )
+    assert minified.renamed == { "value": "a", "intensity": "b", "helper_function": "c", "doubled": "d" }
+    assert minified.original_size == len(main.c_code()) and minified.size == len(minified.code)
+    assert minified.saved() == minified.original_size - minified.size and minified.reduction() == 121 / 354
+
+    assert main.c_code(minify=True) == minified.code
+    output = io.StringIO()
+    main.write_c_code(output, minify=True)
+    assert output.getvalue() == minified.code
+
+def test_minify_keeps_tokens_apart():
+    code = "#version 330\nint f (int a, int b) {\n\tint c = a - -b;\n\treturn c-- + ++c + 1.5e-3 + a.x;\n}"
+    minified = minify(code, types=[ "int" ])
+
+    assert minified.code == "#version 330\nint d(int a,int c){int b=a- -c;return b--+ ++b+1.5e-3+a.x;}"
+
+def test_minified_bundle(tmp_path):
+    helper_function, main = make_shaders()
+    path = str(tmp_path / "shaders.json")
+    export_bundle([ main ], path, minify=True)
+
+    bundled = load_bundle(path)["main"]
+    assert bundled.c_code() == main.c_code(minify=True)
+    assert bundled.inputs() == (("vec4", "position", 0),)
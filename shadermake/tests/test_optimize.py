@@ -0,0 +1,107 @@
+import operator
+import random
+
+from shadermake.cost     import CostEstimator
+from shadermake.ir       import Assign, Binary, Block, Constant, Declare, If, Return, Select, Variable, While
+from shadermake.optimize import Optimizer
+
+def make_optimizer(flatten_threshold=None):
+    return Optimizer("bool", "int", "float", { "vec2": "vec2" }, [ "color" ], flatten_threshold, CostEstimator(str, lambda name, types: None))
+
+def test_integer_folding():
+    optimizer = make_optimizer()
+
+    def fold(operand, a, b):
+        return optimizer.fold(Binary("int", operand, Constant("int", a), Constant("int", b)), {})
+
+    assert fold("/", -7, 2).value == -3
+    assert isinstance(fold("*", 2 ** 20, 2 ** 12), Binary)
+    assert isinstance(fold("/", 1, 0), Binary)
+    assert fold("<", 1, 2).value is True
+
+def test_loop_liveness():
+    # s = 0; while s < n: t = s; s = t + 1; return 0
+    s = Variable("int", "s")
+    t = Variable("int", "t")
+    n = Variable("int", "n")
+
+    statements = [
+        Assign("s", Constant("int", 0), "int"),
+        While(Binary("bool", "<", s, n), [ Assign("t", s, "int"), Assign("s", Binary("int", "+", t, Constant("int", 1))) ]),
+        Assign("unused", s, "int"),
+        Return(Constant("int", 0))
+    ]
+
+    optimized = make_optimizer().optimize(statements)
+    assert [ statement.__class__ for statement in optimized ] == [ Assign, While, Return ]
+    assert len(optimized[1].body) == 2
+
+def test_constant_loop_condition():
+    statements = [ While(Constant("bool", False), [ Assign("color", Constant("float", 1.0)) ]) ]
+
+    assert make_optimizer().optimize(statements) == []
+
+OPERATORS = { "+": operator.add, "-": operator.sub, "*": operator.mul, ">": operator.gt, "<": operator.lt, ">=": operator.ge }
+
+def evaluate (node, variables):
+    if isinstance(node, Constant): return node.value
+    if isinstance(node, Variable): return variables[node.name]
+    if isinstance(node, Select):
+        # Both values are computed, like on the GPU
+        condition, value, orelse = [ evaluate(child, variables) for child in node.children() ]
+        return value if condition else orelse
+    return OPERATORS[node.operand](evaluate(node.left, variables), evaluate(node.right, variables))
+
+def run (statements, variables):
+    for statement in statements:
+        if isinstance(statement, Assign):
+            variables[statement.name] = evaluate(statement.value, variables)
+        elif isinstance(statement, Return):
+            return evaluate(statement.value, variables)
+        elif isinstance(statement, If):
+            for condition, body in statement.branches:
+                if evaluate(condition, variables):
+                    result = run(body, variables)
+                    break
+            else:
+                result = run(statement.orelse or [], variables)
+            if result is not None: return result
+        elif isinstance(statement, Block):
+            result = run(statement.body, dict(variables))
+            if result is not None: return result
+
+def count_ifs (statements):
+    return sum( isinstance(statement, If) for statement in statements )
+
+def test_flatten_branches():
+    x = Variable("float", "x")
+    y = Variable("float", "y")
+    z = Variable("float", "z")
+    t = Variable("float", "t")
+    def number(value): return Constant("float", value)
+    def add(a, b):     return Binary("float", "+", a, b)
+    def mul(a, b):     return Binary("float", "*", a, b)
+
+    statements = [
+        Declare("float", "y"),
+        # Elif chain assigning constants
+        If([ (Binary("bool", ">", x, number(0.5)), [ Assign("y", number(2.0)) ]), (Binary("bool", ">=", x, number(0.0)), [ Assign("y", number(4.0)) ]) ], [ Assign("y", number(3.0)) ]),
+        Assign("z", x, "float"),
+        # A local of the branch and a value read by the next assignment of the same branch
+        If([ (Binary("bool", ">", y, number(2.5)), [ Assign("t", mul(x, number(2.0)), "float"), Assign("z", add(t, number(1.0))), Assign("z", mul(z, z)) ]) ]),
+        # Assigns another variable the branch assigns, stays a branch
+        If([ (Binary("bool", "<", x, number(0.0)), [ Assign("y", add(y, number(1.0))), Assign("z", add(y, z)) ]) ]),
+        Return(add(y, z))
+    ]
+
+    branches  = make_optimizer().optimize(statements)
+    flattened = make_optimizer(flatten_threshold=8).optimize(statements)
+    assert (count_ifs(branches), count_ifs(flattened)) == (3, 1)
+    assert isinstance(flattened[0], Assign) and flattened[0].declaration == "float" and isinstance(flattened[0].value, Select)
+
+    # Too expensive to compute on every path
+    assert count_ifs(make_optimizer(flatten_threshold=1).optimize(statements)) == 2
+
+    rng = random.Random(0)
+    for value in [ -1.0, 0.0, 0.5, 0.75, 2.0 ] + [ rng.uniform(-2, 2) for _ in range(200) ]:
+        assert run(flattened, { "x": value }) == run(branches, { "x": value }) == run(statements, { "x": value })
@@ -0,0 +1,43 @@
+from shadermake.cache          import MemoryCache
+from shadermake.decorator      import make_shader
+from shadermake.engines.opengl import OpenGLEngine
+from shadermake.profiling      import TranslationProfiler
+
+def main(n):
+    s = 0
+    while s < n:
+        if s > 5:
+            s = s + 2
+        else:
+            s = s + 1
+    return s
+
+def test_profiler(monkeypatch):
+    finished = []
+    profiler = TranslationProfiler(finished.append)
+    monkeypatch.setattr(OpenGLEngine, "profiler", profiler)
+    monkeypatch.setattr(OpenGLEngine, "memory_cache", MemoryCache())
+
+    make_shader(OpenGLEngine, argument_types=[ int ])(main)
+    make_shader(OpenGLEngine, argument_types=[ int ])(main)
+
+    assert [ stats.name for stats in finished ] == [ "main", "main" ]
+    assert [ stats.cached for stats in finished ] == [ None, "memory" ]
+
+    stats = finished[0]
+    assert stats.opcodes["STORE_FAST"].count == 3
+    assert stats.opcodes["RETURN_VALUE"].count >= 1
+    assert stats.max_depth == 3
+    assert stats.retranslations() == {}
+    assert stats.seconds > 0
+
+    totals = profiler.opcodes()
+    assert totals["STORE_FAST"].count == 3
+    assert totals["STORE_FAST"].seconds <= totals["STORE_FAST"].inclusive_seconds
+    assert "STORE_FAST" in profiler.report()
+
+def test_profiler_disabled():
+    engine = OpenGLEngine()
+    engine.generate(main, [ int ], [])
+
+    assert engine.stats is None
@@ -0,0 +1,87 @@
+import os
+import threading
+
+from shadermake.rebuild import IncrementalBuild, watch
+
+HELPERS = """
+from shadermake.decorator      import make_shader
+from shadermake.engines.opengl import OpenGLEngine
+
+@make_shader(OpenGLEngine, argument_types=[ float ])
+def f(x):
+    return x + 1
+"""
+
+SHADERS = """
+from shadermake.decorator      import make_shader
+from shadermake.engines.opengl import OpenGLEngine
+
+from rebuild_shaders.helpers import f
+
+@make_shader(OpenGLEngine, argument_types=[ float ], bound_shaders=[ f ])
+def g(x):
+    return f(x) * 2
+
+@make_shader(OpenGLEngine, bound_shaders=[ f, g ])
+def main():
+    a = g(f(1.0))
+"""
+
+OTHER = """
+from shadermake.decorator      import make_shader
+from shadermake.engines.opengl import OpenGLEngine
+
+@make_shader(OpenGLEngine, argument_types=[ float ])
+def h(x):
+    return x * 3
+"""
+
+def test_incremental_rebuild(make_package, tmp_path):
+    package = make_package("rebuild_shaders", { "helpers": HELPERS, "shaders": SHADERS, "other": OTHER })
+    output  = tmp_path / "out"
+
+    build  = IncrementalBuild([ "rebuild_shaders" ], str(output))
+    report = build.build()
+    assert len(report.rebuilt) == 4 and len(report.changed_outputs) == 4
+    assert build.rebuild().rebuilt == ()
+
+    # The helper and every shader binding it, not the unrelated shader
+    (package / "helpers.py").write_text(HELPERS.replace("x + 1", "x + 10"))
+    report = build.rebuild()
+    assert report.changed_files == (str(package / "helpers.py"), )
+    assert report.rebuilt == (
+        ("rebuild_shaders.helpers", "f"),
+        ("rebuild_shaders.shaders", "g"),
+        ("rebuild_shaders.shaders", "main")
+    )
+    assert sorted(os.path.basename(path) for path in report.changed_outputs) == [
+        "rebuild_shaders.helpers.f.glsl", "rebuild_shaders.shaders.g.glsl", "rebuild_shaders.shaders.main.glsl"
+    ]
+    with open(output / "rebuild_shaders.shaders.main.glsl") as file:
+        assert "return x + 10;" in file.read()
+
+    # Translated again but identical, nothing is written
+    (package / "other.py").write_text(OTHER + "\n# comment\n")
+    report = build.rebuild()
+    assert report.rebuilt == (("rebuild_shaders.other", "h"), )
+    assert report.changed_outputs == ()
+
+def test_watch(make_package, tmp_path):
+    package = make_package("rebuild_shaders", { "helpers": HELPERS, "shaders": SHADERS, "other": OTHER })
+
+    build = IncrementalBuild([ "rebuild_shaders.other" ], str(tmp_path / "out"))
+    build.build()
+
+    reports = []
+    stop    = threading.Event()
+    def callback(report):
+        reports.append(report)
+        stop.set()
+
+    thread = threading.Thread(target=watch, args=(build, 0.01, callback, stop))
+    thread.start()
+    (package / "other.py").write_text(OTHER.replace("x * 3", "x * 30"))
+    thread.join(10)
+
+    assert not thread.is_alive()
+    assert [ report.rebuilt for report in reports ] == [ (("rebuild_shaders.other", "h"), ) ]
@@ -0,0 +1,25 @@
+from shadermake.scope import Scope
+
+def test_scope_lookup():
+    root  = Scope({ "color": "vec4" })
+    scope = Scope({ "x": "float" }, root)
+    child = scope.child()
+
+    child["y"] = "int"
+    assert child["x"] == "float" and child["color"] == "vec4" and child["y"] == "int"
+    assert "y" not in scope and "y" in child
+    assert child.is_local("y") and not child.is_local("x")
+    assert child.root() is root
+    assert sorted(child) == [ "color", "x", "y" ]
+
+    try:
+        scope["y"]
+    except KeyError: pass
+    else: assert False, "y is local to the child scope"
+
+def test_escaping():
+    child = Scope().child()
+    child["a"] = "int"
+    child["b"] = "int"
+
+    assert child.escaping(lambda name: name == "a") == { "a": "int" }
@@ -0,0 +1,61 @@
+from shadermake.decorator      import make_shader
+from shadermake.engines.opengl import OpenGLEngine, ShaderOptions, vec2
+
+def compile_source(source, name, scope):
+    exec(source, scope)
+    return scope[name]
+
+def make_jobs(count):
+    @make_shader(OpenGLEngine, argument_types=[ float ], lazy=True)
+    def helper(x):
+        return x * 2.0 + 1.0
+
+    jobs = []
+    for idx in range(count):
+        source = "\n".join([
+            f"def main(x, A):",
+            f"    y = x * {idx % 17}.0 + helper(x)",
+            f"    if y > {idx % 5}:",
+            f"        y = y - 1.0",
+            f"    elif y < 0:",
+            f"        y = y + {idx}.0",
+            f"    s = 0",
+            f"    while s < {idx % 7}:",
+            f"        s = s + 1",
+            f"    B = A + vec2(y, s)",
+            f"    z = B.x + B.y * {idx % 3}.0",
+            f"    return z",
+            ""
+        ])
+        function = compile_source(source, "main", { "helper": helper, "vec2": vec2 })
+        options  = ShaderOptions().addUniform( float, f"u{idx % 11}" )
+        jobs.append((function, [ float, vec2 ], [ helper ], options))
+    return jobs
+
+def test_generate_many_matches_serial(monkeypatch):
+    # Every job is translated, nothing comes from a cache shared with the other threads
+    monkeypatch.setattr(OpenGLEngine, "memory_cache", None)
+
+    jobs   = make_jobs(1000)
+    engine = OpenGLEngine()
+
+    serial   = [ engine.generate(*job).c_code() for job in jobs ]
+    parallel = [ shader.c_code() for shader in engine.generate_many(jobs, max_workers=8) ]
+    assert parallel == serial
+
+    unoptimized = [ shader.c_code() for shader in engine.generate_many(jobs[:200], max_workers=8, optimize=False) ]
+    assert unoptimized == [ engine.generate(*job, optimize=False).c_code() for job in jobs[:200] ]
+
+def test_generate_has_no_side_effects():
+    def main(x, A):
+        return A
+
+    argument_types = [ float, vec2 ]
+    shader = OpenGLEngine().generate(main, argument_types, [])
+    assert argument_types == [ float, vec2 ]
+    assert shader.c_code() == "\nvec2 main (float x, vec2 A) {\n\treturn A;\n}"
+
+    def other():
+        pass
+    # Each translation gets its own default options
+    assert OpenGLEngine().generate(other, [], []).shader_options is not OpenGLEngine().generate(main, (float, vec2), ()).shader_options